@@ -0,0 +1,347 @@
+# Backend load benchmark against generated layer configs and fake upstreams
+# Usage: python -m benchmarks.bench_backend [--layers 10,1000,10000] [--output results.json]
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+import requests
+
+from benchmarks.fake_services import fake_wms, fake_mapfish
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_APP_CONFIG = os.path.join(BACKEND_DIR, 'configs', 'app_configs', 'default.yaml')
+LAYERS_PER_GROUP = 10
+BIELEFELD_BBOX = [462000, 5760000, 474000, 5770000]
+# A4 portrait page at 1:25000
+PAGE_BBOX = [466000, 5762000, 470750, 5768750]
+# Tile width in meters of proxied GetMaps, 24 x 20 tiles cover the benchmark bbox
+TILE_SIZE = 500
+# Overlays printed by the export scenarios
+PRINT_LAYERS = 3
+
+
+def tile_bboxes(columns, rows, tile_size=TILE_SIZE):
+    """Bboxes of a grid of tiles starting at the lower left of the benchmark bbox."""
+    return [
+        [BIELEFELD_BBOX[0] + x * tile_size, BIELEFELD_BBOX[1] + y * tile_size,
+         BIELEFELD_BBOX[0] + (x + 1) * tile_size, BIELEFELD_BBOX[1] + (y + 1) * tile_size]
+        for y in range(rows) for x in range(columns)
+    ]
+
+
+def generate_configs(directory, layer_count, wms_url):
+    """Write a layers config with layer_count WMS overlays and the default app config.
+
+    Overlays alternate between wms and tiledwms layers like the shipped
+    configs, so exports print them.
+    """
+    layers_dir = os.path.join(directory, 'layers_conf')
+    app_dir = os.path.join(directory, 'app_configs')
+    os.makedirs(layers_dir)
+    os.makedirs(app_dir)
+
+    layers = [{
+        'name': 'stadtplan_bi',
+        'title': 'Stadtplan',
+        'type': 'wms',
+        'background': True,
+        'source': {'url': wms_url, 'format': 'image/png', 'layers': ['map'], 'srs': 'EPSG:25832'},
+    }]
+    groups = []
+    for i in range(layer_count):
+        layers.append({
+            'name': f'layer_{i}',
+            'title': f'Layer {i}',
+            'type': 'tiledwms' if i % 2 else 'wms',
+            'abstract': f'Generated benchmark layer {i}',
+            'status': 'active' if i % LAYERS_PER_GROUP == 0 else 'inactive',
+            'source': {'url': wms_url, 'format': 'image/png', 'layers': [f'layer_{i}'], 'srs': 'EPSG:25832'},
+        })
+        if i % LAYERS_PER_GROUP == 0:
+            groups.append({
+                'name': f'group_{i // LAYERS_PER_GROUP}',
+                'title': f'Group {i // LAYERS_PER_GROUP}',
+                'catalog': i % (2 * LAYERS_PER_GROUP) == 0,
+                'layers': [],
+            })
+        groups[-1]['layers'].append(f'layer_{i}')
+
+    with open(os.path.join(layers_dir, 'layers.yaml'), 'w') as f:
+        yaml.safe_dump({'layers': layers, 'groups': groups}, f)
+    shutil.copy(DEFAULT_APP_CONFIG, os.path.join(app_dir, 'default.yaml'))
+    return layers_dir, app_dir
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env, port, server, workers):
+    """Start the backend and return (process, seconds until /health answered)."""
+    if server == 'gunicorn':
+        command = [
+            sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--threads', '16', 'munimap.app:create_app()',
+        ]
+    else:
+        command = [
+            sys.executable, '-c',
+            f'from munimap.app import create_app; create_app().run(port={port}, threaded=True)',
+        ]
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f'{server} exited with {process.returncode}')
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/health', timeout=1).ok:
+                return process, time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        if time.perf_counter() - started > 600:
+            process.kill()
+            raise RuntimeError(f'{server} did not start')
+        time.sleep(0.05)
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        # Gunicorn waits its graceful timeout for busy worker threads
+        process.kill()
+        process.wait()
+
+
+def _rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def worker_memory(pid):
+    """Resident memory in MB of the worker processes (Linux only)."""
+    children = []
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # ppid is the second field after the parenthesized name
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return [_rss_mb(worker) for worker in (children or [pid])]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def run_load(request, count, concurrency, start=0):
+    """Call request(session, i) count times and return latency statistics."""
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = request(local.session, i)
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(start, start + count)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests': count,
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput': round(count / elapsed, 2),
+        'p50Ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'p99Ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def endpoint_requests(base_url, layer_count):
+    """Request functions per benchmarked endpoint."""
+    config = requests.get(f'{base_url}/api/v1/app/default/config', timeout=60).json()
+    proxy_url = None
+    for group in config['layers'].get('overlays', []):
+        for layer in group.get('layers', []):
+            url = layer['olLayer']['source'].get('url', '')
+            if url.startswith('/proxy/'):
+                proxy_url = base_url + url
+                break
+        if proxy_url:
+            break
+    names = ','.join(f'layer_{i}' for i in range(0, layer_count, max(1, layer_count // 20)))
+    columns = int((BIELEFELD_BBOX[2] - BIELEFELD_BBOX[0]) // TILE_SIZE)
+    rows = int((BIELEFELD_BBOX[3] - BIELEFELD_BBOX[1]) // TILE_SIZE)
+    tiles = tile_bboxes(columns, rows)
+    print_layers = [f'layer_{i}' for i in range(min(PRINT_LAYERS, layer_count))]
+    opacities = {name: 0.8 for name in print_layers[1:]}
+
+    def get(url, **kwargs):
+        return lambda session, i: session.get(url, timeout=60, **kwargs).ok
+
+    def proxy(session, i):
+        # Pan over the grid like a client, every tile is requested once per pass
+        return session.get(proxy_url, params={
+            'SERVICE': 'WMS', 'REQUEST': 'GetMap', 'VERSION': '1.1.1', 'LAYERS': 'layer_0',
+            'SRS': 'EPSG:25832', 'BBOX': ','.join(map(str, tiles[i % len(tiles)])),
+            'WIDTH': '256', 'HEIGHT': '256', 'FORMAT': 'image/png',
+        }, timeout=60).ok
+
+    def export(session, i):
+        # Distinct bboxes so the print result cache does not answer
+        offset = i * 10
+        bbox = [BIELEFELD_BBOX[0] + offset, BIELEFELD_BBOX[1], BIELEFELD_BBOX[2] + offset, BIELEFELD_BBOX[3]]
+        response = session.post(f'{base_url}/export/map', json={
+            'bbox': bbox, 'srs': 25832, 'scale': 2500, 'outputFormat': 'pdf',
+            'pageLayout': 'a4-portrait', 'pageSize': [210, 297],
+            'layers': print_layers, 'opacities': opacities,
+        }, timeout=60)
+        if not response.ok:
+            return False
+        status_url = base_url + response.json()['statusURL']
+        since = 0
+        while True:
+            status = session.get(status_url, params={'wait': 10, 'since': since}, timeout=60).json()
+            if status.get('status') in ('finished', 'error'):
+                return status['status'] == 'finished'
+            since = status.get('version', since)
+
+    def quick_export(session, i):
+        return session.post(f'{base_url}/export/map/quick', json={
+            'bbox': PAGE_BBOX, 'srs': 25832, 'scale': 25000, 'layers': print_layers, 'opacities': opacities,
+        }, timeout=60).ok
+
+    endpoints = {
+        'config': get(f'{base_url}/api/v1/app/default/config'),
+        'catalog': get(f'{base_url}/api/v1/app/default/catalog'),
+        'catalog_names': get(f'{base_url}/api/v1/app/default/catalog/names', params={'names': names}),
+        'export': export,
+        'export_quick': quick_export,
+    }
+    if proxy_url:
+        endpoints['proxy'] = proxy
+    return endpoints
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(args, layer_count, wms, mapfish):
+    with tempfile.TemporaryDirectory(prefix='munimap-bench-') as directory:
+        layers_dir, app_dir = generate_configs(directory, layer_count, wms.url)
+        env = {
+            **os.environ,
+            'LAYERS_CONF_DIR': layers_dir,
+            'APP_CONFIG_DIR': app_dir,
+            'MAPFISH_PRINT_URL': mapfish.url,
+            'PRINT_CACHE_DIR': os.path.join(directory, 'print_cache'),
+            'METRICS_DIR': os.path.join(directory, 'metrics'),
+            'PYTHONPATH': BACKEND_DIR,
+        }
+        port = _free_port()
+        process, startup = start_server(env, port, args.server, args.workers)
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            endpoints = endpoint_requests(base_url, layer_count)
+            results = {}
+            for name, request in endpoints.items():
+                if args.endpoints and name not in args.endpoints:
+                    continue
+                count = args.export_requests if name == 'export' else args.requests
+                # Warm up connections of every worker, with other request numbers
+                # than the measured run so print jobs are not cached
+                run_load(request, min(count, args.concurrency * 2), args.concurrency, start=count)
+                results[name] = run_load(request, count, args.concurrency)
+                print(f'{layer_count} layers {name}: {results[name]}', file=sys.stderr)
+            return {
+                'layers': layer_count,
+                'startupSeconds': round(startup, 3),
+                'workerRssMb': worker_memory(process.pid),
+                'endpoints': results,
+            }
+        finally:
+            stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--layers', default='10,1000,10000', help='Comma separated layer counts')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--export-requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--endpoints', type=lambda value: value.split(','), default=None)
+    parser.add_argument('--server', choices=['gunicorn', 'werkzeug'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--wms-latency', type=float, default=0.02, help='Seconds per fake WMS request')
+    parser.add_argument('--wms-bytes', type=int, default=50000, help='Size of fake GetMap images')
+    parser.add_argument('--mapfish-latency', type=float, default=0.01, help='Seconds per fake MapFish request')
+    parser.add_argument('--print-duration', type=float, default=1.0, help='Seconds until a fake print job is done')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    wms = fake_wms(args.wms_latency, args.wms_bytes)
+    mapfish = fake_mapfish(args.mapfish_latency, args.wms_bytes, args.print_duration)
+    try:
+        runs = [bench_size(args, int(count), wms, mapfish) for count in args.layers.split(',')]
+    finally:
+        wms.stop()
+        mapfish.stop()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        'runs': runs,
+    }
+    encoded = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + '\n')
+    print(encoded)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# Proxy cache benchmark of several local backend nodes behind a round robin balancer
+# Usage: python -m benchmarks.bench_cluster [--nodes 3] [--output results.json]
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+import requests
+
+from benchmarks.fake_services import fake_wms
+from benchmarks.bench_backend import (
+    generate_configs, tile_bboxes, _free_port, start_server, stop_server, run_load, git_commit
+)
+
+
+def proxy_path(base_url):
+    config = requests.get(f'{base_url}/api/v1/app/default/config', timeout=60).json()
+    for group in config['layers'].get('overlays', []):
+        for layer in group.get('layers', []):
+            url = layer['olLayer']['source'].get('url', '')
+            if url.startswith('/proxy/wms/'):
+                return url
+    raise RuntimeError('No proxied overlay in the generated config')
+
+
+def run_cluster(args, directory, wms, cluster):
+    """Start args.nodes backends, request every tile args.passes times and return the statistics."""
+    mode = 'cluster' if cluster else 'independent'
+    layers_dir, app_dir = generate_configs(os.path.join(directory, mode), 10, wms.url)
+    ports = [_free_port() for _ in range(args.nodes)]
+    nodes = [f'http://127.0.0.1:{port}' for port in ports]
+    processes = []
+    try:
+        for i, port in enumerate(ports):
+            node_dir = os.path.join(directory, mode, f'node_{i}')
+            env = {
+                **os.environ,
+                'LAYERS_CONF_DIR': layers_dir,
+                'APP_CONFIG_DIR': app_dir,
+                'SHARED_CACHE_DIR': os.path.join(node_dir, 'shared_cache'),
+                'PRINT_CACHE_DIR': os.path.join(node_dir, 'print_cache'),
+                'METRICS_DIR': os.path.join(node_dir, 'metrics'),
+                'PYTHONPATH': os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            }
+            if cluster:
+                env['CLUSTER_PEERS'] = ','.join(nodes)
+                env['CLUSTER_SELF'] = nodes[i]
+            processes.append(start_server(env, port, args.server, args.workers)[0])
+
+        path = proxy_path(nodes[0])
+        tiles = tile_bboxes(args.columns, args.rows, args.tile_size)
+
+        def request(session, i):
+            # Round robin like nginx, every pass sends a tile to another node
+            tile = i % len(tiles)
+            node = nodes[(tile + i // len(tiles)) % len(nodes)]
+            return session.get(node + path, params={
+                'SERVICE': 'WMS', 'REQUEST': 'GetMap', 'VERSION': '1.1.1', 'LAYERS': 'layer_0',
+                'SRS': 'EPSG:25832', 'BBOX': ','.join(map(str, tiles[tile])),
+                'WIDTH': '256', 'HEIGHT': '256', 'FORMAT': 'image/png',
+            }, headers={'X-Real-IP': f'10.0.0.{i % args.concurrency}'}, timeout=60).ok
+
+        upstream_before = wms.requests
+        count = len(tiles) * args.passes
+        result = run_load(request, count, args.concurrency)
+        upstream = wms.requests - upstream_before
+        result.update({
+            'upstreamRequests': upstream,
+            'hitRate': round(1 - upstream / count, 3),
+        })
+        print(f'{mode} {args.nodes} nodes: {result}', file=sys.stderr)
+        return result
+    finally:
+        # Signal all nodes first, so they shut down in parallel
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--columns', type=int, default=20, help='Tile columns of the requested area')
+    parser.add_argument('--rows', type=int, default=10, help='Tile rows of the requested area')
+    parser.add_argument('--tile-size', type=float, default=500, help='Tile width in meters')
+    parser.add_argument('--passes', type=int, default=3, help='Requests per tile')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--server', choices=['gunicorn', 'werkzeug'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--wms-latency', type=float, default=0.02, help='Seconds per fake WMS request')
+    parser.add_argument('--wms-bytes', type=int, default=50000, help='Size of fake GetMap images')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    wms = fake_wms(args.wms_latency, args.wms_bytes)
+    try:
+        with tempfile.TemporaryDirectory(prefix='munimap-bench-cluster-') as directory:
+            runs = {
+                'independent': run_cluster(args, directory, wms, cluster=False),
+                'cluster': run_cluster(args, directory, wms, cluster=True),
+            }
+    finally:
+        wms.stop()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        'runs': runs,
+    }
+    encoded = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + '\n')
+    print(encoded)
+
+
+if __name__ == '__main__':
+    main()
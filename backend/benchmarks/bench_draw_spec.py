@@ -0,0 +1,95 @@
+# Benchmark of draw feature spec generation
+# Usage: python -m benchmarks.bench_draw_spec [--features 10000] [--scale 2500]
+
+import json
+import math
+import time
+import random
+import argparse
+
+from munimap.export import build_draw_layer, print_resolution
+
+STYLES = [
+    {'drawStyle_strokeColor': '#E2001A', 'drawStyle_strokeWidth': 3},
+    {'drawStyle_strokeColor': '#3399CC', 'drawStyle_strokeWidth': 2, 'drawStyle_strokeDash': [10, 10]},
+    {'drawStyle_fillColor': '#FFCC00', 'drawStyle_fillOpacity': 0.5},
+    {'drawStyle_pointRadius': 7, 'drawStyle_pointColor': '#00AA00'},
+    {'drawStyle_isTextFeature': True, 'drawStyle_text': 'Hinweis', 'drawStyle_fontSize': 14},
+]
+
+
+def freehand_line(rnd, x, y, vertices):
+    """Random walk with sub-millimetre coordinates, like a freehand drawing."""
+    coords = []
+    angle = rnd.uniform(0, 2 * math.pi)
+    for _ in range(vertices):
+        angle += rnd.uniform(-0.2, 0.2)
+        x += math.cos(angle) * rnd.uniform(0.05, 0.5)
+        y += math.sin(angle) * rnd.uniform(0.05, 0.5)
+        coords.append([x, y])
+    return coords
+
+
+def generate_features(count, seed=1):
+    """Generate a mix of points, text, freehand lines and polygons around Bielefeld."""
+    rnd = random.Random(seed)
+    features = []
+    for i in range(count):
+        x = rnd.uniform(460000, 476000)
+        y = rnd.uniform(5756000, 5772000)
+        kind = i % 4
+        if kind == 0:
+            geometry = {'type': 'Point', 'coordinates': [x, y]}
+            props = dict(STYLES[3 + rnd.randint(0, 1)])
+        elif kind in (1, 2):
+            geometry = {'type': 'LineString', 'coordinates': freehand_line(rnd, x, y, 200)}
+            props = dict(STYLES[rnd.randint(0, 1)])
+        else:
+            ring = freehand_line(rnd, x, y, 100)
+            ring.append(ring[0])
+            geometry = {'type': 'Polygon', 'coordinates': [ring]}
+            props = dict(STYLES[2])
+        features.append({'type': 'Feature', 'geometry': geometry, 'properties': props})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def measure(feature_collection, resolution, repeat):
+    build_timings = []
+    serialize_timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        layer = build_draw_layer(feature_collection, resolution)
+        build_timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        encoded = json.dumps(layer)
+        serialize_timings.append(time.perf_counter() - start)
+    return {
+        'buildSeconds': round(min(build_timings), 4),
+        'serializeSeconds': round(min(serialize_timings), 4),
+        'specBytes': len(encoded),
+        'styles': len(layer['style']) - 2,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--features', type=int, default=10000)
+    parser.add_argument('--scale', type=int, default=2500)
+    parser.add_argument('--srs', type=int, default=25832)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    feature_collection = generate_features(args.features)
+    results = {
+        'features': args.features,
+        'scale': args.scale,
+        'fullPrecision': measure(feature_collection, None, args.repeat),
+        'printResolution': measure(
+            feature_collection, print_resolution(args.scale, args.srs), args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
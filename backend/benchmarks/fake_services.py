@@ -0,0 +1,107 @@
+# Local fake upstream services for benchmarks
+# A WMS answering GetMap with a fixed size PNG and a MapFish Print server
+# finishing jobs after a fixed time, both with configurable latency
+
+import io
+import json
+import time
+import uuid
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+from PIL import Image
+
+
+def png_payload(size):
+    """PNG image of roughly size bytes (noise does not compress)."""
+    side = max(1, int((size / 4) ** 0.5))
+    image = Image.frombytes('RGBA', (side, side), bytes(
+        (i * 7919) % 251 for i in range(side * side * 4)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', compress_level=0)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, content, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _send_json(self, payload, status=200):
+        self._send(status, json.dumps(payload).encode('UTF-8'), 'application/json')
+
+
+class FakeWMSHandler(_Handler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        self._send(200, self.server.payload, 'image/png')
+
+
+class FakeMapFishHandler(_Handler):
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        time.sleep(self.server.latency)
+        ref = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.jobs[ref] = time.monotonic()
+        self._send_json({'ref': ref, 'statusURL': f'/print/status/{ref}.json'})
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        path = urlsplit(self.path).path
+        ref = path.rsplit('/', 1)[-1].removesuffix('.json')
+        with self.server.lock:
+            submitted = self.server.jobs.get(ref)
+        if submitted is None:
+            self._send_json({'status': 'error', 'error': 'Unknown job'}, status=404)
+        elif path.startswith('/print/status/'):
+            done = time.monotonic() - submitted >= self.server.job_duration
+            self._send_json({'done': done, 'status': 'finished' if done else 'running'})
+        else:
+            self._send(200, self.server.payload, 'application/pdf')
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0.0, payload_size=50000, job_duration=1.0):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.payload = png_payload(payload_size)
+        self.job_duration = job_duration
+        self.jobs = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def fake_wms(latency=0.0, payload_size=50000):
+    return FakeServer(FakeWMSHandler, latency, payload_size).start()
+
+
+def fake_mapfish(latency=0.0, payload_size=50000, job_duration=1.0):
+    return FakeServer(FakeMapFishHandler, latency, payload_size, job_duration).start()
@@ -0,0 +1,24 @@
+# Gunicorn settings and server hooks
+# Loaded from the working directory, keeps the shared metrics directory consistent
+
+import os
+
+from munimap import metrics
+
+METRICS_DIR = os.environ.get('METRICS_DIR', metrics.DEFAULT_DIRECTORY)
+
+# Threads per worker, the app sizes its proxy admission pools from the same variable
+threads = int(os.environ.get('WORKER_THREADS', 16))
+
+
+def on_starting(server):
+    # Counters restart with the server, drop snapshots of a previous run
+    metrics.reset_directory(METRICS_DIR)
+
+
+def child_exit(server, worker):
+    # Keep the counts of exited workers before their PID is reused
+    try:
+        metrics.registry.fold(worker.pid, METRICS_DIR)
+    except OSError as e:
+        server.log.warning(f"Could not fold metrics of worker {worker.pid}: {e}")
@@ -0,0 +1,167 @@
+# Admission control for upstream proxy requests
+# Bounds in-flight upstream requests per worker and per client, queues the
+# rest fairly between clients and sheds the oldest queued tile requests
+
+import math
+import time
+import threading
+import contextlib
+from collections import OrderedDict, deque, Counter
+
+from munimap import metrics
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed or not admitted in time."""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(f'Proxy request rejected: {reason}')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, client, sheddable):
+        self.client = client
+        self.sheddable = sheddable
+        self.queued_at = time.monotonic()
+        self.event = threading.Event()
+        self.granted = False
+        self.shed = False
+
+
+class AdmissionController:
+    """Limits concurrent upstream requests of one worker process.
+
+    At most ``max_in_flight`` requests run at once, at most
+    ``max_per_client`` of them for the same client. Further requests wait
+    in per-client FIFO queues. Free slots go to the waiting client with
+    the fewest requests in flight, so one client with many tiles in flight
+    does not delay others. Waiting requests hold a worker thread, so at
+    most ``max_queued`` of them wait; beyond that the oldest sheddable
+    waiter (a GetMap tile the client has most likely scrolled past) is
+    rejected to make room.
+
+    Requests that are not admitted within ``queue_timeout`` seconds are
+    rejected as well. Together the limits bound the threads the proxy can
+    hold, the rest of the worker threads stay free for other routes.
+    ``pool`` labels the metrics of this controller.
+    """
+
+    def __init__(self, max_in_flight=8, max_per_client=4, max_queued=4, queue_timeout=10.0, pool='upstream'):
+        self.pool = pool
+        self.max_in_flight = max_in_flight
+        self.max_per_client = max_per_client
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._client_in_flight = Counter()
+        self._queues = OrderedDict()
+        self._queued = 0
+
+    def _can_run(self, client):
+        return self._in_flight < self.max_in_flight and self._client_in_flight[client] < self.max_per_client
+
+    def _grant(self, client):
+        self._in_flight += 1
+        self._client_in_flight[client] += 1
+
+    def _dequeue(self, waiter):
+        queue = self._queues[waiter.client]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.client]
+        self._queued -= 1
+
+    def _dispatch(self):
+        """Admit waiters while slots are free, clients with the fewest
+        requests in flight first and round robin between equal ones."""
+        while self._in_flight < self.max_in_flight:
+            clients = [client for client in self._queues if self._client_in_flight[client] < self.max_per_client]
+            if not clients:
+                return
+            client = min(clients, key=lambda client: self._client_in_flight[client])
+            waiter = self._queues[client][0]
+            self._dequeue(waiter)
+            if client in self._queues:
+                self._queues.move_to_end(client)
+            self._grant(client)
+            waiter.granted = True
+            waiter.event.set()
+
+    def _shed_oldest(self):
+        """Reject the oldest sheddable waiter, returns False if there is none."""
+        waiters = [waiter for queue in self._queues.values() for waiter in queue if waiter.sheddable]
+        if not waiters:
+            return False
+        oldest = min(waiters, key=lambda waiter: waiter.queued_at)
+        self._dequeue(oldest)
+        oldest.shed = True
+        oldest.event.set()
+        return True
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, grows with the queue."""
+        return max(1, math.ceil(self.queue_timeout * self._queued / max(1, self.max_queued + self.max_in_flight)))
+
+    def acquire(self, client, sheddable=True):
+        """Block until the request may run. Raises AdmissionRejected."""
+        with self._lock:
+            if client not in self._queues and self._can_run(client):
+                self._grant(client)
+                metrics.proxy_admission.inc((self.pool, 'admitted'))
+                return
+            if self._queued >= self.max_queued and not self._shed_oldest():
+                metrics.proxy_admission.inc((self.pool, 'rejected'))
+                raise AdmissionRejected('queue full', self.retry_after())
+            waiter = _Waiter(client, sheddable)
+            self._queues.setdefault(client, deque()).append(waiter)
+            self._queued += 1
+
+        waiter.event.wait(self.queue_timeout)
+        with self._lock:
+            if waiter.granted:
+                metrics.proxy_admission.inc((self.pool, 'queued'))
+                metrics.proxy_admission_wait.observe((self.pool,), time.monotonic() - waiter.queued_at)
+                return
+            if waiter.shed:
+                metrics.proxy_admission.inc((self.pool, 'shed'))
+                raise AdmissionRejected('shed', self.retry_after())
+            self._dequeue(waiter)
+            metrics.proxy_admission.inc((self.pool, 'timeout'))
+            raise AdmissionRejected('timeout', self.retry_after())
+
+    def release(self, client):
+        with self._lock:
+            self._in_flight -= 1
+            self._client_in_flight[client] -= 1
+            if not self._client_in_flight[client]:
+                del self._client_in_flight[client]
+            self._dispatch()
+
+    @contextlib.contextmanager
+    def admit(self, client, sheddable=True):
+        """Context manager running the block in an admitted slot."""
+        self.acquire(client, sheddable)
+        try:
+            yield
+        finally:
+            self.release(client)
+
+    def busy(self, share=0.5):
+        """Check whether requests wait or more than share of the slots are used."""
+        with self._lock:
+            return self._queued > 0 or self._in_flight >= self.max_in_flight * share
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inFlight': self._in_flight,
+                'queued': self._queued,
+                'clients': len(self._client_in_flight),
+                'maxInFlight': self.max_in_flight,
+                'maxPerClient': self.max_per_client,
+                'maxQueued': self.max_queued,
+            }
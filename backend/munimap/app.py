@@ -2,27 +2,59 @@
 # Phase 1: Configuration API + WMS Proxy
 
 import os
+import gzip
+import json
+import math
+import time
+import hashlib
 import yaml
+import brotli
+import tempfile
 import logging
 import requests
-from flask import Flask, jsonify, send_from_directory, request, Response
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, g, jsonify, send_file, send_from_directory, request, Response
 from flask_cors import CORS
 
 from munimap.layers import load_layers_config, create_anol_layers
-from munimap.app_layers_def import prepare_layers_def, prepare_catalog_names, prepare_catalog_group_def
+from munimap.app_layers_def import (
+    prepare_layers_def, prepare_catalog_names, prepare_catalog_group_def, prepare_catalog_group_defs,
+    names_from_layers_def
+)
 from munimap.export import export_bp
+from munimap.config_snapshots import SnapshotHistory, diff_layers_def
+from munimap.static_geojson import StaticGeoJSONStore, METERS_PER_DEGREE
+from munimap.tile_grid import TileGrid
+from munimap.sensorthings import SensorThingsAggregator, SensorThingsError, snapshot_response, source_key
+from munimap.geocoder import GeocoderProxy, GeocoderError, DEFAULT_MAX_RESULTS
+from munimap import metrics
+from munimap.reproject import MAP_PROJECTION, UnsupportedProjectionError, normalize_srs
+from munimap.profiling import init_profiling, phase, PROFILE_PARAM
+from munimap.shared_cache import create_shared_cache
+from munimap.tile_pack import TilePackStore, pack_sources
+from munimap.admission import AdmissionController, AdmissionRejected
+from munimap.prefetch import TilePrefetcher, normalize_bbox
+from munimap.cluster import Cluster, FORWARDED_HEADER
+from munimap.tile_facade import TileFacade, FORMATS as FACADE_FORMATS, is_facade_layer
+from munimap.wms_composite import COMPOSITE_PARAM, CompositeError, plan_getmaps, composite_images
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger('munimap')
 
+# Upstream response headers of one client that are not stored in the shared cache
+UNCACHED_HEADERS = (
+    'set-cookie', 'set-cookie2', 'www-authenticate', 'proxy-authenticate', 'keep-alive', 'upgrade', 'trailer'
+)
+
 
 def load_app_config(config_name=None, config_dir='configs/app_configs'):
     """Load application configuration from YAML file."""
     # Load default config
     default_path = os.path.join(config_dir, 'default.yaml')
     if os.path.exists(default_path):
-        with open(default_path, 'r') as f:
+        with open(default_path, 'r') as f, phase('yaml_load'):
             config = yaml.safe_load(f) or {}
     else:
         config = {}
@@ -31,9 +63,10 @@ def load_app_config(config_name=None, config_dir='configs/app_configs'):
     if config_name and config_name != 'default':
         specific_path = os.path.join(config_dir, f'{config_name}.yaml')
         if os.path.exists(specific_path):
-            with open(specific_path, 'r') as f:
+            with open(specific_path, 'r') as f, phase('yaml_load'):
                 specific_config = yaml.safe_load(f) or {}
-            config = deep_merge(config, specific_config)
+            with phase('deep_merge'):
+                config = deep_merge(config, specific_config)
 
     return config
 
@@ -61,62 +94,743 @@ def create_app(config_path=None):
 
     # Configuration
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    app.config['LAYERS_CONF_DIR'] = os.path.join(base_dir, 'configs', 'layers_conf')
-    app.config['APP_CONFIG_DIR'] = os.path.join(base_dir, 'configs', 'app_configs')
+    app.config['LAYERS_CONF_DIR'] = os.environ.get(
+        'LAYERS_CONF_DIR',
+        os.path.join(base_dir, 'configs', 'layers_conf')
+    )
+    app.config['APP_CONFIG_DIR'] = os.environ.get(
+        'APP_CONFIG_DIR',
+        os.path.join(base_dir, 'configs', 'app_configs')
+    )
     app.config['STATIC_GEOJSON_DIR'] = os.path.join(base_dir, 'configs', 'static_geojson')
+    app.config['STATIC_GEOJSON_CACHE_DIR'] = os.environ.get(
+        'STATIC_GEOJSON_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'munimap-static-geojson')
+    )
+    app.config['SENSORTHINGS_CACHE_DIR'] = os.environ.get(
+        'SENSORTHINGS_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'munimap-sensorthings')
+    )
+    app.config['ADDRESS_DATA_DIR'] = os.path.join(base_dir, 'configs', 'addresses')
+    app.config['TILE_PACK_DIR'] = os.environ.get('TILE_PACK_DIR', os.path.join(base_dir, 'configs', 'tile_packs'))
+    app.config['TILE_PACK_POOL_SIZE'] = int(os.environ.get('TILE_PACK_POOL_SIZE', 8))
+    app.config['TILE_PACK_MAX_AGE'] = int(os.environ.get('TILE_PACK_MAX_AGE', 86400))
+    # Larger GetMaps are not composed from pack tiles but passed to the upstream service
+    app.config['TILE_PACK_MAX_PIXELS'] = int(os.environ.get('TILE_PACK_MAX_PIXELS', 4096))
+    # Facade tile URLs change with the layer source, so tiles can be kept long
+    app.config['TILE_FACADE_MAX_AGE'] = int(os.environ.get('TILE_FACADE_MAX_AGE', 7 * 86400))
+    app.config['SEARCH_CACHE_SIZE'] = int(os.environ.get('SEARCH_CACHE_SIZE', 2000))
+    app.config['SEARCH_CACHE_TTL'] = float(os.environ.get('SEARCH_CACHE_TTL', 300))
+    app.config['SEARCH_MAX_RESULTS'] = 50
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', metrics.DEFAULT_DIRECTORY)
+    app.config['SHARED_CACHE_BACKEND'] = os.environ.get('SHARED_CACHE_BACKEND', 'file')
+    app.config['SHARED_CACHE_DIR'] = os.environ.get(
+        'SHARED_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'munimap-shared-cache')
+    )
+    app.config['SHARED_CACHE_MAX_BYTES'] = int(os.environ.get('SHARED_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    app.config['SHARED_CACHE_TTL'] = float(os.environ.get('SHARED_CACHE_TTL', 300))
+    # Cache lifetime of proxied responses by WMS request type, others are not cached
+    app.config['PROXY_CACHE_TTL'] = {
+        'getmap': float(os.environ.get('PROXY_CACHE_TTL', 300)),
+        'getlegendgraphic': float(os.environ.get('PROXY_LEGEND_CACHE_TTL', 3600)),
+    }
+    app.config['CLUSTER_PEERS'] = [peer for peer in os.environ.get('CLUSTER_PEERS', '').split(',') if peer.strip()]
+    app.config['CLUSTER_SELF'] = os.environ.get('CLUSTER_SELF')
+    cluster_enabled = bool(app.config['CLUSTER_PEERS'] and app.config['CLUSTER_SELF'])
+    # Gunicorn threads per worker (gunicorn.conf.py reads the same variable) and the
+    # threads kept free for config, health and export requests. Requests in flight
+    # and queued in all admission pools share the rest.
+    app.config['WORKER_THREADS'] = int(os.environ.get('WORKER_THREADS', 16))
+    app.config['PROXY_RESERVED_THREADS'] = int(os.environ.get('PROXY_RESERVED_THREADS', 4))
+    # Upstream proxy requests per worker, cluster nodes leave room for forwards
+    app.config['PROXY_MAX_IN_FLIGHT'] = int(os.environ.get('PROXY_MAX_IN_FLIGHT', 6 if cluster_enabled else 8))
+    app.config['PROXY_MAX_PER_CLIENT'] = int(os.environ.get('PROXY_MAX_PER_CLIENT', 4))
+    app.config['PROXY_MAX_QUEUED'] = int(os.environ.get('PROXY_MAX_QUEUED', 2 if cluster_enabled else 4))
+    app.config['PROXY_QUEUE_TIMEOUT'] = float(os.environ.get('PROXY_QUEUE_TIMEOUT', 10))
+    app.config['PREFETCH_ENABLED'] = os.environ.get('PREFETCH_ENABLED', '').lower() in ('1', 'true', 'yes')
+    app.config['PREFETCH_BUDGET'] = int(os.environ.get('PREFETCH_BUDGET', 120))
+    app.config['PREFETCH_WORKERS'] = int(os.environ.get('PREFETCH_WORKERS', 2))
+    app.config['CLUSTER_PEER_TIMEOUT'] = float(os.environ.get('CLUSTER_PEER_TIMEOUT', 35))
+    app.config['CLUSTER_RETRY_INTERVAL'] = float(os.environ.get('CLUSTER_RETRY_INTERVAL', 10))
+    app.config['CLUSTER_MAX_QUEUED'] = int(os.environ.get('CLUSTER_MAX_QUEUED', 1))
+    # Forwards default to the threads the upstream pool leaves
+    forward_headroom = (
+        app.config['WORKER_THREADS'] - app.config['PROXY_RESERVED_THREADS'] - app.config['PROXY_MAX_IN_FLIGHT']
+        - app.config['PROXY_MAX_QUEUED'] - app.config['CLUSTER_MAX_QUEUED']
+    )
+    app.config['CLUSTER_MAX_FORWARDS'] = int(os.environ.get('CLUSTER_MAX_FORWARDS', max(1, forward_headroom)))
+    app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    app.config['PROFILING_TOKEN'] = os.environ.get('PROFILING_TOKEN')
+    app.config['PROFILING_MODE'] = os.environ.get('PROFILING_MODE', 'sampling')
+    app.config['PROFILING_DIR'] = os.environ.get(
+        'PROFILING_DIR',
+        os.path.join(tempfile.gettempdir(), 'munimap-profiles')
+    )
+    app.config['PROFILING_MAX_FILES'] = int(os.environ.get('PROFILING_MAX_FILES', 100))
     app.config['PROXY_HASH_SALT'] = 'olkd-svelte-dev'
+    app.config['LAYERS_CONF_RELOAD_INTERVAL'] = float(os.environ.get('LAYERS_CONF_RELOAD_INTERVAL', 0))
+    app.config['CONFIG_SNAPSHOT_HISTORY'] = int(os.environ.get('CONFIG_SNAPSHOT_HISTORY', 10))
 
-    # Load layers configuration on startup
-    layers_conf_dir = app.config['LAYERS_CONF_DIR']
-    if os.path.exists(layers_conf_dir):
-        try:
-            layers_config = load_layers_config(
-                layers_conf_dir,
-                proxy_hash_salt=app.config['PROXY_HASH_SALT']
-            )
-            app.layers_config = layers_config
-            app.anol_layers = create_anol_layers(layers_config)
-            log.info(f"Loaded {len(layers_config['layers'])} layers from {layers_conf_dir}")
-        except Exception as e:
-            log.error(f"Failed to load layers config: {e}")
+    def layers_conf_signature():
+        """Return modification times of all layer config files."""
+        layers_conf_dir = app.config['LAYERS_CONF_DIR']
+        if not os.path.exists(layers_conf_dir):
+            return None
+        return tuple(sorted(
+            (filename, os.path.getmtime(os.path.join(layers_conf_dir, filename)))
+            for filename in os.listdir(layers_conf_dir)
+            if filename.endswith('.yaml')
+        ))
+
+    def load_layers():
+        """Load layers configuration into the app."""
+        layers_conf_dir = app.config['LAYERS_CONF_DIR']
+        app.layers_conf_signature = layers_conf_signature()
+        app.layers_conf_checked = time.monotonic()
+        if os.path.exists(layers_conf_dir):
+            try:
+                layers_config = load_layers_config(
+                    layers_conf_dir,
+                    proxy_hash_salt=app.config['PROXY_HASH_SALT']
+                )
+                app.layers_config = layers_config
+                app.anol_layers = create_anol_layers(layers_config, app.tile_facade)
+                log.info(f"Loaded {len(layers_config['layers'])} layers from {layers_conf_dir}")
+            except Exception as e:
+                log.error(f"Failed to load layers config: {e}")
+                app.layers_config = {'backgrounds': [], 'groups': [], 'layers': {}, 'hash_map': {}}
+                app.anol_layers = {'backgroundLayer': [], 'overlays': []}
+        else:
+            log.warning(f"Layers config directory not found: {layers_conf_dir}")
             app.layers_config = {'backgrounds': [], 'groups': [], 'layers': {}, 'hash_map': {}}
             app.anol_layers = {'backgroundLayer': [], 'overlays': []}
+        app.tile_pack_sources = pack_sources(app.layers_config['layers'])
+
+    # Tile grid of the WMTS/XYZ facade, matching the map view of the default app config
+    app.tile_facade = TileFacade.from_map_config(
+        load_app_config(None, app.config['APP_CONFIG_DIR']).get('map', {}))
+
+    # Load layers configuration on startup
+    load_layers()
+    app.reload_layers = load_layers
+    app.shared_cache = create_shared_cache(app.config)
+    def check_thread_budget():
+        """Fail at startup if the admission pools can hold more threads than they may use."""
+        names = ['PROXY_MAX_IN_FLIGHT', 'PROXY_MAX_QUEUED']
+        if cluster_enabled:
+            names += ['CLUSTER_MAX_FORWARDS', 'CLUSTER_MAX_QUEUED']
+        held = sum(app.config[name] for name in names)
+        budget = app.config['WORKER_THREADS'] - app.config['PROXY_RESERVED_THREADS']
+        if held > budget:
+            raise ValueError(
+                f"{' + '.join(names)} = {held} exceeds WORKER_THREADS - PROXY_RESERVED_THREADS = {budget}")
+
+    check_thread_budget()
+    app.proxy_admission = AdmissionController(
+        max_in_flight=app.config['PROXY_MAX_IN_FLIGHT'],
+        max_per_client=app.config['PROXY_MAX_PER_CLIENT'],
+        max_queued=app.config['PROXY_MAX_QUEUED'],
+        queue_timeout=app.config['PROXY_QUEUE_TIMEOUT']
+    )
+    if cluster_enabled:
+        app.cluster = Cluster(
+            app.config['CLUSTER_SELF'],
+            app.config['CLUSTER_PEERS'],
+            timeout=app.config['CLUSTER_PEER_TIMEOUT'],
+            retry_interval=app.config['CLUSTER_RETRY_INTERVAL']
+        )
+        # Forwards get their own pool: sharing the upstream slots, nodes
+        # forwarding to each other could wait on each other's slots
+        app.cluster_admission = AdmissionController(
+            max_in_flight=app.config['CLUSTER_MAX_FORWARDS'],
+            max_per_client=app.config['PROXY_MAX_PER_CLIENT'],
+            max_queued=app.config['CLUSTER_MAX_QUEUED'],
+            queue_timeout=app.config['PROXY_QUEUE_TIMEOUT'],
+            pool='cluster'
+        )
     else:
-        log.warning(f"Layers config directory not found: {layers_conf_dir}")
-        app.layers_config = {'backgrounds': [], 'groups': [], 'layers': {}, 'hash_map': {}}
-        app.anol_layers = {'backgroundLayer': [], 'overlays': []}
+        app.cluster = None
+        app.cluster_admission = None
+    app.tile_packs = TilePackStore(app.config['TILE_PACK_DIR'], app.config['TILE_PACK_POOL_SIZE'])
+    app.config_snapshots = SnapshotHistory(app.config['CONFIG_SNAPSHOT_HISTORY'], app.shared_cache)
+    app.static_geojson = StaticGeoJSONStore(
+        app.config['STATIC_GEOJSON_DIR'],
+        app.config['STATIC_GEOJSON_CACHE_DIR']
+    )
+    # Convert in the data projection and the map projection before the first requests
+    app.static_geojson.warm([
+        (layer['source']['file'], layer['source'].get('srs', 'EPSG:4326'), target)
+        for layer in app.layers_config.get('layers', {}).values()
+        if layer.get('type') == 'static_geojson' and layer['source'].get('file')
+        for target in (layer['source'].get('srs', 'EPSG:4326'), MAP_PROJECTION)
+    ])
+    map_grid = TileGrid.for_projection(MAP_PROJECTION)
+    app.sensorthings = SensorThingsAggregator(app.config['SENSORTHINGS_CACHE_DIR'])
+    # Proxied layers are served from snapshots, keep them fresh without waiting for requests
+    app.sensorthings.start([
+        layer['source'] for layer in app.layers_config.get('layers', {}).values()
+        if layer.get('type') == 'sensorthings' and layer.get('hash')
+    ])
+    app.geocoder = GeocoderProxy(
+        app.config['ADDRESS_DATA_DIR'],
+        cache_size=app.config['SEARCH_CACHE_SIZE'],
+        cache_ttl=app.config['SEARCH_CACHE_TTL']
+    )
+
+    metrics.registry.configure(app.config['METRICS_DIR'])
+    init_profiling(app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        """Record request count, latency and size per route."""
+        started = g.get('request_started')
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_duration.observe((route,), time.perf_counter() - started)
+        metrics.http_requests.inc((route, request.method, str(response.status_code)))
+        if response.content_length:
+            metrics.http_response_bytes.inc((route,), response.content_length)
+        return response
+
+    @app.before_request
+    def reload_changed_layers():
+        """Reload layers configuration when files changed (if enabled)."""
+        interval = app.config['LAYERS_CONF_RELOAD_INTERVAL']
+        if not interval or time.monotonic() - app.layers_conf_checked < interval:
+            return
+        app.layers_conf_checked = time.monotonic()
+        if layers_conf_signature() != app.layers_conf_signature:
+            log.info("Layers config changed, reloading")
+            load_layers()
+
+    def config_cache_key(config_name, namespace='config'):
+        """Return the shared cache key of a compiled config or None.
+
+        The key changes with the app config files and the layers config
+        this worker has loaded.
+        """
+        config_dir = app.config['APP_CONFIG_DIR']
+        paths = [os.path.join(config_dir, 'default.yaml')]
+        if config_name != 'default':
+            paths.append(os.path.join(config_dir, f'{config_name}.yaml'))
+        try:
+            signature = (tuple(os.path.getmtime(path) for path in paths), app.layers_conf_signature)
+        except OSError:
+            return None
+        return f'{namespace}:{config_name}:{hashlib.sha1(repr(signature).encode("UTF-8")).hexdigest()[:16]}'
 
     # API Routes
     @app.route('/api/v1/app/<config>/config')
     @app.route('/api/v1/app/config')
     def get_config(config=None):
-        """Return app configuration and layers for frontend."""
+        """Return app configuration and layers for frontend.
+
+        Clients that already hold a config snapshot can pass its version
+        as ``since`` to receive only the changes to the layer definitions.
+        Unknown or expired versions fall back to the full payload.
+        """
         try:
+            config_name = config or 'default'
+            since = request.args.get('since')
+            cache_key = config_cache_key(config_name)
+            if cache_key:
+                entry = app.shared_cache.get(cache_key)
+                if entry is not None and since == entry.meta['version']:
+                    return jsonify({'version': since, 'unchanged': True})
+                if entry is not None and not since:
+                    return Response(entry.value, mimetype='application/json')
+
             app_config = load_app_config(
                 config,
                 app.config['APP_CONFIG_DIR']
             )
-            layers_def = prepare_layers_def(
-                app_config,
-                app.anol_layers,
-                app.layers_config.get('layers', {})
-            )
-            return jsonify({
+            with phase('prepare_layers_def'):
+                layers_def = prepare_layers_def(
+                    app_config,
+                    app.anol_layers,
+                    app.layers_config.get('layers', {})
+                )
+            payload = {
                 'app': app_config,
                 'layers': layers_def
-            })
+            }
+            with phase('snapshot'):
+                version = app.config_snapshots.record(config_name, payload)
+
+            if since == version:
+                return jsonify({'version': version, 'unchanged': True})
+
+            previous = app.config_snapshots.get(config_name, since) if since else None
+            if previous is not None:
+                delta = {
+                    'version': version,
+                    'since': since,
+                    'delta': diff_layers_def(previous['layers'], layers_def)
+                }
+                if previous['app'] != app_config:
+                    delta['app'] = app_config
+                return jsonify(delta)
+
+            with phase('serialization'):
+                response = jsonify({
+                    'version': version,
+                    'app': app_config,
+                    'layers': layers_def
+                })
+            if cache_key:
+                app.shared_cache.set(cache_key, response.get_data(), {'version': version})
+            return response
         except Exception as e:
             log.error(f"Error loading config: {e}")
             return jsonify({'error': str(e)}), 500
 
-    @app.route('/static_geojson/<path:filename>')
-    def serve_static_geojson(filename):
-        """Serve static GeoJSON files."""
+    def build_bootstrap(config, names):
+        """Return (JSON body, ETag) of the bootstrap payload."""
+        config_name = config or 'default'
+        app_config = load_app_config(config, app.config['APP_CONFIG_DIR'])
+        layers_config = app.layers_config.get('layers', {})
+        with phase('prepare_layers_def'):
+            layers_def = prepare_layers_def(app_config, app.anol_layers, layers_config)
+        with phase('snapshot'):
+            version = app.config_snapshots.record(config_name, {'app': app_config, 'layers': layers_def})
+
+        catalog, catalog_groups = [], []
+        if app_config.get('components', {}).get('catalog'):
+            with phase('catalog'):
+                catalog = prepare_catalog_names(app_config, app.anol_layers, layers_config, layers_def)
+                # Groups of the URL state that are not part of the config come from the catalog
+                group_of = {}
+                for group in app.anol_layers.get('overlays', []):
+                    group_of[group['name']] = group['name']
+                    for layer in group.get('layers', []):
+                        group_of.setdefault(layer['name'], group['name'])
+                used_names = names_from_layers_def(layers_def)
+                missing = [
+                    name for name in dict.fromkeys(group_of[name] for name in names if name in group_of)
+                    if name not in used_names
+                ]
+                group_defs = prepare_catalog_group_defs(missing, app_config, app.anol_layers, layers_config)
+                catalog_groups = [group_defs[name] for name in missing if name in group_defs]
+
+        with phase('serialization'):
+            body = json.dumps({
+                'version': version,
+                'app': app_config,
+                'layers': layers_def,
+                'catalog': {'groups': catalog},
+                'catalogGroups': catalog_groups,
+            }, separators=(',', ':')).encode('UTF-8')
+        return body, hashlib.sha1(body).hexdigest()[:16]
+
+    @app.route('/api/v1/app/<config>/bootstrap')
+    @app.route('/api/v1/app/bootstrap')
+    def get_bootstrap(config=None):
+        """Return app config, layers, catalog and URL state groups in one response.
+
+        ``groups`` lists the overlay group or layer names of the URL state;
+        catalog groups among them that are not in the config are returned
+        with their full definitions. The payload
+        is cached per config and groups, precompressed and revalidated by ETag.
+        """
+        names = list(dict.fromkeys(
+            name.strip() for name in request.args.get('groups', '').split(',') if name.strip()))
+        encoding = next((encoding for encoding in ('br', 'gzip') if encoding in request.accept_encodings), None)
+        def compress(body):
+            if encoding == 'br':
+                return brotli.compress(body, quality=5)
+            return gzip.compress(body, 6)
+
+        try:
+            cache_key = config_cache_key(config or 'default', 'bootstrap')
+            if cache_key is None:
+                body, etag = build_bootstrap(config, names)
+                if encoding:
+                    body = compress(body)
+            else:
+                cache_key += ':' + ','.join(names)
+
+                def load():
+                    body, etag = build_bootstrap(config, names)
+                    return body, {'etag': etag}
+
+                entry, _ = app.shared_cache.get_or_load(cache_key, load)
+                body, etag = entry.value, entry.meta['etag']
+                if encoding:
+                    entry, _ = app.shared_cache.get_or_load(f'{cache_key}:{encoding}', lambda: (compress(body), {}))
+                    body = entry.value
+        except Exception as e:
+            log.error(f"Error loading bootstrap: {e}")
+            return jsonify({'error': str(e)}), 500
+
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(f'{etag}-{encoding or "identity"}')
+        return response.make_conditional(request)
+
+    def static_geojson_projection(filename):
+        """Return the dataProjection of a static GeoJSON file."""
+        for layer in app.layers_config.get('layers', {}).values():
+            if layer.get('type') == 'static_geojson' and layer['source'].get('file') == filename:
+                return layer['source'].get('srs', 'EPSG:4326')
+        return 'EPSG:4326'
+
+    def static_geojson_index(filename):
+        """Return the index of a static GeoJSON file in the requested ``srs``.
+
+        Without ``srs`` the features stay in the layer's dataProjection.
+        """
+        source = static_geojson_projection(filename)
+        return app.static_geojson.get(filename, source, request.args.get('srs') or source)
+
+    @app.errorhandler(UnsupportedProjectionError)
+    def unsupported_projection(e):
+        return jsonify({'error': str(e)}), 400
+
+    def send_precompressed_geojson(filename):
+        """Send a precompressed variant of a file if the client accepts one."""
+        source = static_geojson_projection(filename)
+        target = request.args.get('srs') or source
+        reprojected = normalize_srs(target) != normalize_srs(source)
+        try:
+            index = app.static_geojson.get(filename, source, target)
+        except (ValueError, OSError) as e:
+            if reprojected:
+                raise
+            log.warning(f"Could not convert static GeoJSON {filename}: {e}")
+            index = None
+
+        if index is not None:
+            for encoding in ('br', 'gzip'):
+                if encoding not in request.accept_encodings:
+                    continue
+                path = app.static_geojson.compressed_path(filename, target, encoding)
+                if path is None:
+                    continue
+                response = send_file(path, mimetype='application/geo+json', conditional=True)
+                response.headers['Content-Encoding'] = encoding
+                response.headers['Vary'] = 'Accept-Encoding'
+                return response
+            if reprojected:
+                # Reprojected files are only stored compressed
+                path = app.static_geojson.compressed_path(filename, target, 'gzip')
+                with open(path, 'rb') as f:
+                    return Response(gzip.decompress(f.read()), mimetype='application/geo+json')
+
         return send_from_directory(
             app.config['STATIC_GEOJSON_DIR'],
             filename
         )
 
+    @app.route('/static_geojson/<path:filename>')
+    def serve_static_geojson(filename):
+        """Serve static GeoJSON files.
+
+        ``srs`` selects the output projection (default: the layer's
+        dataProjection). With ``bbox`` (in that projection) only intersecting
+        features are returned, simplified for ``resolution`` (meters per
+        pixel) or ``zoom`` if given. With ``format=pack`` the features
+        ``start`` to ``start + count`` are streamed as binary vector pack.
+        """
+        if request.args.get('format') == 'pack':
+            try:
+                start = int(request.args.get('start', 0))
+                count = int(request.args['count']) if 'count' in request.args else None
+            except ValueError as e:
+                return jsonify({'error': f'Invalid parameter: {e}'}), 400
+            index = static_geojson_index(filename)
+            if index is None:
+                return jsonify({'error': 'File not found'}), 404
+            response = Response(
+                index.features.stream(start, count),
+                mimetype='application/vnd.munimap.vector-pack'
+            )
+            response.headers['X-Feature-Count'] = str(len(index.features))
+            return response
+
+        bbox_param = request.args.get('bbox')
+        if not bbox_param:
+            return send_precompressed_geojson(filename)
+
+        try:
+            bbox = [float(value) for value in bbox_param.split(',')]
+            if len(bbox) != 4:
+                raise ValueError('bbox needs four values')
+            if 'resolution' in request.args:
+                resolution = float(request.args['resolution'])
+            elif 'zoom' in request.args:
+                resolution = map_grid.resolution(int(request.args['zoom']))
+            else:
+                resolution = None
+            # Simplification levels are powers of two of the resolution
+            if resolution is not None and (not math.isfinite(resolution) or resolution <= 0):
+                raise ValueError('resolution must be a positive number')
+        except (ValueError, OverflowError) as e:
+            return jsonify({'error': f'Invalid parameter: {e}'}), 400
+
+        index = static_geojson_index(filename)
+        if index is None:
+            return jsonify({'error': 'File not found'}), 404
+        return jsonify(index.feature_collection(bbox, resolution))
+
+    @app.route('/static_geojson/<path:filename>/tiles/<int:z>/<int:x>/<int:y>')
+    def serve_static_geojson_tile(filename, z, x, y):
+        """Serve the features of a static GeoJSON file for one tile.
+
+        Tiles use the grid of the requested ``srs`` or the layer's
+        dataProjection.
+        """
+        projection = normalize_srs(request.args.get('srs') or static_geojson_projection(filename))
+        grid = TileGrid.for_projection(projection)
+        if grid is None:
+            return jsonify({'error': f'No tile grid for {projection}'}), 400
+        if not grid.valid_tile(z, x, y):
+            return jsonify({'error': 'Tile out of range'}), 404
+
+        index = static_geojson_index(filename)
+        if index is None:
+            return jsonify({'error': 'File not found'}), 404
+
+        resolution = grid.resolution(z)
+        if index.geographic:
+            resolution *= METERS_PER_DEGREE
+        response = jsonify(index.feature_collection(grid.tile_bbox(z, x, y), resolution))
+        response.headers['Cache-Control'] = 'public, max-age=300'
+        return response
+
+    def tile_pack_response(content, content_type):
+        response = Response(content, mimetype=content_type)
+        response.headers['Cache-Control'] = f"public, max-age={app.config['TILE_PACK_MAX_AGE']}"
+        response.headers['X-Tile-Pack'] = 'HIT'
+        return response
+
+    def tile_pack_getmap(hash, params):
+        """Answer a GetMap from the tile pack of the requested layers, or return None."""
+        upper = {key.upper(): value for key, value in params.items()}
+        if upper.get('REQUEST', '').lower() != 'getmap':
+            return None
+        filename = app.tile_pack_sources.get((hash, upper.get('LAYERS')))
+        if filename is None or normalize_srs(upper.get('SRS') or upper.get('CRS') or '') != MAP_PROJECTION:
+            return None
+        pack = app.tile_packs.get(filename)
+        if pack is None:
+            return None
+        try:
+            bbox = [float(value) for value in upper['BBOX'].split(',')]
+            width, height = int(upper['WIDTH']), int(upper['HEIGHT'])
+        except (KeyError, ValueError):
+            return None
+        if len(bbox) != 4 or width <= 0 or height <= 0:
+            return None
+        max_pixels = app.config['TILE_PACK_MAX_PIXELS']
+        if width > max_pixels or height > max_pixels:
+            return None
+
+        with phase('tile_pack'):
+            tile = pack.match_tile(bbox, width, height)
+            if tile is not None:
+                content = pack.get_tile(*tile)
+                return tile_pack_response(content, pack.format) if content is not None else None
+            image_format = 'image/jpeg' if 'jpeg' in upper.get('FORMAT', '') else 'image/png'
+            content = pack.render(bbox, width, height, image_format)
+        return tile_pack_response(content, image_format) if content is not None else None
+
+    @app.route('/proxy/tilepack/<layer_name>/<int:z>/<int:x>/<int:y>')
+    def tile_pack_tile(layer_name, z, x, y):
+        """Serve a tile of the map grid from the tile pack of a layer."""
+        layer = app.layers_config.get('layers', {}).get(layer_name)
+        filename = (layer or {}).get('source', {}).get('tilePack')
+        pack = app.tile_packs.get(filename) if filename else None
+        if pack is None:
+            return jsonify({'error': 'Unknown tile pack'}), 404
+        content = pack.get_tile(z, x, y)
+        if content is None:
+            return jsonify({'error': 'Tile not found'}), 404
+        return tile_pack_response(content, pack.format)
+
+    def fetch_upstream(hash, target_url, params):
+        """Return (status, headers, content) of the upstream response."""
+        started = time.perf_counter()
+        with phase('upstream'):
+            resp = requests.get(
+                target_url,
+                params=params,
+                timeout=30,
+                stream=True
+            )
+            content = resp.content
+        metrics.upstream_duration.observe((hash,), time.perf_counter() - started)
+
+        # Build response with same content type
+        excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
+        headers = [(name, value) for name, value in resp.raw.headers.items()
+                  if name.lower() not in excluded_headers]
+        return resp.status_code, headers, content
+
+    def cacheable_headers(headers):
+        """Upstream headers without per-client ones, which must not be replayed to other clients."""
+        return [(name, value) for name, value in headers if name.lower() not in UNCACHED_HEADERS]
+
+    def normalized_params(params):
+        """Params as sorted query string with upper case keys.
+
+        BBOX is rounded to a millionth of its size, so tile bounds the
+        client and the prefetcher compute with different float rounding
+        share one entry. The rounding does not depend on PREFETCH_ENABLED,
+        so all cluster nodes agree on the owner of a key.
+        """
+        return urlencode(sorted(
+            (key.upper(), normalize_bbox(value) if key.upper() == 'BBOX' else value)
+            for key, value in params.items()
+        ))
+
+    def proxy_cache_key(hash, params):
+        """Shared cache key of a proxied request."""
+        return f'proxy:{hash}:{normalized_params(params)}'
+
+    def cluster_owner(target_url, params):
+        """Peer caching the request in cluster mode, None if this node does.
+
+        The ring key is the upstream URL, not the salted hash, so nodes
+        only have to agree on the layer configs.
+        """
+        if app.cluster is None:
+            return None
+        return app.cluster.owner(f'{target_url}?{normalized_params(params)}')
+
+    def proxy_request(hash, target_url, params, client, forwarded=False):
+        """Return (status, headers, content, cache) of a proxied WMS request.
+
+        GetMap and GetLegendGraphic images are shared through the shared
+        cache, cache is then 'HIT' or 'MISS' and None otherwise. Upstream
+        requests pass the admission control of client and raise
+        AdmissionRejected when they are shed. In cluster mode cached
+        requests are answered by their owner node, unless the request was
+        forwarded by a peer already or the owner is unreachable.
+        """
+        request_type = next((value for key, value in params.items() if key.upper() == 'REQUEST'), '')
+
+        def admit():
+            # Queued GetMap tiles are shed first, the client has most likely moved on
+            return app.proxy_admission.admit(client, sheddable=request_type.lower() == 'getmap')
+
+        ttl = app.config['PROXY_CACHE_TTL'].get(request_type.lower())
+        if not ttl:
+            with admit():
+                return fetch_upstream(hash, target_url, params) + (None,)
+
+        owner = None if forwarded else cluster_owner(target_url, params)
+        if owner is not None:
+            try:
+                with app.cluster_admission.admit(client, sheddable=request_type.lower() == 'getmap'):
+                    return app.cluster.fetch(owner, f'/proxy/wms/{hash}/service', params, client)
+            except requests.RequestException as e:
+                log.warning(f"Cluster peer {owner} failed, fetching {hash} locally: {e}")
+        elif app.cluster is not None:
+            metrics.cluster_requests.inc(('local',))
+
+        # Only images are shared, WMS exceptions and errors are passed through
+        uncached = []
+
+        def load():
+            status, headers, content = fetch_upstream(hash, target_url, params)
+            content_type = next((value for name, value in headers if name.lower() == 'content-type'), '')
+            if status != 200 or not content_type.startswith('image/'):
+                uncached.append((status, headers, content))
+                return None
+            return content, {'headers': cacheable_headers(headers)}
+
+        key = proxy_cache_key(hash, params)
+        # Admitted before waiting for a concurrent load of the key, so waiters hold slots too
+        entry, hit = app.shared_cache.get_or_load(key, load, ttl, guard=admit)
+        if entry is None:
+            return uncached[0] + (None,)
+        if hit and entry.meta.get('prefetched'):
+            # Count each prefetched tile once, then keep it as a plain entry
+            metrics.prefetch_tiles.inc((hash, 'used'))
+            app.shared_cache.set(key, entry.value, {'headers': entry.meta['headers']}, ttl)
+        return 200, [tuple(header) for header in entry.meta['headers']], entry.value, 'HIT' if hit else 'MISS'
+
+    def proxy_getmap(hash, params, client):
+        """Return (status, headers, content, cache) of a proxied GetMap.
+
+        Answers from tile packs first and passes everything else through
+        proxy_request, for renderers inside the backend.
+        """
+        pack_response = tile_pack_getmap(hash, params)
+        if pack_response is not None:
+            return 200, list(pack_response.headers.items()), pack_response.get_data(), None
+        return proxy_request(hash, app.layers_config['hash_map'][hash], params, client)
+
+    app.proxy_getmap = proxy_getmap
+
+    def prefetch_tile(hash, params):
+        """Load a predicted tile into the shared cache, bypassing admission."""
+        target_url = app.layers_config.get('hash_map', {}).get(hash)
+        if target_url is None:
+            return 'error'
+
+        owner = cluster_owner(target_url, params)
+        if owner is not None:
+            # The owner caches the tile, it applies its admission control to it
+            status, _, _, cache = app.cluster.fetch(owner, f'/proxy/wms/{hash}/service', params)
+            return 'cached' if cache == 'HIT' else 'fetched' if status == 200 else 'error'
+
+        def load():
+            status, headers, content = fetch_upstream(hash, target_url, params)
+            content_type = next((value for name, value in headers if name.lower() == 'content-type'), '')
+            if status != 200 or not content_type.startswith('image/'):
+                return None
+            return content, {'headers': cacheable_headers(headers), 'prefetched': True}
+
+        entry, hit = app.shared_cache.get_or_load(
+            proxy_cache_key(hash, params), load, app.config['PROXY_CACHE_TTL']['getmap'])
+        return 'cached' if hit else 'fetched' if entry is not None else 'error'
+
+    if app.config['PREFETCH_ENABLED']:
+        # Prefetch only while the proxy has plenty of free upstream slots
+        app.prefetcher = TilePrefetcher(
+            prefetch_tile,
+            busy=lambda: app.proxy_admission.busy(),
+            budget_per_minute=app.config['PREFETCH_BUDGET'],
+            workers=app.config['PREFETCH_WORKERS']
+        )
+    else:
+        app.prefetcher = None
+
+    def proxy_response(status, headers, content, cache):
+        response = Response(content, status=status, headers=headers)
+        if cache:
+            response.headers['X-Cache'] = cache
+        return response
+
+    def proxy_params():
+        """Query parameters to forward, without the profiling token."""
+        return {key: value for key, value in request.args.items() if not key.startswith(PROFILE_PARAM)}
+
+    def client_address():
+        """Address of the client, nginx passes it in X-Real-IP."""
+        return request.headers.get('X-Real-IP') or request.remote_addr
+
+    def proxy_rejected(error):
+        response = jsonify({'error': 'Proxy is busy, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    def proxy_error(hash, target_url, error):
+        metrics.upstream_errors.inc((hash,))
+        log.error(f"Proxy error for {target_url}: {error}")
+        return jsonify({'error': 'Proxy request failed'}), 502
+
     @app.route('/proxy/wms/<hash>/service')
     def proxy_wms(hash):
         """Proxy WMS requests to hide actual service URLs."""
@@ -127,32 +841,124 @@ def create_app(config_path=None):
             return jsonify({'error': 'Unknown service'}), 404
 
         target_url = hash_map[hash]
+        params = proxy_params()
+
+        pack_response = tile_pack_getmap(hash, params)
+        if pack_response is not None:
+            return pack_response
 
-        # Forward all query parameters
-        params = dict(request.args)
+        client = client_address()
+        # Forwarded tiles are a share of a session, the peer in front of the client observes it
+        forwarded = app.cluster is not None and FORWARDED_HEADER in request.headers
+        if app.prefetcher is not None and not forwarded:
+            app.prefetcher.observe(client, hash, params)
 
         try:
-            # Make request to actual WMS server
-            resp = requests.get(
-                target_url,
-                params=params,
-                timeout=30,
-                stream=True
-            )
+            response = proxy_response(*proxy_request(hash, target_url, params, client, forwarded))
+        except AdmissionRejected as e:
+            response = proxy_rejected(e)
+        except requests.RequestException as e:
+            response = proxy_error(hash, target_url, e)
+        if forwarded:
+            # Tells the peer that errors come from this node and not from a failing node
+            response = app.make_response(response)
+            response.headers[FORWARDED_HEADER] = '1'
+        return response
 
-            # Build response with same content type
-            excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
-            headers = [(name, value) for name, value in resp.raw.headers.items()
-                      if name.lower() not in excluded_headers]
+    @app.route('/proxy/tiles/<layer_name>/<int:z>/<int:x>/<int:y>.<extension>')
+    @app.route('/proxy/wmts/<layer_name>/<matrix_set>/<int:z>/<int:x>/<int:y>.<extension>')
+    def facade_tile(layer_name, z, x, y, extension, matrix_set=MAP_PROJECTION):
+        """Serve a tile of a proxied WMS layer from a deterministic upstream GetMap."""
+        layer = app.layers_config.get('layers', {}).get(layer_name)
+        if layer is None or not is_facade_layer(layer):
+            return jsonify({'error': 'Unknown layer'}), 404
+        image_format = FACADE_FORMATS.get(extension)
+        if image_format is None or matrix_set != MAP_PROJECTION or not app.tile_facade.valid_tile(z, x, y):
+            return jsonify({'error': 'Tile not found'}), 404
 
-            return Response(
-                resp.content,
-                status=resp.status_code,
-                headers=headers
-            )
+        hash = layer['hash']
+        params = app.tile_facade.getmap_params(layer, z, x, y, image_format)
+        response = tile_pack_getmap(hash, params)
+        if response is None:
+            target_url = app.layers_config['hash_map'][hash]
+            try:
+                response = proxy_response(*proxy_request(hash, target_url, params, client_address()))
+            except AdmissionRejected as e:
+                return proxy_rejected(e)
+            except requests.RequestException as e:
+                return proxy_error(hash, target_url, e)
+            if response.status_code != 200 or not response.mimetype.startswith('image/'):
+                return response
+
+        response.headers['Cache-Control'] = f"public, max-age={app.config['TILE_FACADE_MAX_AGE']}"
+        response.add_etag()
+        return response.make_conditional(request)
+
+    @app.route('/proxy/wmts/1.0.0/WMTSCapabilities.xml')
+    def facade_capabilities():
+        """WMTS capabilities of all layers served by the tile facade."""
+        layers = [layer for layer in app.layers_config.get('layers', {}).values() if is_facade_layer(layer)]
+        content = app.tile_facade.capabilities(layers, request.host_url.rstrip('/'))
+        response = Response(content, mimetype='application/xml')
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+    @app.route('/proxy/wms/<hash>/composite')
+    def proxy_wms_composite(hash):
+        """Serve stacked overlays of one upstream WMS as one GetMap image.
+
+        See munimap.wms_composite for the COMPOSITE param. Adjacent opaque
+        overlays share one upstream GetMap, faded ones are composited here.
+        """
+        hash_map = app.layers_config.get('hash_map', {})
+
+        if hash not in hash_map:
+            log.warning(f"Unknown proxy hash: {hash}")
+            return jsonify({'error': 'Unknown service'}), 404
+
+        target_url = hash_map[hash]
+        params = proxy_params()
+        upper = {key.upper(): value for key, value in params.items()}
+        try:
+            getmaps = plan_getmaps(params)
+            size = (int(upper.get('WIDTH', 0)), int(upper.get('HEIGHT', 0)))
+        except (CompositeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        if upper.get('REQUEST', '').lower() != 'getmap' or size[0] <= 0 or size[1] <= 0:
+            return jsonify({'error': 'Composite requests must be GetMaps with a size'}), 400
+
+        metrics.composite_layers.inc((hash,), len(upper.get(COMPOSITE_PARAM, '').split(',')))
+        metrics.composite_getmaps.inc((hash,), len(getmaps))
+        client = client_address()
+
+        def fetch(getmap_params):
+            return proxy_getmap(hash, getmap_params, client)
+
+        try:
+            if len(getmaps) == 1 and getmaps[0][1] == 1:
+                return proxy_response(*fetch(getmaps[0][0]))
+
+            # Fetch threads have no request context, so the phase covers all of them
+            with phase('upstream'), ThreadPoolExecutor(max_workers=max(1, len(getmaps))) as executor:
+                results = list(executor.map(fetch, [getmap_params for getmap_params, _ in getmaps]))
+        except AdmissionRejected as e:
+            return proxy_rejected(e)
         except requests.RequestException as e:
-            log.error(f"Proxy error for {target_url}: {e}")
-            return jsonify({'error': 'Proxy request failed'}), 502
+            return proxy_error(hash, target_url, e)
+
+        images = []
+        for (status, headers, content, _), (_, opacity) in zip(results, getmaps):
+            content_type = next((value for name, value in headers if name.lower() == 'content-type'), '')
+            if status != 200 or not content_type.startswith('image/'):
+                # Pass WMS exceptions and errors through like the plain proxy
+                return proxy_response(status, headers, content, None)
+            images.append((content, opacity))
+
+        with phase('composite'):
+            content = composite_images(images, size)
+        response = Response(content, mimetype='image/png')
+        response.headers['X-Cache'] = 'HIT' if all(result[3] == 'HIT' for result in results) else 'MISS'
+        return response
 
     @app.route('/api/v1/app/<config>/catalog')
     @app.route('/api/v1/app/catalog')
@@ -237,6 +1043,107 @@ def create_app(config_path=None):
             log.error(f"Error resolving catalog names: {e}")
             return jsonify({'error': str(e)}), 500
 
+    app_config_cache = {}
+
+    def cached_app_config(config):
+        """Load an app config, reusing the parsed YAML while its files are unchanged."""
+        config_dir = app.config['APP_CONFIG_DIR']
+        paths = [os.path.join(config_dir, 'default.yaml')]
+        if config and config != 'default':
+            paths.append(os.path.join(config_dir, f'{config}.yaml'))
+        if not all(os.path.exists(path) for path in paths):
+            return load_app_config(config, config_dir)
+
+        signature = tuple(os.path.getmtime(path) for path in paths)
+        cached = app_config_cache.get(config)
+        if cached and cached[0] == signature:
+            return cached[1]
+        app_config = load_app_config(config, config_dir)
+        app_config_cache[config] = (signature, app_config)
+        return app_config
+
+    def find_search_config(app_config, name):
+        """Return the search config with name from app or layer configs."""
+        candidates = list(app_config.get('searchConfig') or [])
+        for layer in app.layers_config.get('layers', {}).values():
+            candidates.extend(layer.get('searchConfig') or [])
+        for group in app.layers_config.get('groups', []):
+            candidates.extend(group.get('searchConfig') or [])
+        for search_config in candidates:
+            if search_config.get('name') == name:
+                return search_config
+        return None
+
+    @app.route('/api/v1/app/<config>/search/<name>')
+    @app.route('/api/v1/app/search/<name>')
+    def search(name, config=None):
+        """Search with a configured geocoder.
+
+        Results are answered from the local address index, the result cache
+        or the upstream geocoder; ``X-Search-Source`` tells which one.
+        """
+        term = request.args.get('term', '').strip()
+        if not term:
+            return jsonify([])
+        try:
+            max_results = int(request.args.get('maxresults', DEFAULT_MAX_RESULTS))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid parameter: {e}'}), 400
+        max_results = max(1, min(max_results, app.config['SEARCH_MAX_RESULTS']))
+
+        try:
+            app_config = cached_app_config(config)
+        except Exception as e:
+            log.error(f"Error loading config: {e}")
+            return jsonify({'error': str(e)}), 500
+
+        search_config = find_search_config(app_config, name)
+        if search_config is None:
+            return jsonify({'error': 'Unknown search'}), 404
+
+        try:
+            results, source = app.geocoder.search(search_config, term, max_results)
+        except GeocoderError as e:
+            return jsonify({'error': str(e)}), 502
+
+        response = jsonify(results)
+        response.headers['X-Search-Source'] = source
+        return response
+
+    @app.route('/api/v1/sensorthings/<layer_name>')
+    def get_sensorthings(layer_name):
+        """Serve the shared snapshot of a SensorThings layer.
+
+        The response has the SensorThings ``{"value": [...]}`` shape, its
+        version is sent in ``X-Snapshot-Version``. With ``since`` (a
+        previous version) only entities changed after that version and the
+        ids of removed entities are returned.
+        """
+        layer = app.layers_config.get('layers', {}).get(layer_name)
+        if not layer or layer.get('type') != 'sensorthings':
+            return jsonify({'error': 'Unknown layer'}), 404
+
+        try:
+            since = int(request.args['since']) if 'since' in request.args else None
+        except ValueError as e:
+            return jsonify({'error': f'Invalid parameter: {e}'}), 400
+
+        try:
+            snapshot = app.sensorthings.snapshot(layer['source'])
+        except SensorThingsError as e:
+            return jsonify({'error': str(e)}), 502
+
+        response = jsonify(snapshot_response(snapshot, since))
+        response.headers['X-Snapshot-Version'] = str(snapshot['version'])
+        response.set_etag(f"{source_key(layer['source'])}-{snapshot['version']}-{since}")
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+    @app.route('/metrics')
+    def get_metrics():
+        """Metrics of all workers in Prometheus text format."""
+        return Response(metrics.registry.collect(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/health')
     def health():
         """Health check endpoint."""
@@ -3,6 +3,8 @@
 
 from copy import deepcopy
 
+from munimap.reproject import MAP_PROJECTION, is_supported
+
 
 def is_active(name, active, includes=[], excludes=[], explicits=[]):
     """Check if a layer should be active based on include/exclude rules."""
@@ -101,53 +103,72 @@ def prepare_group_layers(app_config, group_layers, group_active, layers_config):
         if layer['type'] == 'static_geojson':
             file_name = layer['olLayer']['source'].get('file', '')
             layer['olLayer']['source']['url'] = f"/static_geojson/{file_name}"
+            data_projection = layer['olLayer']['source'].get('dataProjection')
+            if data_projection and data_projection != MAP_PROJECTION and is_supported(data_projection):
+                # Reproject once on the server instead of on every client load
+                layer['olLayer']['source']['url'] += f"?srs={MAP_PROJECTION}"
+                layer['olLayer']['source']['dataProjection'] = MAP_PROJECTION
             if 'file' in layer['olLayer']['source']:
                 del layer['olLayer']['source']['file']
 
+        if layer['type'] == 'sensorthings' and layer_conf.get('hash'):
+            # Served from the shared backend snapshot instead of upstream
+            layer['olLayer']['source']['url'] = f"/api/v1/sensorthings/{layer_name}"
+
         result_layers.append(layer)
 
     return result_layers
 
 
-def prepare_overlays(app_config, anol_layers, layers_config):
-    """Prepare overlay groups for frontend."""
-    overlays = []
+def prepare_overlay(app_config, group, layers_config):
+    """Prepare one overlay group, returns None if none of its layers is active."""
+    if len(group.get('layers', [])) == 0:
+        return None
 
     includes = app_config.get('groups', {}).get('include', [])
     excludes = app_config.get('groups', {}).get('exclude', [])
     explicits = app_config.get('groups', {}).get('explicit', [])
     single_select = app_config.get('groups', {}).get('singleSelect', [])
 
-    for group in anol_layers.get('overlays', []):
-        if len(group.get('layers', [])) == 0:
-            continue
+    group_active = is_active(
+        group['name'],
+        group.get('status', 'active') == 'active',
+        includes, excludes, explicits
+    )
+
+    group_layers = prepare_group_layers(
+        app_config, group['layers'], group_active, layers_config
+    )
+
+    single_select_group = group['name'] in single_select
+
+    if len(group_layers) == 0:
+        return None
+    return {
+        'layers': group_layers,
+        'name': group['name'],
+        'title': group['title'],
+        'status': group.get('status', 'active'),
+        'metadataUrl': group.get('metadataUrl', ''),
+        'showGroup': group.get('showGroup', True),
+        'abstract': group.get('abstract', ''),
+        'singleSelect': group.get('singleSelect', False),
+        'singleSelectGroup': single_select_group,
+        'legend': group.get('legend', False),
+        'defaultVisibleLayers': group.get('defaultVisibleLayers', []),
+    }
+
+
+def prepare_overlays(app_config, anol_layers, layers_config):
+    """Prepare overlay groups for frontend."""
+    overlays = []
+
+    explicits = app_config.get('groups', {}).get('explicit', [])
 
-        group_active = is_active(
-            group['name'],
-            group.get('status', 'active') == 'active',
-            includes, excludes, explicits
-        )
-
-        group_layers = prepare_group_layers(
-            app_config, group['layers'], group_active, layers_config
-        )
-
-        single_select_group = group['name'] in single_select
-
-        if len(group_layers) > 0:
-            overlays.append({
-                'layers': group_layers,
-                'name': group['name'],
-                'title': group['title'],
-                'status': group.get('status', 'active'),
-                'metadataUrl': group.get('metadataUrl', ''),
-                'showGroup': group.get('showGroup', True),
-                'abstract': group.get('abstract', ''),
-                'singleSelect': group.get('singleSelect', False),
-                'singleSelectGroup': single_select_group,
-                'legend': group.get('legend', False),
-                'defaultVisibleLayers': group.get('defaultVisibleLayers', []),
-            })
+    for group in anol_layers.get('overlays', []):
+        overlay = prepare_overlay(app_config, group, layers_config)
+        if overlay is not None:
+            overlays.append(overlay)
 
     # Sort by explicits order if specified
     if explicits:
@@ -182,9 +203,13 @@ def names_from_layers_def(layers_def):
     return names
 
 
-def prepare_catalog_names(app_config, anol_layers, layers_config):
-    """Return catalog-eligible groups with metadata (no full layer defs)."""
-    layers_def = prepare_layers_def(app_config, anol_layers, layers_config)
+def prepare_catalog_names(app_config, anol_layers, layers_config, layers_def=None):
+    """Return catalog-eligible groups with metadata (no full layer defs).
+
+    Pass an already prepared layers_def to avoid preparing it again.
+    """
+    if layers_def is None:
+        layers_def = prepare_layers_def(app_config, anol_layers, layers_config)
     used_names = names_from_layers_def(layers_def)
 
     catalog_groups = []
@@ -214,42 +239,40 @@ def prepare_catalog_names(app_config, anol_layers, layers_config):
 
 def prepare_catalog_group_def(group_name, app_config, anol_layers, layers_config):
     """Return full group definition for a specific catalog group."""
+    return prepare_catalog_group_defs([group_name], app_config, anol_layers, layers_config).get(group_name)
+
+
+def prepare_catalog_group_defs(group_names, app_config, anol_layers, layers_config):
+    """Return full group definitions of catalog groups by name.
+
+    Unknown and non-catalog groups are left out. Each group is prepared
+    on its own with an app config including the group and all its layers.
+    """
+    explicits = app_config.get('groups', {}).get('explicit', [])
+    group_defs = {}
     for group in anol_layers.get('overlays', []):
-        if group['name'] != group_name:
+        group_name = group['name']
+        if group_name not in group_names or not group.get('catalog'):
             continue
-        if not group.get('catalog'):
-            return None
-
-        # Build a temporary app config that includes this group
-        temp_config = deepcopy(app_config)
-        # Ensure the group is included
-        if 'groups' not in temp_config:
-            temp_config['groups'] = {}
-        includes = temp_config['groups'].get('include', [])
-        if group_name not in includes:
-            includes.append(group_name)
-            temp_config['groups']['include'] = includes
-
-        # Also include all layers in the group
-        if 'layers' not in temp_config:
-            temp_config['layers'] = {}
-        layer_includes = temp_config['layers'].get('include', [])
-        for layer in group.get('layers', []):
-            if layer['name'] not in layer_includes:
-                layer_includes.append(layer['name'])
-        temp_config['layers']['include'] = layer_includes
-
-        # Prepare overlays with this temp config
-        overlays = prepare_overlays(temp_config, anol_layers, layers_config)
-
-        # Find our group in the result
-        for overlay in overlays:
-            if overlay['name'] == group_name:
-                # Mark layers as visible and as catalog layer
-                for layer in overlay.get('layers', []):
-                    layer['visible'] = True
-                    layer['catalogLayer'] = True
-                overlay['catalogLayer'] = True
-                return overlay
-
-    return None
+        if explicits and group_name not in explicits:
+            continue
+
+        # Build a temporary app config that includes this group and its layers
+        temp_config = dict(app_config)
+        temp_config['groups'] = dict(app_config.get('groups', {}))
+        temp_config['groups']['include'] = list(temp_config['groups'].get('include', [])) + [group_name]
+        temp_config['layers'] = dict(app_config.get('layers', {}))
+        temp_config['layers']['include'] = list(temp_config['layers'].get('include', [])) + [
+            layer['name'] for layer in group.get('layers', [])]
+
+        overlay = prepare_overlay(temp_config, group, layers_config)
+        if overlay is None:
+            continue
+        # Mark layers as visible and as catalog layer
+        for layer in overlay.get('layers', []):
+            layer['visible'] = True
+            layer['catalogLayer'] = True
+        overlay['catalogLayer'] = True
+        group_defs[group_name] = overlay
+
+    return group_defs
@@ -0,0 +1,132 @@
+# Build a tile pack of a WMS layer
+# Usage: python -m munimap.build_tile_pack <layer> --zoom 8-14 [--output configs/tile_packs/<layer>.mbtiles]
+#
+# Renders the layer from its upstream WMS over map.maxExtent of an app
+# config into an MBTiles or GeoPackage file. Interrupted builds resume
+# from the .part file.
+
+import os
+import sys
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from munimap.app import load_app_config
+from munimap.layers import load_layers_config
+from munimap.reproject import MAP_PROJECTION, transform
+from munimap.tile_grid import TileGrid
+from munimap.tile_pack import TilePackWriter, pack_kind
+
+log = logging.getLogger('munimap.build_tile_pack')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_zoom(value):
+    """Parse 'z' or 'min-max' into a range of zoom levels."""
+    first, _, last = value.partition('-')
+    return range(int(first), int(last or first) + 1)
+
+
+def getmap_params(layer, bbox, tile_size):
+    source = layer['source']
+    return {
+        'SERVICE': 'WMS',
+        'VERSION': '1.1.1',
+        'REQUEST': 'GetMap',
+        'LAYERS': ','.join(source.get('layers') or [layer['name']]),
+        'STYLES': ','.join(source.get('styles') or []),
+        'SRS': MAP_PROJECTION,
+        'BBOX': ','.join(str(value) for value in bbox),
+        'WIDTH': tile_size,
+        'HEIGHT': tile_size,
+        'FORMAT': source.get('format', 'image/png'),
+        'TRANSPARENT': 'TRUE',
+    }
+
+
+def build(layer, grid, bbox, zooms, output, workers=8, retries=3):
+    """Fetch all tiles of zooms intersecting bbox into output."""
+    source = layer['source']
+    if layer['type'] not in ('wms', 'tiledwms') or not source.get('url'):
+        raise SystemExit(f"{layer['name']} is no WMS layer")
+    if source.get('srs', MAP_PROJECTION) != MAP_PROJECTION:
+        raise SystemExit(f"{layer['name']} is not available in {MAP_PROJECTION}")
+
+    part = output + '.part'
+    writer = TilePackWriter(
+        part, layer['name'], grid.extent, source.get('format', 'image/png'), grid.tile_size, kind=pack_kind(output))
+    tiles = [(z, x, y) for z in zooms for x, y in grid.tiles_for_bbox(z, bbox) if not writer.has_tile(z, x, y)]
+    log.info(f"Fetching {len(tiles)} tiles of {layer['name']}")
+
+    session = requests.Session()
+
+    def fetch(tile):
+        params = getmap_params(layer, grid.tile_bbox(*tile), grid.tile_size)
+        for attempt in range(retries):
+            try:
+                resp = session.get(source['url'], params=params, timeout=60)
+                if resp.status_code == 200 and resp.headers.get('Content-Type', '').startswith('image/'):
+                    return tile, resp.content
+                log.warning(f"GetMap {tile} returned {resp.status_code}")
+            except requests.RequestException as e:
+                log.warning(f"GetMap {tile} failed: {e}")
+            time.sleep(2 ** attempt)
+        return tile, None
+
+    failed = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(workers) as executor:
+        for i, (tile, content) in enumerate(executor.map(fetch, tiles), 1):
+            if content is None:
+                failed += 1
+            else:
+                writer.add_tile(*tile, content)
+            if i % 1000 == 0:
+                writer.conn.commit()
+                log.info(f"{i}/{len(tiles)} tiles, {i / (time.monotonic() - started):.1f}/s")
+
+    if failed:
+        writer.conn.commit()
+        writer.conn.close()
+        raise SystemExit(f"{failed} tiles failed, run again to resume {part}")
+
+    lon, lat = transform([bbox[0], bbox[2]], [bbox[1], bbox[3]], MAP_PROJECTION, 'EPSG:4326')
+    writer.finish(list(zooms), bbox, [lon[0], lat[0], lon[1], lat[1]])
+    os.replace(part, output)
+    log.info(f"Wrote {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a tile pack of a WMS layer')
+    parser.add_argument('layer', help='Layer name from the layers config')
+    parser.add_argument('--zoom', type=parse_zoom, required=True, help='Zoom level or range like 8-14')
+    parser.add_argument('--output', help='Output .mbtiles or .gpkg file')
+    parser.add_argument('--config', default='default', help='App config providing map.maxExtent')
+    parser.add_argument('--bbox', type=lambda value: [float(v) for v in value.split(',')],
+                        help='Limit to minx,miny,maxx,maxy instead of map.maxExtent')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent upstream requests')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    layers_dir = os.environ.get('LAYERS_CONF_DIR', os.path.join(BACKEND_DIR, 'configs', 'layers_conf'))
+    app_dir = os.environ.get('APP_CONFIG_DIR', os.path.join(BACKEND_DIR, 'configs', 'app_configs'))
+    layers = load_layers_config(layers_dir)['layers']
+    if args.layer not in layers:
+        raise SystemExit(f"Unknown layer {args.layer}")
+    map_config = load_app_config(args.config, app_dir).get('map', {})
+
+    grid = TileGrid(map_config['projectionExtent']) if map_config.get('projectionExtent') \
+        else TileGrid.for_projection(MAP_PROJECTION)
+    bbox = args.bbox or map_config.get('maxExtent') or grid.extent
+    output = args.output or os.path.join(BACKEND_DIR, 'configs', 'tile_packs', f'{args.layer}.mbtiles')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    build(layers[args.layer], grid, bbox, args.zoom, output, args.workers)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# Cluster mode for horizontally scaled backends
+# Assigns proxy cache keys to owner nodes of a static peer list by
+# consistent hashing, so every tile is fetched and cached by one node
+
+import time
+import bisect
+import hashlib
+import logging
+import threading
+
+import requests
+
+from munimap import metrics
+
+log = logging.getLogger('munimap.cluster')
+
+# Set on requests forwarded to the owner, which then always answers them itself
+FORWARDED_HEADER = 'X-Munimap-Forwarded'
+# Points per node on the ring, spreads keys evenly over few nodes
+REPLICAS = 64
+EXCLUDED_HEADERS = (
+    'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'x-cache', FORWARDED_HEADER.lower())
+
+
+def _ring_hash(value):
+    return int.from_bytes(hashlib.sha1(value.encode('UTF-8')).digest()[:8], 'big')
+
+
+def normalize_node(url):
+    return url.strip().rstrip('/')
+
+
+class HashRing:
+    """Consistent hash ring of node base URLs.
+
+    Adding or removing a node only moves the keys next to its points on
+    the ring, all other keys keep their owner.
+    """
+
+    def __init__(self, nodes, replicas=REPLICAS):
+        self.nodes = sorted(set(nodes))
+        self._points = sorted(
+            (_ring_hash(f'{node}#{i}'), node) for node in self.nodes for i in range(replicas))
+        self._hashes = [point for point, _ in self._points]
+
+    def owners(self, key):
+        """Nodes in ring order starting at the owner of key."""
+        if not self._points:
+            return
+        start = bisect.bisect(self._hashes, _ring_hash(key))
+        seen = set()
+        for i in range(len(self._points)):
+            node = self._points[(start + i) % len(self._points)][1]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+
+class Cluster:
+    """Static cluster of backend nodes sharing the proxy cache by owner.
+
+    ``owner(key)`` returns the base URL of the peer that caches key, or
+    None if this node owns it. Peers that failed are skipped for
+    ``retry_interval`` seconds, their keys move to the next node on the
+    ring meanwhile.
+    """
+
+    def __init__(self, self_url, peers, timeout=35.0, retry_interval=10.0):
+        self.self_url = normalize_node(self_url)
+        nodes = {normalize_node(peer) for peer in peers if peer.strip()}
+        if self.self_url not in nodes:
+            log.warning(f"CLUSTER_SELF {self.self_url} is not in CLUSTER_PEERS, adding it")
+            nodes.add(self.self_url)
+        self.ring = HashRing(nodes)
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+
+        self._lock = threading.Lock()
+        self._down = {}
+        self._local = threading.local()
+
+    def owner(self, key):
+        now = time.monotonic()
+        with self._lock:
+            for node in self.ring.owners(key):
+                if node == self.self_url:
+                    return None
+                if self._down.get(node, 0) <= now:
+                    return node
+        return None
+
+    def _session(self):
+        # Sessions are not thread safe, keep one per thread for connection reuse
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def fetch(self, node, path, params, client=None):
+        """Return (status, headers, content, cache) of a request to the owner node.
+
+        Raises requests.RequestException when the node is unreachable or
+        fails, the node is then skipped for a while.
+        """
+        headers = {FORWARDED_HEADER: '1'}
+        if client:
+            headers['X-Real-IP'] = client
+        try:
+            resp = self._session().get(node + path, params=params, headers=headers, timeout=self.timeout)
+            if resp.status_code in (500, 502, 504) and FORWARDED_HEADER not in resp.headers:
+                # Answered by something in front of the node, not by the node itself
+                resp.raise_for_status()
+        except requests.RequestException:
+            with self._lock:
+                self._down[node] = time.monotonic() + self.retry_interval
+            metrics.cluster_requests.inc(('peer_error',))
+            raise
+        metrics.cluster_requests.inc(('forwarded',))
+        response_headers = [(name, value) for name, value in resp.headers.items()
+                            if name.lower() not in EXCLUDED_HEADERS]
+        return resp.status_code, response_headers, resp.content, resp.headers.get('X-Cache')
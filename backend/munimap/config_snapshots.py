@@ -0,0 +1,138 @@
+# Versioned config snapshots and layer definition diffs
+# Lets clients fetch only what changed since the snapshot they hold
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def snapshot_version(payload):
+    """Return a stable version ID for a config payload.
+
+    The ID is derived from the content, so every worker computes the same
+    version for the same compiled config.
+    """
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('UTF-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+class SnapshotHistory:
+    """Bounded per-config history of compiled config payloads.
+
+    With a shared cache, recorded payloads are also published there so a
+    worker can answer ``since`` requests for versions another worker served.
+    """
+
+    def __init__(self, max_versions=10, shared_cache=None, ttl=3600):
+        self.max_versions = max_versions
+        self.shared_cache = shared_cache
+        self.ttl = ttl
+        self._history = {}
+        self._lock = threading.Lock()
+
+    def record(self, config_name, payload):
+        """Store payload for config_name and return its version."""
+        version = snapshot_version(payload)
+        with self._lock:
+            versions = self._history.setdefault(config_name, OrderedDict())
+            if version in versions:
+                versions.move_to_end(version)
+                return version
+            versions[version] = payload
+            while len(versions) > self.max_versions:
+                versions.popitem(last=False)
+        if self.shared_cache is not None:
+            self.shared_cache.set(
+                f'config-snapshot:{config_name}:{version}',
+                json.dumps(payload).encode('UTF-8'),
+                ttl=self.ttl
+            )
+        return version
+
+    def get(self, config_name, version):
+        """Return the stored payload for version or None if unknown."""
+        with self._lock:
+            payload = self._history.get(config_name, {}).get(version)
+        if payload is None and self.shared_cache is not None:
+            entry = self.shared_cache.get(f'config-snapshot:{config_name}:{version}')
+            if entry is not None:
+                payload = json.loads(entry.value)
+        return payload
+
+
+def _diff_by_name(old_items, new_items, strip=None):
+    """Compare two lists of named dicts."""
+    def _key_dict(items):
+        result = OrderedDict()
+        for item in items:
+            if strip:
+                item = {k: v for k, v in item.items() if k not in strip}
+            result[item['name']] = item
+        return result
+
+    old = _key_dict(old_items)
+    new = _key_dict(new_items)
+
+    return {
+        'added': [item for name, item in new.items() if name not in old],
+        'removed': [name for name in old if name not in new],
+        'changed': [item for name, item in new.items() if name in old and old[name] != item],
+    }
+
+
+def _group_layers(overlays):
+    """Flatten overlay groups into (group name, layer name) keyed layers."""
+    result = OrderedDict()
+    for group in overlays:
+        for layer in group.get('layers', []):
+            result[(group['name'], layer['name'])] = layer
+    return result
+
+
+def diff_layers_def(old_def, new_def):
+    """Compute added, removed and changed backgrounds, groups and layers.
+
+    Both arguments are results of prepare_layers_def. Groups are compared
+    without their layers; layers are keyed by group and layer name since one
+    layer may be part of several groups.
+    """
+    old_layers = _group_layers(old_def.get('overlays', []))
+    new_layers = _group_layers(new_def.get('overlays', []))
+
+    return {
+        'backgroundLayer': _diff_by_name(
+            old_def.get('backgroundLayer', []),
+            new_def.get('backgroundLayer', [])
+        ),
+        'groups': _diff_by_name(
+            old_def.get('overlays', []),
+            new_def.get('overlays', []),
+            strip=('layers',)
+        ),
+        'layers': {
+            'added': [
+                {'group': group, 'layer': layer}
+                for (group, name), layer in new_layers.items()
+                if (group, name) not in old_layers
+            ],
+            'removed': [
+                {'group': group, 'name': name}
+                for (group, name) in old_layers
+                if (group, name) not in new_layers
+            ],
+            'changed': [
+                {'group': group, 'layer': layer}
+                for (group, name), layer in new_layers.items()
+                if (group, name) in old_layers and old_layers[(group, name)] != layer
+            ],
+        },
+        # Order is needed to rebuild the definition on the client
+        'order': {
+            'backgroundLayer': [layer['name'] for layer in new_def.get('backgroundLayer', [])],
+            'overlays': [
+                {'name': group['name'], 'layers': [layer['name'] for layer in group.get('layers', [])]}
+                for group in new_def.get('overlays', [])
+            ],
+        },
+    }
@@ -1,8 +1,29 @@
 # Export routes for MapFish Print integration
+import io
 import os
+import json
+import uuid
+import math
+import time
+import zipfile
 import logging
+import tempfile
 import requests
-from flask import Blueprint, jsonify, request, Response, current_app
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from pypdf import PdfWriter
+from flask import Blueprint, jsonify, request, Response, current_app, send_file
+
+from munimap import metrics
+from munimap.admission import AdmissionRejected
+from munimap.geometry import compact_geometry, precision_decimals
+from munimap.reproject import MAP_PROJECTION, is_supported, transform_feature_collection
+from munimap.profiling import phase
+from munimap.print_cache import PrintResultCache, spec_hash
+from munimap.print_status import PrintStatusHub
+from munimap.print_queue import (
+    PrintScheduler, PrintTicket, QueueFullError, job_priority, LAYOUT_SIZES, DEFAULT_LAYOUT
+)
 
 log = logging.getLogger('munimap.export')
 
@@ -11,6 +32,18 @@ export_bp = Blueprint('export', __name__)
 # MapFish Print server configuration
 MAPFISH_PRINT_URL = os.environ.get('MAPFISH_PRINT_URL', 'http://munimap-print:8080')
 
+# Reuse of identical print jobs and finished outputs
+# Jobs queued longer were lost, e.g. by a restart of the worker holding the queue
+MAX_QUEUE_WAIT = float(os.environ.get('PRINT_MAX_QUEUE_WAIT', 1800))
+
+print_cache = PrintResultCache(
+    os.environ.get('PRINT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'munimap-print-cache')),
+    max_bytes=int(os.environ.get('PRINT_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+    ttl=float(os.environ.get('PRINT_CACHE_TTL', 3600)),
+    job_ttl=float(os.environ.get('PRINT_JOB_REUSE_TTL', 300)),
+    queue_ttl=MAX_QUEUE_WAIT,
+)
+
 
 def get_layer_url(layer_name: str) -> str | None:
     """Get the actual WMS URL for a layer by name."""
@@ -21,6 +54,13 @@ def get_layer_url(layer_name: str) -> str | None:
     return None
 
 
+# Print resolution and draw feature simplification
+PRINT_DPI = 150
+METERS_PER_INCH = 0.0254
+METERS_PER_DEGREE = 111320
+SIMPLIFY_TOLERANCE_PX = 0.5
+
+
 DASH_MAP = {
     '[]': 'solid',
     '[10,10]': 'dash',
@@ -91,85 +131,169 @@ def _geom_type(feature: dict) -> str:
     return gtype
 
 
-def build_draw_layer(feature_collection: dict) -> dict:
-    """Convert a draw feature collection to a MapFish GeoJSON layer spec."""
-    features = feature_collection.get('features', [])
+def build_draw_layer(feature_collection: dict, resolution: float | None = None) -> dict:
+    """Convert a draw feature collection to a MapFish GeoJSON layer spec.
+
+    Features sharing a style reference the same style entry. With the print
+    resolution (map units per pixel) geometries are simplified to half a
+    pixel and coordinates rounded to sub-pixel precision. The input is not
+    modified.
+    """
     styles: dict = {
         'version': '1',
         'styleProperty': 'mapfishStyleId',
     }
+    style_ids: dict = {}
+    features = []
+
+    tolerance = resolution * SIMPLIFY_TOLERANCE_PX if resolution else 0
+    decimals = precision_decimals(resolution) if resolution else None
+
+    for feature in feature_collection.get('features', []):
+        style = _build_mapfish_style(feature.get('properties') or {}, _geom_type(feature))
+        style_key = json.dumps(style, sort_keys=True)
+        style_id = style_ids.get(style_key)
+        if style_id is None:
+            style_id = str(len(style_ids))
+            style_ids[style_key] = style_id
+            styles[style_id] = style
 
-    for i, feature in enumerate(features):
-        style_id = str(i)
-        props = feature.get('properties', {})
-        geom_type = _geom_type(feature)
-        styles[style_id] = _build_mapfish_style(props, geom_type)
-        # Inject the style ID into the feature properties
-        feature.setdefault('properties', {})['mapfishStyleId'] = style_id
+        geometry = feature.get('geometry')
+        if decimals is not None:
+            geometry = compact_geometry(geometry, tolerance, decimals)
+
+        # Styles are resolved by MapFish, other properties are not needed
+        features.append({
+            'type': 'Feature',
+            'geometry': geometry,
+            'properties': {'mapfishStyleId': style_id},
+        })
 
     return {
         'type': 'geojson',
-        'geoJson': feature_collection,
+        'geoJson': {
+            'type': 'FeatureCollection',
+            'features': features,
+        },
         'style': styles,
     }
 
 
+def print_resolution(scale: float, srs: int) -> float:
+    """Map units per pixel of the printed map."""
+    resolution = scale * METERS_PER_INCH / PRINT_DPI
+    if srs == 4326:
+        resolution /= METERS_PER_DEGREE
+    return resolution
+
+
+def print_draw_features(data: dict, srs: int) -> dict | None:
+    """Return the draw features of a request in the print projection.
+
+    Draw features are in the map projection unless ``drawFeaturesSrs``
+    says otherwise.
+    """
+    draw_features = data.get('drawFeatures')
+    if not draw_features or not draw_features.get('features'):
+        return None
+
+    source = data.get('drawFeaturesSrs', MAP_PROJECTION)
+    if not is_supported(source) or not is_supported(srs):
+        log.warning(f"Cannot reproject draw features from {source} to EPSG:{srs}")
+        return draw_features
+    return transform_feature_collection(draw_features, source, srs)
+
+
+def print_layout(data: dict) -> str:
+    """Return the MapFish layout of the requested page.
+
+    Standard layouts like ``a3-landscape`` map to ``A3 landscape``, custom
+    page sizes to the smallest layout the page fits on.
+    """
+    page_layout = data.get('pageLayout') or ''
+    name = page_layout.replace('-', ' ').capitalize()
+    if name in LAYOUT_SIZES:
+        return name
+
+    width, height = data.get('pageSize') or LAYOUT_SIZES[DEFAULT_LAYOUT]
+    fitting = [
+        (layout_width * layout_height, layout)
+        for layout, (layout_width, layout_height) in LAYOUT_SIZES.items()
+        if layout_width >= width and layout_height >= height
+    ]
+    if fitting:
+        return min(fitting)[1]
+    return 'A0 landscape' if width > height else 'A0 portrait'
+
+
+def print_wms_layers(data: dict, layers_config: dict) -> list:
+    """Return (name, layer definition) of the printable WMS layers, bottom to top.
+
+    MapFish specs and quick exports both print these layers.
+    """
+    layers = []
+    for layer_name in data.get('layers', []):
+        layer_def = layers_config.get('layers', {}).get(layer_name)
+        if not layer_def:
+            continue
+        source = layer_def.get('source', {})
+        if layer_def.get('type') not in ('wms', 'tiledwms') and source.get('type') != 'TiledWMS':
+            continue
+        if source.get('url'):
+            layers.append((layer_name, layer_def))
+    return layers
+
+
+def _wms_layer_names(layer_def: dict, name: str) -> list:
+    """Return the WMS layers requested for a layer definition."""
+    source = layer_def['source']
+    if source.get('layers'):
+        return list(source['layers'])
+    params_layers = source.get('params', {}).get('LAYERS')
+    return params_layers.split(',') if params_layers else [name]
+
+
 def build_mapfish_spec(data: dict, layers_config: dict) -> dict:
     """Build MapFish Print specification from request data."""
     bbox = data.get('bbox', [])
     srs = data.get('srs', 25832)
     scale = data.get('scale', 2500)
     output_format = data.get('outputFormat', 'pdf')
-    page_size = data.get('pageSize', [210, 297])
-    layer_names = data.get('layers', [])
     opacities = data.get('opacities', {})
 
     # Build layers array for MapFish
     layers = []
-    for layer_name in layer_names:
-        layer_def = layers_config.get('layers', {}).get(layer_name)
-        if not layer_def:
-            continue
+    for layer_name, layer_def in print_wms_layers(data, layers_config):
+        layer_spec = {
+            'type': 'WMS',
+            'baseURL': layer_def['source']['url'],
+            'layers': _wms_layer_names(layer_def, layer_name),
+            'imageFormat': 'image/png',
+            'customParams': {
+                'TRANSPARENT': 'true'
+            }
+        }
 
-        source = layer_def.get('source', {})
-        layer_type = source.get('type', '')
-
-        if layer_type == 'TiledWMS':
-            # Get base URL from hash map
-            url_hash = layer_def.get('url_hash')
-            base_url = layers_config.get('hash_map', {}).get(url_hash) if url_hash else source.get('url')
-
-            if base_url:
-                layer_spec = {
-                    'type': 'WMS',
-                    'baseURL': base_url,
-                    'layers': source.get('params', {}).get('LAYERS', '').split(','),
-                    'imageFormat': 'image/png',
-                    'customParams': {
-                        'TRANSPARENT': 'true'
-                    }
-                }
-
-                # Apply opacity if not fully opaque
-                if layer_name in opacities:
-                    layer_spec['opacity'] = float(opacities[layer_name])
-
-                layers.append(layer_spec)
+        # Apply opacity if not fully opaque
+        if layer_name in opacities:
+            layer_spec['opacity'] = float(opacities[layer_name])
+
+        layers.append(layer_spec)
 
     # Add draw features layer on top if present
-    draw_features = data.get('drawFeatures')
-    if draw_features and draw_features.get('features'):
-        draw_layer = build_draw_layer(draw_features)
+    draw_features = print_draw_features(data, srs)
+    if draw_features:
+        draw_layer = build_draw_layer(draw_features, print_resolution(scale, srs))
         layers.append(draw_layer)
 
     # MapFish Print specification
     spec = {
-        'layout': 'A4 portrait',  # Default layout
+        'layout': print_layout(data),
         'outputFormat': output_format,
         'attributes': {
             'map': {
                 'projection': f'EPSG:{srs}',
-                'dpi': 150,
+                'dpi': PRINT_DPI,
                 'rotation': 0,
                 'center': [
                     (bbox[0] + bbox[2]) / 2,
@@ -188,133 +312,755 @@ def build_mapfish_spec(data: dict, layers_config: dict) -> dict:
     return spec
 
 
+# Dash patterns in pixels for the quick PNG export, keyed by MapFish dash style
+DASH_PATTERNS = {
+    'dash': [10, 10],
+    'dot': [2, 6],
+    'dashdot': [10, 6, 2, 6],
+    'longdash': [20, 10],
+}
+
+# Quick PNG export limits
+QUICK_EXPORT_MAX_PIXELS = int(os.environ.get('QUICK_EXPORT_MAX_PIXELS', 4096))
+QUICK_EXPORT_TIMEOUT = float(os.environ.get('QUICK_EXPORT_TIMEOUT', 20))
+# Style sizes are given in screen pixels (96 dpi)
+SCREEN_DPI = 96
+
+
+def _wms_getmap_params(layer_def: dict, name: str, srs: int, bbox: list, size: tuple) -> dict:
+    """Build GetMap parameters for a WMS layer definition."""
+    source = layer_def['source']
+    return {
+        'SERVICE': 'WMS',
+        'VERSION': '1.1.1',
+        'REQUEST': 'GetMap',
+        'LAYERS': ','.join(_wms_layer_names(layer_def, name)),
+        'STYLES': ','.join(source.get('styles') or []),
+        'SRS': f'EPSG:{srs}',
+        'BBOX': ','.join(str(value) for value in bbox),
+        'WIDTH': size[0],
+        'HEIGHT': size[1],
+        'FORMAT': 'image/png',
+        'TRANSPARENT': 'TRUE',
+    }
+
+
+def _fetch_wms_image(layer_def: dict, params: dict, fetch_proxied=None) -> Image.Image | None:
+    """Request a GetMap image, returns None on errors.
+
+    Proxied layers are requested through ``fetch_proxied(hash, params)``,
+    so they use tile packs, the shared cache and the admission control.
+    """
+    try:
+        if fetch_proxied is not None and layer_def.get('hash'):
+            status, headers, content, _ = fetch_proxied(layer_def['hash'], params)
+            content_type = next((value for name, value in headers if name.lower() == 'content-type'), '')
+        else:
+            resp = requests.get(layer_def['source']['url'], params=params, timeout=QUICK_EXPORT_TIMEOUT)
+            status, content_type, content = resp.status_code, resp.headers.get('Content-Type', ''), resp.content
+        if status != 200 or not content_type.startswith('image/'):
+            log.warning(f"Quick export GetMap failed for {params['LAYERS']}: {status}")
+            return None
+        return Image.open(io.BytesIO(content)).convert('RGBA')
+    except (requests.RequestException, AdmissionRejected, OSError) as e:
+        log.warning(f"Quick export GetMap failed for {params['LAYERS']}: {e}")
+        return None
+
+
+def _rgba(color: str, opacity: float) -> tuple:
+    red, green, blue = ImageColor.getrgb(color)[:3]
+    return red, green, blue, int(round(255 * max(0.0, min(1.0, float(opacity)))))
+
+
+def _dashed_segments(points: list, pattern: list) -> list:
+    """Split a polyline into the visible segments of a dash pattern."""
+    segments = []
+    current = [points[0]]
+    index = 0
+    remaining = pattern[0]
+    for start, end in zip(points, points[1:]):
+        x, y = start
+        length = math.hypot(end[0] - x, end[1] - y)
+        while length > 0:
+            step = min(remaining, length)
+            ratio = step / length
+            x, y = x + (end[0] - x) * ratio, y + (end[1] - y) * ratio
+            length -= step
+            remaining -= step
+            if index % 2 == 0:
+                current.append((x, y))
+            if remaining <= 0:
+                if index % 2 == 0 and len(current) > 1:
+                    segments.append(current)
+                index = (index + 1) % len(pattern)
+                remaining = pattern[index]
+                current = [(x, y)]
+    if index % 2 == 0 and len(current) > 1:
+        segments.append(current)
+    return segments
+
+
+def _draw_line(draw: ImageDraw.ImageDraw, points: list, style: dict, scale: float) -> None:
+    width = max(1, int(round(float(style['strokeWidth']) * scale)))
+    color = _rgba(style['strokeColor'], style['strokeOpacity'])
+    pattern = DASH_PATTERNS.get(style['strokeDashstyle'])
+    if pattern:
+        for segment in _dashed_segments(points, [length * scale for length in pattern]):
+            draw.line(segment, fill=color, width=width)
+    else:
+        draw.line(points, fill=color, width=width, joint='curve')
+
+
+def _draw_feature(draw: ImageDraw.ImageDraw, feature: dict, to_pixel, scale: float) -> None:
+    """Rasterize one draw feature with the MapFish style mapping."""
+    geometry = feature.get('geometry') or {}
+    geom_type = _geom_type(feature)
+    style = _build_mapfish_style(feature.get('properties') or {}, geom_type)
+    coords = geometry.get('coordinates')
+    if not coords:
+        return
+
+    if geometry['type'] in ('Point', 'LineString', 'Polygon'):
+        parts = [coords]
+    else:
+        parts = coords
+
+    for part in parts:
+        if geom_type == 'Point':
+            x, y = to_pixel(part)
+            if 'label' in style:
+                font = ImageFont.load_default(size=max(1, float(style['fontSize']) * scale))
+                draw.text((x, y), style['label'], fill=style['fontColor'], font=font, anchor='mm')
+                continue
+            radius = float(style['pointRadius']) * scale
+            draw.ellipse(
+                (x - radius, y - radius, x + radius, y + radius),
+                fill=_rgba(style['fillColor'], style['fillOpacity']),
+                outline=_rgba(style['strokeColor'], style['strokeOpacity']),
+                width=max(1, int(round(float(style['strokeWidth']) * scale)))
+            )
+        elif geom_type == 'LineString':
+            _draw_line(draw, [to_pixel(coord) for coord in part], style, scale)
+        elif geom_type == 'Polygon':
+            rings = [[to_pixel(coord) for coord in ring] for ring in part]
+            if not rings or len(rings[0]) < 3:
+                continue
+            # Holes are not cut out, the outer ring is filled
+            draw.polygon(rings[0], fill=_rgba(style['fillColor'], style['fillOpacity']))
+            for ring in rings:
+                _draw_line(draw, ring, style, scale)
+
+
+def render_quick_png(data: dict, layers_config: dict, fetch_proxied=None) -> bytes:
+    """Render a PNG export in-process.
+
+    Takes the same request data as build_mapfish_spec. The WMS layers are
+    requested in parallel, alpha-composited bottom to top with the
+    requested opacities, and draw features are rasterized on top.
+    See _fetch_wms_image for ``fetch_proxied``.
+    """
+    bbox = data.get('bbox', [])
+    srs = data.get('srs', 25832)
+    scale = data.get('scale', 2500)
+    opacities = data.get('opacities', {})
+
+    resolution = print_resolution(scale, srs)
+    width = (bbox[2] - bbox[0]) / resolution
+    height = (bbox[3] - bbox[1]) / resolution
+    # Reduce the resolution of very large exports
+    factor = max(1.0, width / QUICK_EXPORT_MAX_PIXELS, height / QUICK_EXPORT_MAX_PIXELS)
+    size = (max(1, int(round(width / factor))), max(1, int(round(height / factor))))
+    style_scale = PRINT_DPI / SCREEN_DPI / factor
+
+    requests_by_layer = [
+        (layer_name, layer_def, _wms_getmap_params(layer_def, layer_name, srs, bbox, size))
+        for layer_name, layer_def in print_wms_layers(data, layers_config)
+    ]
+
+    # Fetch threads have no request context, so the phase covers all of them
+    with phase('upstream'), ThreadPoolExecutor(max_workers=max(1, len(requests_by_layer))) as executor:
+        images = list(executor.map(
+            lambda item: _fetch_wms_image(item[1], item[2], fetch_proxied), requests_by_layer))
+
+    result = Image.new('RGBA', size, (255, 255, 255, 255))
+    for (layer_name, _, _), image in zip(requests_by_layer, images):
+        if image is None:
+            continue
+        if image.size != size:
+            image = image.resize(size)
+        if layer_name in opacities:
+            alpha = image.getchannel('A').point(lambda value: int(value * float(opacities[layer_name])))
+            image.putalpha(alpha)
+        result.alpha_composite(image)
+
+    # Drawing in RGBA mode onto an RGB image blends with the map
+    result = result.convert('RGB')
+
+    draw_features = print_draw_features(data, srs)
+    if draw_features:
+        pixel_size = resolution * factor
+
+        def to_pixel(coord):
+            return ((coord[0] - bbox[0]) / pixel_size, (bbox[3] - coord[1]) / pixel_size)
+
+        draw = ImageDraw.Draw(result, 'RGBA')
+        for feature in draw_features['features']:
+            _draw_feature(draw, feature, to_pixel, style_scale)
+
+    buffer = io.BytesIO()
+    with phase('png_encode'):
+        result.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _output_extension(content_type: str) -> str:
+    """Determine filename extension from a content type."""
+    if 'pdf' in content_type:
+        return 'pdf'
+    elif 'png' in content_type:
+        return 'png'
+    return 'pdf'
+
+
+class PrintServiceError(Exception):
+    pass
+
+
+def submit_to_mapfish(spec: dict) -> str:
+    """Submit a spec to MapFish Print and return the job reference."""
+    print_url = f'{MAPFISH_PRINT_URL}/print/report.{spec.get("outputFormat", "pdf")}'
+
+    started = time.perf_counter()
+    try:
+        with phase('upstream'):
+            resp = requests.post(
+                print_url,
+                json=spec,
+                timeout=30
+            )
+        metrics.upstream_duration.observe(('mapfish',), time.perf_counter() - started)
+    except requests.RequestException as e:
+        metrics.upstream_errors.inc(('mapfish',))
+        log.error(f"Failed to connect to MapFish Print: {e}")
+        raise PrintServiceError('Could not connect to print service')
+
+    if resp.status_code != 200:
+        log.error(f"MapFish Print error: {resp.status_code} - {resp.text}")
+        raise PrintServiceError('Print service returned an error')
+
+    # MapFish returns 'ref' with the job reference
+    job_ref = resp.json().get('ref', '')
+    if not job_ref:
+        raise PrintServiceError('Print service returned no job reference')
+    return job_ref
+
+
+def run_print_job(ticket: PrintTicket) -> bool:
+    """Submit a queued job and wait until MapFish finished it."""
+    started = time.monotonic()
+    metrics.print_queue_wait.observe((ticket.output_format,), started - ticket.enqueued_at)
+    success = _run_print_job(ticket)
+    metrics.print_job_duration.observe(
+        (ticket.output_format, 'finished' if success else 'error'), time.monotonic() - started)
+    return success
+
+
+def _run_print_job(ticket: PrintTicket) -> bool:
+    state = print_cache.job_state(ticket.id)
+    if state is None or state['state'] != 'queued':
+        # Dropped as lost or failed by another worker while it waited here
+        ticket.error = 'Print job was not started'
+        return False
+    try:
+        job_ref = submit_to_mapfish(ticket.spec)
+    except PrintServiceError as e:
+        print_cache.set_job_state(ticket.id, {'state': 'error', 'error': str(e)})
+        key = print_cache.key_for_job(ticket.id)
+        if key:
+            print_cache.forget(key)
+        ticket.error = str(e)
+        return False
+
+    key = print_cache.key_for_job(ticket.id)
+    if key and print_cache.find_job(key) == ticket.id:
+        # Reuse period of the running job starts now, not when it was queued
+        print_cache.register_job(key, ticket.id)
+    print_cache.set_job_state(ticket.id, {'state': 'submitted', 'ref': job_ref})
+
+    # Hold the print slot until the job is done
+    poller = status_hub.poller(ticket.id)
+    while not poller.done:
+        poller.wait(poller.version, timeout=SSE_KEEPALIVE)
+    return poller.status.get('status') == 'finished'
+
+
+# Admission control in front of MapFish Print
+scheduler = PrintScheduler(
+    run_print_job,
+    max_concurrent=int(os.environ.get('PRINT_MAX_CONCURRENT', 4)),
+    max_queued=int(os.environ.get('PRINT_MAX_QUEUED', 100)),
+)
+
+# Maximum number of pages of a batch (atlas) export
+MAX_BATCH_PAGES = int(os.environ.get('PRINT_MAX_BATCH_PAGES', 50))
+
+
+def _queue_expired(state: dict | None) -> bool:
+    return bool(state) and state['state'] == 'queued' and time.time() - state.get('queuedAt', 0) > MAX_QUEUE_WAIT
+
+
+def _drop_lost_job(key: str | None, job_id: str) -> None:
+    """Drop a job that waited too long in the queue, so it never runs."""
+    scheduler.cancel(job_id)
+    if key:
+        print_cache.unregister_job(key, job_id)
+
+
+def _new_print_job(data: dict, spec: dict) -> tuple[str, PrintTicket | None]:
+    """Return (job ID, ticket) of a print job that still has to be queued.
+
+    An in-flight or finished job with an identical spec is reused, its
+    ticket is None then.
+    """
+    key = spec_hash(spec)
+    job_id = print_cache.find_job(key)
+    if job_id and _queue_expired(print_cache.job_state(job_id)):
+        _drop_lost_job(key, job_id)
+    elif job_id:
+        log.info(f"Reusing print job {job_id} for spec {key[:12]}")
+        return job_id, None
+
+    ticket = PrintTicket(
+        spec,
+        priority=job_priority(spec),
+        layout=data.get('pageLayout', 'custom'),
+        output_format=data.get('outputFormat', 'pdf')
+    )
+    # State and registration must exist before a print thread can pick up the ticket
+    print_cache.set_job_state(ticket.id, {'state': 'queued', 'queuedAt': time.time()})
+    print_cache.register_job(key, ticket.id)
+    return ticket.id, ticket
+
+
+def _enqueue_tickets(tickets: list) -> None:
+    """Queue all tickets or none. Raises QueueFullError if the queue is full."""
+    try:
+        scheduler.enqueue_many(tickets)
+    except QueueFullError:
+        for ticket in tickets:
+            print_cache.unregister_job(spec_hash(ticket.spec), ticket.id)
+        raise
+
+
+def enqueue_print_job(data: dict, spec: dict) -> str:
+    """Queue a print job and return its ID.
+
+    An in-flight or finished job with an identical spec is reused.
+    Raises QueueFullError if the queue is full.
+    """
+    job_id, ticket = _new_print_job(data, spec)
+    if ticket:
+        _enqueue_tickets([ticket])
+    return job_id
+
+
+def _job_urls(job_id: str) -> dict:
+    return {
+        'statusURL': f'/export/map/{job_id}/status',
+        'downloadURL': f'/export/map/{job_id}/download'
+    }
+
+
 @export_bp.route('/export/map', methods=['POST'])
 def submit_print_job():
-    """Submit a print job to MapFish Print."""
+    """Queue a print job for MapFish Print.
+
+    Requests with ``bboxes`` instead of ``bbox`` are batch (atlas) exports:
+    every bbox is rendered as one page and the pages are combined into a
+    single download.
+    """
     try:
         data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
+        if data.get('bboxes'):
+            return _submit_batch(data)
+
         # Build MapFish Print specification
         spec = build_mapfish_spec(data, current_app.layers_config)
 
-        # Submit to MapFish Print server
-        print_url = f'{MAPFISH_PRINT_URL}/print/report.{data.get("outputFormat", "pdf")}'
-
         try:
-            resp = requests.post(
-                print_url,
-                json=spec,
-                timeout=30
-            )
+            job_id = enqueue_print_job(data, spec)
+        except QueueFullError:
+            return _queue_full_response()
 
-            if resp.status_code == 200:
-                result = resp.json()
-                # MapFish returns 'ref' with the job reference
-                job_ref = result.get('ref', '')
+        result = {'status': 'added', **_job_urls(job_id)}
+        position = scheduler.position(job_id)
+        if position:
+            result['queuePosition'] = position
+        return jsonify(result)
+
+    except Exception as e:
+        log.error(f"Error submitting print job: {e}")
+        return jsonify({'error': str(e)}), 500
 
-                return jsonify({
-                    'status': 'added',
-                    'statusURL': f'/export/map/{job_ref}/status',
-                    'downloadURL': f'/export/map/{job_ref}/download'
-                })
-            else:
-                log.error(f"MapFish Print error: {resp.status_code} - {resp.text}")
-                return jsonify({
-                    'status': 'error',
-                    'error': 'Print service returned an error'
-                }), resp.status_code
 
-        except requests.RequestException as e:
-            log.error(f"Failed to connect to MapFish Print: {e}")
-            return jsonify({
-                'status': 'error',
-                'error': 'Could not connect to print service'
-            }), 503
+@export_bp.route('/export/map/quick', methods=['POST'])
+def quick_export():
+    """Render a simple PNG export in-process and return it directly.
 
+    Does not use MapFish Print, so it keeps working while the print
+    server is busy or unavailable.
+    """
+    try:
+        data = request.get_json()
+        if not data or len(data.get('bbox') or []) != 4:
+            return jsonify({'error': 'No bbox provided'}), 400
+
+        client = request.headers.get('X-Real-IP') or request.remote_addr
+        proxy_getmap = current_app.proxy_getmap
+        content = render_quick_png(
+            data, current_app.layers_config, lambda hash, params: proxy_getmap(hash, params, client))
+        return Response(content, status=200, headers={
+            'Content-Type': 'image/png',
+            'Content-Disposition': 'attachment; filename="karte.png"'
+        })
     except Exception as e:
-        log.error(f"Error submitting print job: {e}")
+        log.error(f"Error rendering quick export: {e}")
         return jsonify({'error': str(e)}), 500
 
 
-@export_bp.route('/export/map/<job_id>/status', methods=['GET'])
-def get_print_status(job_id):
-    """Get the status of a print job."""
+def _queue_full_response():
+    response = jsonify({
+        'status': 'error',
+        'error': 'Print service is busy'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = '30'
+    return response
+
+
+def _submit_batch(data: dict):
+    """Queue one print job per bbox and register them as a batch."""
+    bboxes = data['bboxes']
+    if len(bboxes) > MAX_BATCH_PAGES:
+        return jsonify({'error': f'At most {MAX_BATCH_PAGES} pages per batch'}), 400
+    if not scheduler.has_capacity(len(bboxes)):
+        return _queue_full_response()
+
+    page_data = {key: value for key, value in data.items() if key != 'bboxes'}
+    job_ids, tickets = [], []
+    for bbox in bboxes:
+        page = {**page_data, 'bbox': bbox}
+        job_id, ticket = _new_print_job(page, build_mapfish_spec(page, current_app.layers_config))
+        job_ids.append(job_id)
+        if ticket:
+            tickets.append(ticket)
     try:
-        status_url = f'{MAPFISH_PRINT_URL}/print/status/{job_id}.json'
+        # All pages at once, other requests may have filled the queue since the check above
+        _enqueue_tickets(tickets)
+    except QueueFullError:
+        return _queue_full_response()
 
-        resp = requests.get(status_url, timeout=10)
+    batch_id = f'batch-{uuid.uuid4().hex}'
+    print_cache.set_job_state(batch_id, {
+        'state': 'batch',
+        'jobs': job_ids,
+        'outputFormat': data.get('outputFormat', 'pdf')
+    })
+    return jsonify({'status': 'added', 'pages': len(job_ids), **_job_urls(batch_id)})
 
-        if resp.status_code == 200:
-            result = resp.json()
 
-            # Map MapFish status to our status
-            mf_status = result.get('status', '')
-            done = result.get('done', False)
+def fetch_print_status(job_id: str) -> dict:
+    """Return the status of a queued, submitted or batch print job.
 
-            if done:
-                return jsonify({
-                    'status': 'finished',
-                    'downloadURL': f'/export/map/{job_id}/download'
-                })
-            elif mf_status == 'error':
-                return jsonify({
-                    'status': 'error',
-                    'error': result.get('error', 'Unknown error')
-                })
-            else:
-                return jsonify({
-                    'status': 'inprocess'
-                })
-        else:
-            return jsonify({
-                'status': 'error',
-                'error': 'Could not get print status'
-            }), resp.status_code
+    Raises requests.RequestException if the print service is unreachable.
+    """
+    state = print_cache.job_state(job_id)
+    if state is None:
+        return {
+            'status': 'error',
+            'error': 'Unknown print job'
+        }
+    if state['state'] == 'batch':
+        return _batch_status(job_id, state['jobs'])
+    if state['state'] == 'error':
+        return {
+            'status': 'error',
+            'error': state.get('error', 'Unknown error')
+        }
+    if _queue_expired(state):
+        _drop_lost_job(print_cache.key_for_job(job_id), job_id)
+        return {
+            'status': 'error',
+            'error': 'Print job was not started'
+        }
+    if state['state'] == 'queued':
+        status = {'status': 'queued'}
+        # Positions are only known to the worker holding the queue
+        position = scheduler.position(job_id)
+        if position:
+            status['queuePosition'] = position
+        return status
 
-    except requests.RequestException as e:
-        log.error(f"Failed to get print status: {e}")
-        return jsonify({
+    status_url = f'{MAPFISH_PRINT_URL}/print/status/{state["ref"]}.json'
+
+    resp = requests.get(status_url, timeout=10)
+
+    if resp.status_code != 200:
+        return {
             'status': 'error',
-            'error': 'Could not connect to print service'
-        }), 503
+            'error': 'Could not get print status'
+        }
 
+    result = resp.json()
+
+    # Map MapFish status to our status
+    mf_status = result.get('status', '')
+    done = result.get('done', False)
+
+    if done:
+        return {
+            'status': 'finished',
+            'downloadURL': f'/export/map/{job_id}/download'
+        }
+    elif mf_status == 'error':
+        key = print_cache.key_for_job(job_id)
+        if key:
+            print_cache.forget(key)
+        return {
+            'status': 'error',
+            'error': result.get('error', 'Unknown error')
+        }
+    return {
+        'status': 'inprocess'
+    }
+
+
+def _batch_status(batch_id: str, job_ids: list) -> dict:
+    """Combine the statuses of all pages of a batch."""
+    states = []
+    for job_id in job_ids:
+        status = _cached_status(job_id) or status_hub.poller(job_id).status or {'status': 'queued'}
+        states.append(status['status'])
+
+    if 'error' in states:
+        return {
+            'status': 'error',
+            'error': 'Print of at least one page failed'
+        }
+    if all(state == 'finished' for state in states):
+        return {
+            'status': 'finished',
+            'downloadURL': f'/export/map/{batch_id}/download'
+        }
+    return {
+        'status': 'queued' if all(state == 'queued' for state in states) else 'inprocess',
+        'pages': len(states),
+        'pagesFinished': states.count('finished')
+    }
+
+
+def _forget_failed_job(job_id: str) -> None:
+    """Drop a failed job so the next identical request resubmits it."""
+    scheduler.cancel(job_id)
+    key = print_cache.key_for_job(job_id)
+    # The spec may already be registered for a newer job
+    if key and print_cache.find_job(key) in (job_id, None):
+        print_cache.forget(key)
+
+
+# One status poller per job, shared by all clients waiting for it
+status_hub = PrintStatusHub(
+    fetch_print_status,
+    max_delay=float(os.environ.get('PRINT_STATUS_MAX_DELAY', 5)),
+    max_duration=float(os.environ.get('PRINT_STATUS_MAX_DURATION', 300)),
+    max_queue_wait=MAX_QUEUE_WAIT,
+    on_error=_forget_failed_job,
+)
+
+# Maximum seconds a status request may block
+MAX_STATUS_WAIT = 30
+SSE_KEEPALIVE = 15
+
+
+def _cached_status(job_id: str) -> dict | None:
+    """Return a finished status if the job output is cached locally."""
+    key = print_cache.key_for_job(job_id)
+    if key and print_cache.get_output(key):
+        return {
+            'status': 'finished',
+            'downloadURL': f'/export/map/{job_id}/download'
+        }
+    return None
+
+
+def _unknown_job_response():
+    return jsonify({
+        'status': 'error',
+        'error': 'Unknown print job'
+    }), 404
+
+
+@export_bp.route('/export/map/stats', methods=['GET'])
+def get_print_stats():
+    """Return print queue length and wait/render times per layout and format."""
+    return jsonify(scheduler.stats())
+
+
+@export_bp.route('/export/map/<job_id>/status', methods=['GET'])
+def get_print_status(job_id):
+    """Get the status of a print job.
+
+    With ``wait=<seconds>`` the request is held open until the status
+    version is newer than ``since`` (long polling).
+    """
+    cached = _cached_status(job_id)
+    if cached:
+        return jsonify(cached)
 
-@export_bp.route('/export/map/<job_id>/download', methods=['GET'])
-def download_print(job_id):
-    """Download the completed print job."""
     try:
-        download_url = f'{MAPFISH_PRINT_URL}/print/report/{job_id}'
+        wait = min(float(request.args.get('wait', 0)), MAX_STATUS_WAIT)
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({'error': 'Invalid wait or since parameter'}), 400
 
-        resp = requests.get(download_url, timeout=60, stream=True)
+    # Only start pollers for jobs that were queued, not for any client supplied ID
+    if print_cache.job_state(job_id) is None:
+        return _unknown_job_response()
+    poller = status_hub.poller(job_id)
+    # Without long polling, still wait for the first upstream answer
+    version, status = poller.wait(since if wait else 0, timeout=wait or 10)
 
-        if resp.status_code == 200:
-            # Get content type from response
-            content_type = resp.headers.get('Content-Type', 'application/pdf')
+    if status is None:
+        status = {'status': 'inprocess'}
+    return jsonify({**status, 'version': version})
 
-            # Determine filename extension
-            if 'pdf' in content_type:
-                ext = 'pdf'
-            elif 'png' in content_type:
-                ext = 'png'
-            else:
-                ext = 'pdf'
 
-            headers = {
-                'Content-Type': content_type,
-                'Content-Disposition': f'attachment; filename="karte.{ext}"'
-            }
+@export_bp.route('/export/map/<job_id>/events', methods=['GET'])
+def print_status_events(job_id):
+    """Stream status changes of a print job as Server-Sent Events."""
+    cached = _cached_status(job_id)
+    if not cached and print_cache.job_state(job_id) is None:
+        return _unknown_job_response()
+    poller = None if cached else status_hub.poller(job_id)
 
-            return Response(
-                resp.content,
-                status=200,
-                headers=headers
-            )
+    def generate():
+        if cached:
+            yield f'data: {json.dumps(cached)}\n\n'
+            return
+
+        version = 0
+        while True:
+            new_version, status = poller.wait(version, timeout=SSE_KEEPALIVE)
+            if new_version == version:
+                yield ': keepalive\n\n'
+                continue
+            version = new_version
+            yield f'id: {version}\ndata: {json.dumps(status)}\n\n'
+            if poller.done:
+                return
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def fetch_print_output(job_id: str) -> tuple[bytes, str] | None:
+    """Return (content, content type) of a finished print job.
+
+    Outputs are served from the local cache if possible, otherwise they
+    are downloaded from MapFish Print and cached. Returns None if the job
+    has no output. Raises requests.RequestException if the print service
+    is unreachable.
+    """
+    key = print_cache.key_for_job(job_id)
+    cached = print_cache.get_output(key) if key else None
+    if cached:
+        path, content_type = cached
+        with open(path, 'rb') as f:
+            return f.read(), content_type
+
+    state = print_cache.job_state(job_id)
+    if not state or state['state'] != 'submitted':
+        return None
+
+    download_url = f'{MAPFISH_PRINT_URL}/print/report/{state["ref"]}'
+
+    resp = requests.get(download_url, timeout=60, stream=True)
+    if resp.status_code != 200:
+        return None
+
+    # Get content type from response
+    content_type = resp.headers.get('Content-Type', 'application/pdf')
+    if key:
+        print_cache.store_output(key, resp.content, content_type)
+    return resp.content, content_type
+
+
+def combine_pages(pages: list, output_format: str) -> tuple[bytes, str, str]:
+    """Combine batch pages into one PDF or a ZIP of PNGs.
+
+    Returns (content, content type, file extension).
+    """
+    buffer = io.BytesIO()
+    if output_format == 'pdf':
+        writer = PdfWriter()
+        for content, _ in pages:
+            writer.append(io.BytesIO(content))
+        writer.write(buffer)
+        return buffer.getvalue(), 'application/pdf', 'pdf'
+
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for index, (content, content_type) in enumerate(pages):
+            archive.writestr(f'karte-{index + 1}.{_output_extension(content_type)}', content)
+    return buffer.getvalue(), 'application/zip', 'zip'
+
+
+@export_bp.route('/export/map/<job_id>/download', methods=['GET'])
+def download_print(job_id):
+    """Download the completed print job."""
+    key = print_cache.key_for_job(job_id)
+    cached = print_cache.get_output(key) if key else None
+    if cached:
+        path, content_type = cached
+        return send_file(
+            path,
+            mimetype=content_type,
+            as_attachment=True,
+            download_name=f'karte.{_output_extension(content_type)}'
+        )
+
+    try:
+        state = print_cache.job_state(job_id)
+        if state and state['state'] == 'batch':
+            pages = [fetch_print_output(page_id) for page_id in state['jobs']]
+            if None in pages:
+                return jsonify({
+                    'error': 'Could not download print result'
+                }), 404
+            content, content_type, ext = combine_pages(pages, state['outputFormat'])
         else:
-            return jsonify({
-                'error': 'Could not download print result'
-            }), resp.status_code
+            output = fetch_print_output(job_id)
+            if output is None:
+                return jsonify({
+                    'error': 'Could not download print result'
+                }), 404
+            content, content_type = output
+            ext = _output_extension(content_type)
+
+        headers = {
+            'Content-Type': content_type,
+            'Content-Disposition': f'attachment; filename="karte.{ext}"'
+        }
+
+        return Response(
+            content,
+            status=200,
+            headers=headers
+        )
 
     except requests.RequestException as e:
         log.error(f"Failed to download print: {e}")
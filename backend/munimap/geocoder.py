@@ -0,0 +1,194 @@
+# Geocoder proxy
+# Caches upstream geocoder results and answers prefix queries from local address data
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+
+from munimap.reproject import MAP_PROJECTION, transform
+from munimap.profiling import phase
+
+log = logging.getLogger('munimap.geocoder')
+
+DEFAULT_MAX_RESULTS = 20
+
+
+class GeocoderError(Exception):
+    pass
+
+
+class ResultCache:
+    """LRU cache with a time to live for geocoder results."""
+
+    def __init__(self, max_entries=1000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def normalize_term(term):
+    """Normalize a search term for cache keys and prefix matching."""
+    return ' '.join(term.casefold().replace('ß', 'ss').split())
+
+
+class AddressIndex:
+    """Prefix index over address labels.
+
+    Labels are kept as a sorted list of normalized keys, a prefix query is
+    a binary search for the first match followed by a scan of at most
+    max_results entries.
+    """
+
+    def __init__(self, addresses):
+        entries = sorted((normalize_term(label), label, geom) for label, geom in addresses)
+        self.keys = [entry[0] for entry in entries]
+        self.results = [{'label': label, 'geom': geom} for _, label, geom in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_geojson(cls, path, viewbox=None, srs='EPSG:4326', label_property='label'):
+        """Load point features of a GeoJSON file, limited to viewbox (EPSG:4326)."""
+        with open(path) as f:
+            features = json.load(f).get('features', [])
+
+        labels, xs, ys = [], [], []
+        for feature in features:
+            geometry = feature.get('geometry') or {}
+            label = (feature.get('properties') or {}).get(label_property)
+            if geometry.get('type') != 'Point' or not label:
+                continue
+            labels.append(label)
+            xs.append(geometry['coordinates'][0])
+            ys.append(geometry['coordinates'][1])
+
+        lon, lat = transform(xs, ys, srs, 'EPSG:4326')
+        x, y = transform(lon, lat, 'EPSG:4326', MAP_PROJECTION)
+        addresses = []
+        for i, label in enumerate(labels):
+            if viewbox and not (viewbox[0] <= lon[i] <= viewbox[2] and viewbox[1] <= lat[i] <= viewbox[3]):
+                continue
+            addresses.append((label, f'POINT({x[i]:.2f} {y[i]:.2f})'))
+        return cls(addresses)
+
+    def search(self, term, max_results=DEFAULT_MAX_RESULTS):
+        """Return results whose label starts with term, exact matches first."""
+        prefix = normalize_term(term)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.keys, prefix)
+        results = []
+        for i in range(start, min(start + max_results, len(self.keys))):
+            if not self.keys[i].startswith(prefix):
+                break
+            results.append({**self.results[i], 'sml': 1 if self.keys[i] == prefix else 0})
+        return results
+
+
+def _with_params(url, params):
+    """Return url with params added to (or replacing) its query."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update(params)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class GeocoderProxy:
+    """Forwards searches to configured geocoders, caching their results."""
+
+    def __init__(self, address_dir, cache_size=1000, cache_ttl=300, timeout=10):
+        self.address_dir = address_dir
+        self.timeout = timeout
+        self.cache = ResultCache(cache_size, cache_ttl)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def address_index(self, options):
+        """Return the local address index of geocoder options or None."""
+        local = options.get('localAddresses')
+        if not local:
+            return None
+
+        path = os.path.realpath(os.path.join(self.address_dir, local['file']))
+        if not path.startswith(os.path.realpath(self.address_dir) + os.sep) or not os.path.isfile(path):
+            log.warning(f"Address file {local['file']} not found")
+            return None
+
+        viewbox = options.get('viewbox')
+        key = (path, os.path.getmtime(path), tuple(viewbox or ()))
+        with self._lock:
+            index = self._indexes.get(key)
+        if index is None:
+            index = AddressIndex.from_geojson(
+                path, viewbox,
+                srs=local.get('srs', 'EPSG:4326'),
+                label_property=local.get('labelProperty', 'label')
+            )
+            log.info(f"Indexed {len(index)} addresses of {local['file']}")
+            with self._lock:
+                self._indexes = {k: v for k, v in self._indexes.items() if k[0] != path}
+                self._indexes[key] = index
+        return index
+
+    def search(self, search_config, term, max_results=DEFAULT_MAX_RESULTS):
+        """Return (results, source) with source one of local, cache or upstream."""
+        options = search_config.get('geocoderOptions', {})
+
+        index = self.address_index(options)
+        if index is not None:
+            results = index.search(term, max_results)
+            if results:
+                return results, 'local'
+
+        url = options.get('url')
+        if not url:
+            raise GeocoderError(f"No geocoder url for {search_config.get('name')}")
+
+        key = (url, options.get('method', 'get'), normalize_term(term), max_results)
+        results = self.cache.get(key)
+        if results is not None:
+            return results, 'cache'
+
+        params = {'term': term, 'maxresults': str(max_results)}
+        try:
+            with phase('upstream'):
+                if options.get('method', 'get').lower() == 'post':
+                    response = requests.post(url, data=params, timeout=self.timeout)
+                else:
+                    response = requests.get(_with_params(url, params), timeout=self.timeout)
+            response.raise_for_status()
+            results = response.json()
+        except (requests.RequestException, ValueError) as e:
+            log.warning(f"Geocoder request to {url} failed: {e}")
+            raise GeocoderError('Geocoder not available') from e
+
+        self.cache.set(key, results)
+        return results, 'upstream'
@@ -0,0 +1,135 @@
+# GeoJSON geometry helpers
+# Simplification and coordinate rounding for print specs and vector layers
+
+import math
+
+
+def _radial_filter(coords, tolerance):
+    """Drop vertices closer than tolerance to the previously kept vertex."""
+    sq_tolerance = tolerance * tolerance
+    last = coords[0]
+    result = [last]
+    for coord in coords[1:-1]:
+        dx = coord[0] - last[0]
+        dy = coord[1] - last[1]
+        if dx * dx + dy * dy > sq_tolerance:
+            result.append(coord)
+            last = coord
+    result.append(coords[-1])
+    return result
+
+
+def simplify_line(coords, tolerance):
+    """Simplify a coordinate list to the given tolerance.
+
+    A cheap radial distance pass removes dense vertices (e.g. freehand
+    drawings) before Douglas-Peucker, which is implemented with an explicit
+    stack so long lines do not hit the recursion limit.
+    """
+    if tolerance <= 0 or len(coords) < 3:
+        return list(coords)
+
+    coords = _radial_filter(coords, tolerance)
+    if len(coords) < 3:
+        return coords
+
+    xs = [coord[0] for coord in coords]
+    ys = [coord[1] for coord in coords]
+    keep = [False] * len(coords)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        first, last = stack.pop()
+        sx, sy = xs[first], ys[first]
+        dx, dy = xs[last] - sx, ys[last] - sy
+        length = math.hypot(dx, dy)
+        max_dist = 0.0
+        index = first
+        if length:
+            # Distance to the line through first and last, scaled by length
+            for i in range(first + 1, last):
+                dist = abs((xs[i] - sx) * dy - (ys[i] - sy) * dx)
+                if dist > max_dist:
+                    max_dist = dist
+                    index = i
+            max_dist /= length
+        else:
+            # Closed ring: distance to the start point
+            for i in range(first + 1, last):
+                dist = math.hypot(xs[i] - sx, ys[i] - sy)
+                if dist > max_dist:
+                    max_dist = dist
+                    index = i
+        if max_dist > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [coord for coord, kept in zip(coords, keep) if kept]
+
+
+def _round_coord(coord, decimals):
+    return [round(value, decimals) for value in coord]
+
+
+def _round_line(coords, decimals):
+    """Round coordinates and drop consecutive duplicates."""
+    result = []
+    for coord in coords:
+        rounded = _round_coord(coord, decimals)
+        if not result or rounded != result[-1]:
+            result.append(rounded)
+    return result
+
+
+def _compact_line(coords, tolerance, decimals, min_points):
+    line = _round_line(simplify_line(coords, tolerance), decimals)
+    if len(line) < min_points:
+        # Keep degenerated geometries instead of dropping them
+        line = [_round_coord(coord, decimals) for coord in coords]
+    return line
+
+
+def _compact_ring(ring, tolerance, decimals):
+    line = _compact_line(ring, tolerance, decimals, 4)
+    if line and line[0] != line[-1]:
+        line.append(line[0])
+    return line
+
+
+def compact_geometry(geometry, tolerance, decimals):
+    """Return a simplified copy of a GeoJSON geometry with rounded coordinates."""
+    if not geometry:
+        return geometry
+
+    gtype = geometry.get('type')
+    coords = geometry.get('coordinates')
+
+    if gtype == 'Point':
+        result = _round_coord(coords, decimals)
+    elif gtype == 'MultiPoint':
+        result = [_round_coord(coord, decimals) for coord in coords]
+    elif gtype == 'LineString':
+        result = _compact_line(coords, tolerance, decimals, 2)
+    elif gtype == 'MultiLineString':
+        result = [_compact_line(line, tolerance, decimals, 2) for line in coords]
+    elif gtype == 'Polygon':
+        result = [_compact_ring(ring, tolerance, decimals) for ring in coords]
+    elif gtype == 'MultiPolygon':
+        result = [[_compact_ring(ring, tolerance, decimals) for ring in polygon] for polygon in coords]
+    elif gtype == 'GeometryCollection':
+        return {
+            'type': gtype,
+            'geometries': [compact_geometry(geom, tolerance, decimals) for geom in geometry.get('geometries', [])]
+        }
+    else:
+        return geometry
+
+    return {'type': gtype, 'coordinates': result}
+
+
+def precision_decimals(resolution):
+    """Number of decimals that keeps coordinates below a tenth of a pixel."""
+    if resolution <= 0:
+        return 6
+    return max(0, math.ceil(-math.log10(resolution / 10)))
@@ -8,6 +8,8 @@ import logging
 from copy import deepcopy
 from collections import OrderedDict
 
+from munimap.tile_facade import is_facade_layer
+
 log = logging.getLogger('munimap.layers')
 
 
@@ -42,7 +44,14 @@ def merge_dict(target, base):
     return result
 
 
-def anol_background_layer(layer_conf):
+def facade_source(layer_conf, tile_facade):
+    """Tile facade properties of a WMS layer with source.tileFacade, or an empty dict."""
+    if tile_facade is None or not layer_conf['source'].get('tileFacade') or not is_facade_layer(layer_conf):
+        return {}
+    return tile_facade.anol_source(layer_conf)
+
+
+def anol_background_layer(layer_conf, tile_facade=None):
     """Create background layer configuration for frontend."""
     source = None
 
@@ -73,6 +82,7 @@ def anol_background_layer(layer_conf):
                 'SRS': layer_conf['source']['srs']
             }
         }
+        source.update(facade_source(layer_conf, tile_facade))
     else:
         raise UnsupportedLayerError(
             f'background layer type "{layer_conf["type"]}" is not supported')
@@ -102,7 +112,7 @@ def anol_background_layer(layer_conf):
     return background_layer
 
 
-def anol_overlay_layer(layer_conf):
+def anol_overlay_layer(layer_conf, tile_facade=None):
     """Create overlay layer configuration for frontend."""
     source = {}
 
@@ -134,6 +144,7 @@ def anol_overlay_layer(layer_conf):
             source['params']['STYLES'] = ','.join(layer_conf['source']['styles'])
         if layer_conf['source'].get('transparent') is not None:
             source['params']['TRANSPARENT'] = 'TRUE' if layer_conf['source']['transparent'] else 'FALSE'
+        source.update(facade_source(layer_conf, tile_facade))
     elif layer_conf['type'] == 'wmts':
         layer_name = layer_conf['name']
         if layer_conf.get('source', {}).get('directAccess'):
@@ -200,8 +211,12 @@ def anol_overlay_layer(layer_conf):
     return anol_layer
 
 
-def create_anol_layers(conf):
-    """Create anol layer configuration from loaded config."""
+def create_anol_layers(conf, tile_facade=None):
+    """Create anol layer configuration from loaded config.
+
+    WMS layers with source.tileFacade advertise the tile URLs of
+    tile_facade next to their proxy URL.
+    """
     anol_conf = {
         'backgroundLayer': [],
         'overlays': []
@@ -209,7 +224,7 @@ def create_anol_layers(conf):
 
     for layer in conf['backgrounds']:
         try:
-            anol_conf['backgroundLayer'].append(anol_background_layer(layer))
+            anol_conf['backgroundLayer'].append(anol_background_layer(layer, tile_facade))
         except UnsupportedLayerError as ex:
             log.warning(str(ex))
             continue
@@ -232,7 +247,7 @@ def create_anol_layers(conf):
         }
         for layer in group['layers']:
             try:
-                anol_group['layers'].append(anol_overlay_layer(layer))
+                anol_group['layers'].append(anol_overlay_layer(layer, tile_facade))
             except UnsupportedLayerError as ex:
                 log.warning(str(ex))
                 continue
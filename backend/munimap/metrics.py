@@ -0,0 +1,284 @@
+# Prometheus metrics
+# Workers collect in memory and publish snapshots to a shared directory,
+# the metrics endpoint of any worker merges all snapshots
+
+import os
+import json
+import glob
+import fcntl
+import atexit
+import bisect
+import logging
+import tempfile
+import threading
+
+from munimap.vector_pack import write_atomic
+
+log = logging.getLogger('munimap.metrics')
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'munimap-metrics')
+# Counts of exited processes, kept so counters stay monotonic
+EXITED_FILE = 'metrics-exited.json'
+
+# Latency buckets in seconds, from tile requests up to print jobs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(labels), value] for labels, value in self.values.items()]
+        return {'type': 'counter', 'help': self.help, 'labelnames': self.labelnames, 'values': values}
+
+
+class Histogram:
+    """Histogram with per-bucket (not cumulative) counts, a count and a sum."""
+
+    def __init__(self, name, help, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                # One slot per bucket, +Inf and the sum
+                entry = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(labels), list(entry)] for labels, entry in self.values.items()]
+        return {
+            'type': 'histogram', 'help': self.help, 'labelnames': self.labelnames,
+            'buckets': self.buckets, 'values': values,
+        }
+
+
+def _schema(metric):
+    return metric['type'], tuple(metric['labelnames']), tuple(metric.get('buckets', ()))
+
+
+def _merge(target, snapshot):
+    """Add the values of a snapshot to merged metrics.
+
+    Metrics that are not in target or changed their labels or buckets
+    since the snapshot was written are skipped.
+    """
+    for name, metric in snapshot.items():
+        merged = target.get(name)
+        if merged is None or _schema(merged) != _schema(metric):
+            continue
+        for labels, value in metric['values']:
+            key = tuple(labels)
+            if metric['type'] == 'counter':
+                merged['values'][key] = merged['values'].get(key, 0) + value
+            else:
+                existing = merged['values'].get(key)
+                merged['values'][key] = value if existing is None else [a + b for a, b in zip(existing, value)]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render(merged):
+    """Render merged metric snapshots in the Prometheus text format."""
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        names = metric['labelnames']
+        for labels, value in sorted(metric['values'].items()):
+            if metric['type'] == 'counter':
+                lines.append(f'{name}{_labels(names, labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound}"'
+                lines.append(f'{name}_bucket{_labels(names, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(names, labels)} {value[-1]}')
+            lines.append(f'{name}_count{_labels(names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _unmerge(merged):
+    """Convert merged metrics back into the snapshot format."""
+    return {
+        name: {**metric, 'values': [[list(labels), value] for labels, value in metric['values'].items()]}
+        for name, metric in merged.items()
+    }
+
+
+def reset_directory(directory):
+    """Remove all snapshots, e.g. when the server (re)starts."""
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            log.warning(f"Could not remove metrics {path}: {e}")
+
+
+class MetricsRegistry:
+    """Metrics of one process, published to directory for aggregation.
+
+    Recording only updates in-memory values; a background thread writes a
+    snapshot every flush_interval seconds. Snapshots of exited processes
+    are folded into one file of exited counts, so counters stay monotonic
+    and reused PIDs do not overwrite them.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.directory = None
+        self.flush_interval = 5
+        self._thread = None
+        self._stop = threading.Event()
+
+    def counter(self, name, help, labelnames=()):
+        return self.metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def configure(self, directory, flush_interval=5):
+        """Start publishing snapshots of this process to directory."""
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        # Not written by this process yet, so it belongs to an exited one with the same PID
+        self.fold(os.getpid())
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def _empty(self):
+        """Merge target with the current metrics and no values."""
+        return {name: {**metric, 'values': {}} for name, metric in self.snapshot().items()}
+
+    def fold(self, pid, directory=None):
+        """Add the snapshot of an exited process to the exited counts and remove it."""
+        directory = directory or self.directory
+        path = os.path.join(directory, f'metrics-{pid}.json')
+        if not os.path.exists(path):
+            return
+        exited_path = os.path.join(directory, EXITED_FILE)
+        with open(os.path.join(directory, 'metrics.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            merged = self._empty()
+            for source in (exited_path, path):
+                try:
+                    with open(source) as f:
+                        _merge(merged, json.load(f))
+                except FileNotFoundError:
+                    pass
+                except (OSError, ValueError) as e:
+                    log.warning(f"Could not read metrics {source}: {e}")
+            write_atomic(exited_path, json.dumps(_unmerge(merged)).encode('UTF-8'))
+            os.unlink(path)
+
+    def _path(self, pid=None):
+        return os.path.join(self.directory, f'metrics-{pid or os.getpid()}.json')
+
+    def flush(self):
+        if self.directory:
+            write_atomic(self._path(), json.dumps(self.snapshot()).encode('UTF-8'))
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                log.warning(f"Could not write metrics: {e}")
+
+    def collect(self):
+        """Return metrics merged across all workers in Prometheus text format."""
+        merged = self._empty()
+        _merge(merged, self.snapshot())
+        if self.directory:
+            own = self._path()
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        _merge(merged, json.load(f))
+                except (OSError, ValueError) as e:
+                    log.warning(f"Could not read metrics {path}: {e}")
+        return render(merged)
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    'munimap_http_requests_total', 'HTTP requests by route, method and status',
+    ('route', 'method', 'status'))
+http_duration = registry.histogram(
+    'munimap_http_request_duration_seconds', 'Time until the response headers are ready',
+    ('route',))
+http_response_bytes = registry.counter(
+    'munimap_http_response_bytes_total', 'Response body bytes with known length by route',
+    ('route',))
+upstream_duration = registry.histogram(
+    'munimap_upstream_request_duration_seconds', 'Upstream request time by target',
+    ('upstream',))
+upstream_errors = registry.counter(
+    'munimap_upstream_errors_total', 'Failed upstream requests by target',
+    ('upstream',))
+print_job_duration = registry.histogram(
+    'munimap_print_job_duration_seconds', 'Print job time on the print server',
+    ('format', 'status'))
+print_queue_wait = registry.histogram(
+    'munimap_print_queue_wait_seconds', 'Time print jobs waited in the local queue',
+    ('format',))
+shared_cache_requests = registry.counter(
+    'munimap_shared_cache_requests_total', 'Shared cache lookups by key namespace and result',
+    ('namespace', 'result'))
+composite_layers = registry.counter(
+    'munimap_proxy_composite_layers_total', 'Overlays requested through the composite proxy',
+    ('hash',))
+composite_getmaps = registry.counter(
+    'munimap_proxy_composite_getmaps_total', 'Upstream GetMaps issued for composite proxy requests',
+    ('hash',))
+proxy_admission = registry.counter(
+    'munimap_proxy_admission_total', 'Proxy requests by admission pool (upstream, cluster) and result',
+    ('pool', 'result'))
+proxy_admission_wait = registry.histogram(
+    'munimap_proxy_admission_wait_seconds', 'Time admitted proxy requests waited in the queue by pool',
+    ('pool',))
+prefetch_tiles = registry.counter(
+    'munimap_prefetch_tiles_total', 'Predicted tiles by upstream and result (used counts prefetched tiles served)',
+    ('upstream', 'result'))
+cluster_requests = registry.counter(
+    'munimap_cluster_requests_total', 'Cached proxy requests by cluster routing (local, forwarded, peer_error)',
+    ('result',))
@@ -0,0 +1,209 @@
+# Predictive prefetching of proxied WMS tiles
+# Watches the GetMap tiles each client session requests, infers pan
+# direction and zoom trend and loads the next tiles into the proxy cache
+
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from munimap import metrics
+
+log = logging.getLogger('munimap.prefetch')
+
+# OpenLayers requests the tiles of a view in one burst after the map stopped moving
+BURST_GAP = 0.3
+TILE_SIZES = (256, 512)
+# Relative tolerance when comparing tile spans and edges, also the
+# precision of normalized bboxes relative to their size
+TOLERANCE = 1e-6
+
+
+def parse_bbox(value):
+    """Return the BBOX param as list of floats or None."""
+    try:
+        bbox = [float(v) for v in value.split(',')]
+    except (AttributeError, ValueError):
+        return None
+    return bbox if len(bbox) == 4 and bbox[2] > bbox[0] and bbox[3] > bbox[1] else None
+
+
+def normalize_bbox(value):
+    """Round a BBOX param to a millionth of its size, so tile bounds
+    computed with different float rounding map to the same cache key in
+    projected and geographic CRSs alike."""
+    bbox = parse_bbox(value)
+    if bbox is None:
+        return value
+    span = min(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    digits = max(0, -math.floor(math.log10(span * TOLERANCE)))
+    return ','.join(f'{v:.{digits}f}' for v in bbox)
+
+
+class _Session:
+    """Tiles one client requested for one layer at the current zoom level."""
+
+    def __init__(self):
+        self.span = None
+        self.previous = None
+        self.burst = None
+        self.burst_seen = 0.0
+        self.last_seen = 0.0
+        self.predicted = set()
+
+    def observe(self, bbox, now):
+        """Record a tile and return the bboxes of tiles likely requested next."""
+        span = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+        self.last_seen = now
+
+        if self.span is None or abs(span[0] - self.span[0]) > TOLERANCE * span[0]:
+            zoom_in = self.span is not None and span[0] < self.span[0]
+            self.span, self.previous, self.burst = span, None, list(bbox)
+            self.burst_seen = now
+            self.predicted = set()
+            # The first tile after a zoom is the center of the view, keep zooming into it
+            return _children(bbox) if zoom_in else []
+
+        if now - self.burst_seen > BURST_GAP:
+            self.previous, self.burst = self.burst, list(bbox)
+            self.predicted = set()
+        else:
+            self.burst = _union(self.burst, bbox)
+        self.burst_seen = now
+
+        if self.previous is None:
+            return []
+        # New tiles beyond the view before the move show the pan direction
+        eps = TOLERANCE * span[0]
+        dx = 1 if bbox[2] > self.previous[2] + eps else -1 if bbox[0] < self.previous[0] - eps else 0
+        dy = 1 if bbox[3] > self.previous[3] + eps else -1 if bbox[1] < self.previous[1] - eps else 0
+        if not dx and not dy:
+            return []
+        shifted = [bbox[0] + dx * span[0], bbox[1] + dy * span[1], bbox[2] + dx * span[0], bbox[3] + dy * span[1]]
+        key = tuple(round(v, 3) for v in shifted)
+        if key in self.predicted:
+            return []
+        self.predicted.add(key)
+        return [shifted]
+
+
+def _union(a, b):
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def _children(bbox):
+    midx = (bbox[0] + bbox[2]) / 2
+    midy = (bbox[1] + bbox[3]) / 2
+    return [
+        [bbox[0], midy, midx, bbox[3]],
+        [midx, midy, bbox[2], bbox[3]],
+        [bbox[0], bbox[1], midx, midy],
+        [midx, bbox[1], bbox[2], midy],
+    ]
+
+
+class _Budget:
+    """Token bucket of prefetch requests per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class TilePrefetcher:
+    """Loads the tiles a panning or zooming client will request next.
+
+    ``observe`` is called with every proxied GetMap. Sessions are keyed by
+    client, upstream and all params except BBOX, so each layer of a client
+    is tracked on its own. Predicted tiles are passed to
+    ``fetch(hash, params)``, which loads them into the shared cache and
+    returns 'fetched', 'cached' or 'error', on a few background threads.
+    Prefetching is low priority: predictions are dropped while ``busy()``
+    is true, when ``max_pending`` fetches wait or when the upstream used
+    up its budget of ``budget_per_minute`` prefetches.
+    """
+
+    def __init__(self, fetch, busy, budget_per_minute=120, workers=2, max_pending=64,
+                 max_sessions=1000, session_ttl=120):
+        self.fetch = fetch
+        self.busy = busy
+        self.budget_per_minute = budget_per_minute
+        self.max_pending = max_pending
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._budgets = {}
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+
+    def observe(self, client, hash, params):
+        """Record a proxied request and schedule the predicted tiles."""
+        upper = {key.upper(): value for key, value in params.items()}
+        if upper.get('REQUEST', '').lower() != 'getmap':
+            return
+        if upper.get('WIDTH') != upper.get('HEIGHT') or not upper.get('WIDTH', '').isdigit() \
+                or int(upper['WIDTH']) not in TILE_SIZES:
+            # Single images of untiled layers have no neighbours to predict
+            return
+        bbox = parse_bbox(upper.get('BBOX'))
+        if bbox is None:
+            return
+
+        session_key = (client, hash, tuple(sorted((key, value) for key, value in upper.items() if key != 'BBOX')))
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.pop(session_key, None) or _Session()
+            self._expire(now)
+            self._sessions[session_key] = session
+            predicted = session.observe(bbox, now)
+
+        for tile_bbox in predicted:
+            self._submit(hash, dict(params, **{self._bbox_key(params): ','.join(repr(v) for v in tile_bbox)}))
+
+    @staticmethod
+    def _bbox_key(params):
+        return next(key for key in params if key.upper() == 'BBOX')
+
+    def _expire(self, now):
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if len(self._sessions) < self.max_sessions and now - session.last_seen < self.session_ttl:
+                break
+            del self._sessions[key]
+
+    def _submit(self, hash, params):
+        with self._lock:
+            if self._pending >= self.max_pending or self.busy():
+                metrics.prefetch_tiles.inc((hash, 'dropped'))
+                return
+            budget = self._budgets.setdefault(hash, _Budget(self.budget_per_minute))
+            if not budget.take():
+                metrics.prefetch_tiles.inc((hash, 'over_budget'))
+                return
+            self._pending += 1
+        self._executor.submit(self._run, hash, params)
+
+    def _run(self, hash, params):
+        try:
+            result = self.fetch(hash, params)
+        except Exception as e:
+            log.warning(f"Prefetch for {hash} failed: {e}")
+            result = 'error'
+        finally:
+            with self._lock:
+                self._pending -= 1
+        metrics.prefetch_tiles.inc((hash, result))
@@ -0,0 +1,216 @@
+# Print job deduplication and result cache
+# Identical print specs reuse running MapFish jobs and finished outputs
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+
+log = logging.getLogger('munimap.print_cache')
+
+
+def spec_hash(spec: dict) -> str:
+    """Return a hash of the canonical (key-sorted) print spec."""
+    encoded = json.dumps(spec, sort_keys=True, separators=(',', ':')).encode('UTF-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _valid_name(job_ref: str) -> bool:
+    """Check that a client supplied job reference is safe as a file name."""
+    return bool(job_ref) and '/' not in job_ref and not job_ref.startswith('.')
+
+
+class PrintResultCache:
+    """Size-bounded on-disk cache of print jobs and outputs.
+
+    All state lives in files below ``directory`` so that every worker
+    sharing the directory sees the same jobs and outputs:
+
+    - ``<hash>.job``: ID of a queued, in-flight or finished job
+    - ``ref-<job_ref>``: spec hash of a job ID
+    - ``<hash>.out`` / ``<hash>.meta``: downloaded output and its content type
+    - ``state-<job_ref>``: scheduling state of a queued, submitted or batch job
+
+    Outputs expire ``ttl`` seconds after they were stored (the ``.meta``
+    mtime), hits do not extend that. Hits touch the ``.out`` file, its
+    mtime only orders the eviction of least recently used outputs.
+    Jobs are reused for ``job_ttl`` seconds after they were registered,
+    queued jobs for up to ``queue_ttl`` seconds until they start.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float, job_ttl: float, queue_ttl: float = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.job_ttl = job_ttl
+        self.queue_ttl = queue_ttl
+        # Job references and states must outlive every use above
+        self.max_age = max(ttl, job_ttl, queue_ttl)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _write(self, name: str, content: bytes) -> None:
+        """Atomically write a file into the cache directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, self._path(name))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _read_fresh(self, name: str, ttl: float) -> bytes | None:
+        """Read a file if it exists and is younger than ttl."""
+        path = self._path(name)
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def find_job(self, key: str) -> str | None:
+        """Return the job reference for a spec hash if it can be reused."""
+        if self.get_output(key):
+            content = self._read_fresh(f'{key}.job', self.ttl)
+        else:
+            content = self._read_fresh(f'{key}.job', self.job_ttl)
+        if content is None:
+            # Jobs waiting in the print queue stay reusable until they start
+            content = self._read_fresh(f'{key}.job', self.queue_ttl)
+            if content and (self.job_state(content.decode('UTF-8')) or {}).get('state') != 'queued':
+                return None
+        return content.decode('UTF-8') if content else None
+
+    def register_job(self, key: str, job_ref: str) -> None:
+        """Remember the job reference for a spec hash.
+
+        Registering a job again restarts its reuse period, e.g. when it
+        leaves the queue.
+        """
+        try:
+            self._write(f'{key}.job', job_ref.encode('UTF-8'))
+            self._write(f'ref-{job_ref}', key.encode('UTF-8'))
+        except OSError as e:
+            log.warning(f"Could not register print job {job_ref}: {e}")
+
+    def unregister_job(self, key: str, job_ref: str) -> None:
+        """Drop a job that will never run, so identical requests do not reuse it."""
+        names = [f'ref-{job_ref}', f'state-{job_ref}']
+        content = self._read_fresh(f'{key}.job', self.max_age)
+        if content and content.decode('UTF-8') == job_ref:
+            names.append(f'{key}.job')
+        for name in names:
+            try:
+                os.unlink(self._path(name))
+            except OSError:
+                pass
+
+    def key_for_job(self, job_ref: str) -> str | None:
+        """Return the spec hash of a job reference."""
+        if not _valid_name(job_ref):
+            return None
+        content = self._read_fresh(f'ref-{job_ref}', self.max_age)
+        return content.decode('UTF-8') if content else None
+
+    def set_job_state(self, job_id: str, state: dict) -> None:
+        """Store the scheduling state of a job for all workers."""
+        try:
+            self._write(f'state-{job_id}', json.dumps(state).encode('UTF-8'))
+        except OSError as e:
+            log.warning(f"Could not store state of print job {job_id}: {e}")
+
+    def job_state(self, job_id: str) -> dict | None:
+        """Return the scheduling state of a job or None if unknown."""
+        if not _valid_name(job_id):
+            return None
+        content = self._read_fresh(f'state-{job_id}', self.max_age)
+        return json.loads(content) if content else None
+
+    def forget(self, key: str) -> None:
+        """Drop a failed job so the next identical request resubmits."""
+        for name in (f'{key}.job', f'{key}.out', f'{key}.meta'):
+            try:
+                os.unlink(self._path(name))
+            except OSError:
+                pass
+
+    def get_output(self, key: str) -> tuple[str, str] | None:
+        """Return (path, content type) of a cached output."""
+        meta = self._read_fresh(f'{key}.meta', self.ttl)
+        path = self._path(f'{key}.out')
+        if meta is None or not os.path.exists(path):
+            return None
+        try:
+            # Touch output for LRU eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return path, meta.decode('UTF-8')
+
+    def store_output(self, key: str, content: bytes, content_type: str) -> None:
+        """Store a finished output and evict old entries."""
+        if len(content) > self.max_bytes:
+            return
+        try:
+            self._write(f'{key}.out', content)
+            self._write(f'{key}.meta', content_type.encode('UTF-8'))
+            # Keep the job reusable as long as its output is cached
+            if os.path.exists(self._path(f'{key}.job')):
+                os.utime(self._path(f'{key}.job'))
+        except OSError as e:
+            log.warning(f"Could not cache print output {key}: {e}")
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove expired files and least recently used outputs above max_bytes."""
+        now = time.time()
+        outputs = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+
+        for name in names:
+            path = self._path(name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            age = now - stat.st_mtime
+            if name.endswith('.out'):
+                # Last use, expiry is checked on the .meta file
+                outputs.append((stat.st_mtime, stat.st_size, name[:-len('.out')]))
+            elif name.endswith('.meta'):
+                if age > self.ttl:
+                    self.forget(name[:-len('.meta')])
+            elif age > self.max_age:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+        live = []
+        for mtime, size, key in outputs:
+            if not os.path.exists(self._path(f'{key}.out')):
+                # Forgotten above with its expired .meta
+                continue
+            if not os.path.exists(self._path(f'{key}.meta')) and now - mtime > self.ttl:
+                # Orphaned output of an interrupted store
+                self.forget(key)
+                continue
+            live.append((mtime, size, key))
+
+        total = sum(size for _, size, _ in live)
+        for _, size, key in sorted(live):
+            if total <= self.max_bytes:
+                break
+            self.forget(key)
+            total -= size
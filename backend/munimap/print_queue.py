@@ -0,0 +1,201 @@
+# Bounded print job scheduler
+# Admission control and priorities in front of MapFish Print
+
+import time
+import uuid
+import heapq
+import logging
+import threading
+from collections import defaultdict
+
+log = logging.getLogger('munimap.print_queue')
+
+# Priority classes, lower runs first
+PRIORITY_PREVIEW = 0
+PRIORITY_SMALL = 1
+PRIORITY_MEDIUM = 2
+PRIORITY_LARGE = 3
+
+# Page sizes in mm of the MapFish print layouts, e.g. 'A4 portrait'
+ISO_PAGE_SIZES = {
+    'A0': (841, 1189),
+    'A1': (594, 841),
+    'A2': (420, 594),
+    'A3': (297, 420),
+    'A4': (210, 297),
+    'A5': (148, 210),
+}
+LAYOUT_SIZES = {
+    **{f'{name} portrait': (width, height) for name, (width, height) in ISO_PAGE_SIZES.items()},
+    **{f'{name} landscape': (height, width) for name, (width, height) in ISO_PAGE_SIZES.items()},
+}
+DEFAULT_LAYOUT = 'A4 portrait'
+
+# Page areas in mm² used to classify PDF exports
+A3_AREA = 297 * 420
+A1_AREA = 594 * 841
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def job_priority(spec: dict) -> int:
+    """Derive the priority class of a MapFish print spec.
+
+    PNG exports are previews and run first, PDFs are ranked by the page
+    area of their layout.
+    """
+    if spec.get('outputFormat', 'pdf') == 'png':
+        return PRIORITY_PREVIEW
+
+    width, height = LAYOUT_SIZES.get(spec.get('layout'), LAYOUT_SIZES[DEFAULT_LAYOUT])
+    area = width * height
+    if area <= A3_AREA:
+        return PRIORITY_SMALL
+    if area <= A1_AREA:
+        return PRIORITY_MEDIUM
+    return PRIORITY_LARGE
+
+
+class PrintTicket:
+    """A print job waiting for or running on the print server."""
+
+    def __init__(self, spec: dict, priority: int, layout: str, output_format: str):
+        self.id = uuid.uuid4().hex
+        self.spec = spec
+        self.priority = priority
+        self.layout = layout
+        self.output_format = output_format
+        self.state = 'queued'
+        self.error = None
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+
+class PrintScheduler:
+    """Priority queue with a fixed number of print slots.
+
+    ``run(ticket)`` submits a ticket to the print server and blocks until
+    the job finished, returning True on success. A slot stays occupied
+    until then, so at most ``max_concurrent`` jobs of this worker render
+    at the same time.
+    """
+
+    def __init__(self, run, max_concurrent=4, max_queued=100):
+        self.run = run
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+
+        self._queue = []
+        self._tickets = {}
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stats = defaultdict(lambda: {
+            'count': 0,
+            'errors': 0,
+            'queueWaitTotal': 0.0,
+            'queueWaitMax': 0.0,
+            'renderTotal': 0.0,
+            'renderMax': 0.0,
+        })
+
+    def _start_threads(self):
+        while len(self._threads) < self.max_concurrent:
+            thread = threading.Thread(
+                target=self._work, name=f'print-slot-{len(self._threads)}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def enqueue(self, ticket: PrintTicket) -> PrintTicket:
+        """Add a ticket to the queue. Raises QueueFullError if full."""
+        self.enqueue_many([ticket])
+        return ticket
+
+    def enqueue_many(self, tickets: list) -> None:
+        """Add all tickets or none of them. Raises QueueFullError if they do not fit."""
+        with self._condition:
+            if len(self._queue) + len(tickets) > self.max_queued:
+                raise QueueFullError('Print queue is full')
+            self._start_threads()
+            for ticket in tickets:
+                self._seq += 1
+                heapq.heappush(self._queue, (ticket.priority, self._seq, ticket))
+                self._tickets[ticket.id] = ticket
+            self._condition.notify(len(tickets))
+
+    def has_capacity(self, count: int = 1) -> bool:
+        """Check whether count more tickets fit into the queue."""
+        with self._condition:
+            return len(self._queue) + count <= self.max_queued
+
+    def cancel(self, ticket_id: str) -> bool:
+        """Remove a waiting ticket. Returns False if it is not queued here."""
+        with self._condition:
+            for index, (_, _, ticket) in enumerate(self._queue):
+                if ticket.id == ticket_id:
+                    self._queue.pop(index)
+                    heapq.heapify(self._queue)
+                    self._tickets.pop(ticket_id, None)
+                    ticket.state = 'cancelled'
+                    return True
+        return False
+
+    def get(self, ticket_id: str) -> PrintTicket | None:
+        with self._condition:
+            return self._tickets.get(ticket_id)
+
+    def position(self, ticket_id: str) -> int | None:
+        """Return the 1-based queue position of a waiting ticket."""
+        with self._condition:
+            for index, (_, _, ticket) in enumerate(sorted(self._queue, key=lambda e: e[:2])):
+                if ticket.id == ticket_id:
+                    return index + 1
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                _, _, ticket = heapq.heappop(self._queue)
+                ticket.state = 'running'
+                ticket.started_at = time.monotonic()
+
+            try:
+                ticket.state = 'finished' if self.run(ticket) else 'error'
+            except Exception as e:
+                log.error(f"Print job {ticket.id} failed: {e}")
+                ticket.state = 'error'
+                ticket.error = str(e)
+            ticket.finished_at = time.monotonic()
+            self._record(ticket)
+
+    def _record(self, ticket: PrintTicket):
+        queue_wait = ticket.started_at - ticket.enqueued_at
+        render = ticket.finished_at - ticket.started_at
+        with self._condition:
+            # Finished tickets are resolved through the shared job state
+            self._tickets.pop(ticket.id, None)
+            stats = self._stats[(ticket.layout, ticket.output_format)]
+            stats['count'] += 1
+            if ticket.state == 'error':
+                stats['errors'] += 1
+            stats['queueWaitTotal'] += queue_wait
+            stats['queueWaitMax'] = max(stats['queueWaitMax'], queue_wait)
+            stats['renderTotal'] += render
+            stats['renderMax'] = max(stats['renderMax'], render)
+
+    def stats(self) -> dict:
+        """Return queue length and timings per layout and output format."""
+        with self._condition:
+            return {
+                'queued': len(self._queue),
+                'maxConcurrent': self.max_concurrent,
+                'jobs': [
+                    {'layout': layout, 'outputFormat': output_format, **stats}
+                    for (layout, output_format), stats in sorted(self._stats.items())
+                ],
+            }
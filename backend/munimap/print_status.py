@@ -0,0 +1,152 @@
+# Shared print job status polling
+# One backend poller per job fans its status out to all waiting clients
+
+import time
+import logging
+import threading
+
+log = logging.getLogger('munimap.print_status')
+
+FINAL_STATES = ('finished', 'error')
+
+
+class JobStatusPoller:
+    """Poll the status of one print job with exponential backoff.
+
+    ``on_error(job_id)`` is called once when the job ends with an error,
+    including timeouts and unreachable print services.
+    """
+
+    def __init__(self, job_id, fetch_status, initial_delay=0.5, max_delay=5.0,
+                 backoff=1.5, max_duration=300, max_failures=5, max_queue_wait=1800,
+                 on_error=None):
+        self.job_id = job_id
+        self.fetch_status = fetch_status
+        self.on_error = on_error
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_duration = max_duration
+        self.max_failures = max_failures
+        self.max_queue_wait = max_queue_wait
+
+        self.status = None
+        self.version = 0
+        self.finished_at = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f'print-status-{job_id}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def done(self):
+        return self.status is not None and self.status.get('status') in FINAL_STATES
+
+    def _publish(self, status):
+        with self._condition:
+            if status == self.status:
+                return
+            self.status = status
+            self.version += 1
+            if self.done:
+                self.finished_at = time.monotonic()
+            self._condition.notify_all()
+
+        if self.on_error and status.get('status') == 'error':
+            try:
+                self.on_error(self.job_id)
+            except Exception as e:
+                log.warning(f"Error handler of print job {self.job_id} failed: {e}")
+
+    def _run(self):
+        started = queued_since = time.monotonic()
+        delay = self.initial_delay
+        failures = 0
+
+        while True:
+            try:
+                status = self.fetch_status(self.job_id)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                log.warning(f"Status request for print job {self.job_id} failed: {e}")
+                if failures >= self.max_failures:
+                    status = {
+                        'status': 'error',
+                        'error': 'Could not connect to print service'
+                    }
+                else:
+                    status = self.status
+
+            if status is not None:
+                self._publish(status)
+            if self.done:
+                return
+            if status is not None and status.get('status') == 'queued':
+                # Waiting in the local queue does not count as running time
+                started = time.monotonic()
+                if started - queued_since > self.max_queue_wait:
+                    self._publish({
+                        'status': 'error',
+                        'error': 'Print job was not started'
+                    })
+                    return
+
+            if time.monotonic() - started > self.max_duration:
+                self._publish({
+                    'status': 'error',
+                    'error': 'Print job timed out'
+                })
+                return
+
+            time.sleep(delay)
+            delay = min(delay * self.backoff, self.max_delay)
+
+    def wait(self, since_version=0, timeout=None):
+        """Wait until the status is newer than since_version.
+
+        Returns (version, status); status may be None if the first poll
+        has not completed within timeout.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.version > since_version or self.done,
+                timeout=timeout
+            )
+            return self.version, self.status
+
+
+class PrintStatusHub:
+    """Registry of running job pollers.
+
+    Finished pollers are kept for ``retention`` seconds so that late
+    subscribers still get the final status without a new upstream request.
+    """
+
+    def __init__(self, fetch_status, retention=120, **poller_options):
+        self.fetch_status = fetch_status
+        self.retention = retention
+        self.poller_options = poller_options
+        self._pollers = {}
+        self._lock = threading.Lock()
+
+    def poller(self, job_id):
+        """Return the poller of a job, starting one if needed."""
+        with self._lock:
+            self._expire()
+            poller = self._pollers.get(job_id)
+            if poller is None:
+                poller = JobStatusPoller(job_id, self.fetch_status, **self.poller_options)
+                self._pollers[job_id] = poller
+                poller.start()
+            return poller
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, poller in self._pollers.items()
+            if poller.finished_at is not None and now - poller.finished_at > self.retention
+        ]
+        for job_id in expired:
+            del self._pollers[job_id]
@@ -0,0 +1,217 @@
+# On-demand request profiling
+# Authorized requests are profiled and broken down by phase; without
+# PROFILING_ENABLED no hooks are installed and phase() is a constant no-op
+
+import io
+import os
+import sys
+import time
+import uuid
+import hmac
+import pstats
+import cProfile
+import logging
+import threading
+import contextlib
+from collections import Counter
+
+from flask import g, request, has_request_context
+
+log = logging.getLogger('munimap.profiling')
+
+PROFILE_HEADER = 'X-Munimap-Profile'
+PROFILE_PARAM = '_profile'
+MODES = ('sampling', 'cprofile')
+# Interval of the sampling profiler in seconds
+SAMPLE_INTERVAL = 0.001
+
+_enabled = False
+_NULL_PHASE = contextlib.nullcontext()
+# Only one cProfile profiler can be active per process (ValueError since Python 3.12)
+_cprofile_lock = threading.Lock()
+
+
+def phase(name):
+    """Context manager timing a phase of the current profiled request."""
+    if not _enabled:
+        return _NULL_PHASE
+    profile = g.get('profile') if has_request_context() else None
+    if profile is None:
+        return _NULL_PHASE
+    return profile.phase(name)
+
+
+class StackSampler:
+    """Samples the stack of one thread and counts folded stacks.
+
+    The folded format ("outer;inner count" per line) is read by
+    flamegraph.pl, speedscope and most other flame graph tools.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def output(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """Profiler and phase timings of one request."""
+
+    def __init__(self, mode):
+        if mode == 'cprofile' and not _cprofile_lock.acquire(blocking=False):
+            log.info("cProfile is busy with another request, sampling instead")
+            mode = 'sampling'
+        self.mode = mode
+        self.phases = {}
+        self.started = None
+        self.duration = None
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+        else:
+            self.profiler = StackSampler(threading.get_ident())
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop(self):
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+            _cprofile_lock.release()
+        else:
+            self.profiler.stop()
+        self.duration = time.perf_counter() - self.started
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - started
+
+    def server_timing(self):
+        """Phases as Server-Timing header value (milliseconds)."""
+        timings = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.phases.items()]
+        timings.append(f'total;dur={self.duration * 1000:.2f}')
+        return ', '.join(timings)
+
+    def write(self, directory, route):
+        """Write the profile and return the file path."""
+        os.makedirs(directory, exist_ok=True)
+        name = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'index'
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        if self.mode == 'cprofile':
+            path = os.path.join(directory, f'{stamp}-{name}-{uuid.uuid4().hex[:8]}.prof')
+            self.profiler.dump_stats(path)
+        else:
+            path = os.path.join(directory, f'{stamp}-{name}-{uuid.uuid4().hex[:8]}.folded')
+            with open(path, 'w') as f:
+                f.write(self.output())
+        return path
+
+    def output(self):
+        """Profile as text: folded stacks or the cProfile statistics."""
+        if self.mode == 'cprofile':
+            buffer = io.StringIO()
+            pstats.Stats(self.profiler, stream=buffer).sort_stats('cumulative').print_stats(50)
+            return buffer.getvalue()
+        return self.profiler.output()
+
+
+def _prune(directory, max_files):
+    """Remove the oldest profiles above max_files."""
+    try:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    except OSError:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:-max_files]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _authorized(token):
+    supplied = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    return bool(supplied) and hmac.compare_digest(supplied.encode('UTF-8'), token.encode('UTF-8'))
+
+
+def init_profiling(app):
+    """Install profiling hooks if PROFILING_ENABLED and a PROFILING_TOKEN are set.
+
+    Authorized requests pass the token in the X-Munimap-Profile header or
+    the _profile parameter. ``_profile_mode`` selects sampling or cprofile,
+    ``_profile_output=inline`` returns the profile instead of the response.
+    """
+    global _enabled
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    token = app.config.get('PROFILING_TOKEN')
+    if not token:
+        log.warning("Profiling enabled without PROFILING_TOKEN, not installing hooks")
+        return
+    _enabled = True
+
+    @app.before_request
+    def start_profile():
+        if not _authorized(token):
+            return
+        mode = request.args.get('_profile_mode', app.config['PROFILING_MODE'])
+        if mode not in MODES:
+            mode = 'sampling'
+        g.profile = RequestProfile(mode)
+        g.profile.start()
+
+    @app.teardown_request
+    def abort_profile(exc):
+        # Requests that failed before after_request still release the profiler
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.stop()
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profile.stop()
+
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if request.args.get('_profile_output') == 'inline':
+            response = app.response_class(profile.output(), mimetype='text/plain')
+        else:
+            directory = app.config['PROFILING_DIR']
+            path = profile.write(directory, route)
+            _prune(directory, app.config['PROFILING_MAX_FILES'])
+            response.headers['X-Profile'] = os.path.basename(path)
+            log.info(f"Profiled {request.path} in {profile.duration:.3f}s: {path}")
+        response.headers['Server-Timing'] = profile.server_timing()
+        return response
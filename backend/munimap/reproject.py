@@ -0,0 +1,246 @@
+# Vectorized coordinate reprojection
+# Converts coordinate arrays between EPSG:4326, EPSG:3857 and ETRS89 / UTM
+
+import math
+
+import numpy as np
+
+MAP_PROJECTION = 'EPSG:25832'
+
+# Output precision: 1 mm for projected and about 1 cm for geographic coordinates
+PROJECTED_DECIMALS = 3
+GEOGRAPHIC_DECIMALS = 7
+
+# Semi-major axis and flattening
+WGS84 = (6378137.0, 1 / 298.257223563)
+GRS80 = (6378137.0, 1 / 298.257222101)
+
+
+class UnsupportedProjectionError(Exception):
+    pass
+
+
+class Geographic:
+    """Longitude/latitude in degrees."""
+
+    geographic = True
+
+    def to_lonlat(self, x, y):
+        return x, y
+
+    def from_lonlat(self, lon, lat):
+        return lon, lat
+
+
+class WebMercator:
+    """Spherical Mercator as used by web maps."""
+
+    geographic = False
+    radius = 6378137.0
+    max_latitude = 85.0511287798066
+
+    def to_lonlat(self, x, y):
+        lon = np.degrees(x / self.radius)
+        lat = np.degrees(2 * np.arctan(np.exp(y / self.radius)) - math.pi / 2)
+        return lon, lat
+
+    def from_lonlat(self, lon, lat):
+        lat = np.clip(lat, -self.max_latitude, self.max_latitude)
+        x = self.radius * np.radians(lon)
+        y = self.radius * np.log(np.tan(math.pi / 4 + np.radians(lat) / 2))
+        return x, y
+
+
+class TransverseMercator:
+    """Ellipsoidal transverse Mercator using Krüger series of fourth order.
+
+    The series are accurate to well below a millimeter within a UTM zone
+    and stay accurate to centimeters several zones away from the central
+    meridian.
+    """
+
+    geographic = False
+
+    def __init__(self, central_meridian, ellipsoid=GRS80, scale=0.9996,
+                 false_easting=500000.0, false_northing=0.0):
+        self.central_meridian = central_meridian
+        self.scale = scale
+        self.false_easting = false_easting
+        self.false_northing = false_northing
+
+        a, f = ellipsoid
+        n = f / (2 - f)
+        self.n = n
+        self.radius = a / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+        self.alpha = (
+            n / 2 - 2 * n ** 2 / 3 + 5 * n ** 3 / 16 + 41 * n ** 4 / 180,
+            13 * n ** 2 / 48 - 3 * n ** 3 / 5 + 557 * n ** 4 / 1440,
+            61 * n ** 3 / 240 - 103 * n ** 4 / 140,
+            49561 * n ** 4 / 161280,
+        )
+        self.beta = (
+            n / 2 - 2 * n ** 2 / 3 + 37 * n ** 3 / 96 - n ** 4 / 360,
+            n ** 2 / 48 + n ** 3 / 15 - 437 * n ** 4 / 1440,
+            17 * n ** 3 / 480 - 37 * n ** 4 / 840,
+            4397 * n ** 4 / 161280,
+        )
+        self.delta = (
+            2 * n - 2 * n ** 2 / 3 - 2 * n ** 3 + 116 * n ** 4 / 45,
+            7 * n ** 2 / 3 - 8 * n ** 3 / 5 - 227 * n ** 4 / 45,
+            56 * n ** 3 / 15 - 136 * n ** 4 / 35,
+            4279 * n ** 4 / 630,
+        )
+
+    def from_lonlat(self, lon, lat):
+        phi = np.radians(lat)
+        lam = np.radians(lon - self.central_meridian)
+        e = 2 * math.sqrt(self.n) / (1 + self.n)
+
+        sin_phi = np.sin(phi)
+        t = np.sinh(np.arctanh(sin_phi) - e * np.arctanh(e * sin_phi))
+        xi_ = np.arctan2(t, np.cos(lam))
+        eta_ = np.arctanh(np.sin(lam) / np.sqrt(1 + t * t))
+
+        xi = xi_.copy()
+        eta = eta_.copy()
+        for j, alpha in enumerate(self.alpha, 1):
+            xi += alpha * np.sin(2 * j * xi_) * np.cosh(2 * j * eta_)
+            eta += alpha * np.cos(2 * j * xi_) * np.sinh(2 * j * eta_)
+
+        k = self.scale * self.radius
+        return self.false_easting + k * eta, self.false_northing + k * xi
+
+    def to_lonlat(self, x, y):
+        k = self.scale * self.radius
+        xi = (y - self.false_northing) / k
+        eta = (x - self.false_easting) / k
+
+        xi_ = xi.copy()
+        eta_ = eta.copy()
+        for j, beta in enumerate(self.beta, 1):
+            xi_ -= beta * np.sin(2 * j * xi) * np.cosh(2 * j * eta)
+            eta_ -= beta * np.cos(2 * j * xi) * np.sinh(2 * j * eta)
+
+        chi = np.arcsin(np.sin(xi_) / np.cosh(eta_))
+        phi = chi.copy()
+        for j, delta in enumerate(self.delta, 1):
+            phi += delta * np.sin(2 * j * chi)
+
+        lon = self.central_meridian + np.degrees(np.arctan2(np.sinh(eta_), np.cos(xi_)))
+        return lon, np.degrees(phi)
+
+
+# ETRS89 and WGS84 are treated as identical (differences are below a meter)
+PROJECTIONS = {
+    'EPSG:4326': Geographic(),
+    'EPSG:4258': Geographic(),
+    'EPSG:3857': WebMercator(),
+    'EPSG:25832': TransverseMercator(9),
+    'EPSG:25833': TransverseMercator(15),
+}
+
+
+def normalize_srs(srs):
+    """Return 'EPSG:<code>' for EPSG codes given as int or string."""
+    if isinstance(srs, int) or str(srs).isdigit():
+        return f'EPSG:{srs}'
+    return str(srs).upper()
+
+
+def get_projection(srs):
+    projection = PROJECTIONS.get(normalize_srs(srs))
+    if projection is None:
+        raise UnsupportedProjectionError(f'Unsupported projection {srs}')
+    return projection
+
+
+def is_supported(srs):
+    return normalize_srs(srs) in PROJECTIONS
+
+
+def is_geographic(srs):
+    return get_projection(srs).geographic
+
+
+def transform(xs, ys, source, target):
+    """Transform coordinate arrays from source to target projection."""
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    source_projection = get_projection(source)
+    target_projection = get_projection(target)
+    if source_projection is target_projection or not xs.size:
+        return xs, ys
+    lon, lat = source_projection.to_lonlat(xs, ys)
+    return target_projection.from_lonlat(lon, lat)
+
+
+def _is_position(coords):
+    return bool(coords) and isinstance(coords[0], (int, float))
+
+
+def _collect(coords, xs, ys):
+    if _is_position(coords):
+        xs.append(coords[0])
+        ys.append(coords[1])
+        return
+    for item in coords or []:
+        _collect(item, xs, ys)
+
+
+def _rebuild(coords, xs, ys, position):
+    if _is_position(coords):
+        i = position[0]
+        position[0] += 1
+        return [xs[i], ys[i], *coords[2:]]
+    return [_rebuild(item, xs, ys, position) for item in coords or []]
+
+
+def _collect_geometry(geometry, xs, ys):
+    if not geometry:
+        return
+    if geometry.get('type') == 'GeometryCollection':
+        for geom in geometry.get('geometries', []):
+            _collect_geometry(geom, xs, ys)
+        return
+    _collect(geometry.get('coordinates'), xs, ys)
+
+
+def _rebuild_geometry(geometry, xs, ys, position):
+    if not geometry:
+        return geometry
+    if geometry.get('type') == 'GeometryCollection':
+        return {
+            **geometry,
+            'geometries': [_rebuild_geometry(geom, xs, ys, position) for geom in geometry.get('geometries', [])]
+        }
+    return {**geometry, 'coordinates': _rebuild(geometry.get('coordinates'), xs, ys, position)}
+
+
+def transform_feature_collection(feature_collection, source, target):
+    """Return a copy of a FeatureCollection reprojected to target.
+
+    All coordinates of the collection are transformed in one batch.
+    """
+    if normalize_srs(source) == normalize_srs(target):
+        return feature_collection
+
+    features = feature_collection.get('features', [])
+    xs, ys = [], []
+    for feature in features:
+        _collect_geometry(feature.get('geometry'), xs, ys)
+
+    xs, ys = transform(xs, ys, source, target)
+    decimals = GEOGRAPHIC_DECIMALS if is_geographic(target) else PROJECTED_DECIMALS
+    xs = np.round(xs, decimals).tolist()
+    ys = np.round(ys, decimals).tolist()
+
+    position = [0]
+    result = {
+        **feature_collection,
+        'features': [
+            {**feature, 'geometry': _rebuild_geometry(feature.get('geometry'), xs, ys, position)}
+            for feature in features
+        ]
+    }
+    result.pop('crs', None)
+    return result
@@ -0,0 +1,254 @@
+# Shared SensorThings snapshots
+# Each source is polled once per refresh interval for all clients and workers
+
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+
+import requests
+
+from munimap.vector_pack import write_atomic
+
+log = logging.getLogger('munimap.sensorthings')
+
+# Lower bound for refreshInterval, protects upstream from misconfiguration
+MIN_REFRESH_INTERVAL = 5
+# Upper bound of followed @iot.nextLink pages per poll
+MAX_PAGES = 50
+# Number of removed entities remembered for delta responses
+MAX_REMOVED = 1000
+
+
+class SensorThingsError(Exception):
+    pass
+
+
+def source_key(source):
+    """Cache key of a SensorThings source; equal queries share one snapshot."""
+    params = source.get('urlParameters') or {}
+    encoded = json.dumps(
+        [source['url'], params.get('filter'), params.get('expand')]
+    ).encode('UTF-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def refresh_interval(source):
+    """Refresh interval of a source in seconds (configured in milliseconds)."""
+    interval = (source.get('refreshInterval') or 0) / 1000
+    return max(MIN_REFRESH_INTERVAL, interval)
+
+
+def _entity_digest(entity):
+    return hashlib.sha1(json.dumps(entity, sort_keys=True).encode('UTF-8')).hexdigest()
+
+
+def merge_snapshot(previous, entities, polled):
+    """Return a new snapshot from a previous one and freshly polled entities.
+
+    The version only increases if entities changed, so unchanged polls keep
+    ETags valid. Every entity remembers the version it last changed in.
+    """
+    previous = previous or {'version': 0, 'oldest': 0, 'entities': {}, 'removed': {}}
+    version = previous['version'] + 1
+    changed = False
+
+    result = {}
+    for entity in entities:
+        # JSON encoded, so ids keep their type in removed lists
+        entity_id = json.dumps(entity.get('@iot.id'))
+        digest = _entity_digest(entity)
+        old = previous['entities'].get(entity_id)
+        if old and old['digest'] == digest:
+            result[entity_id] = old
+        else:
+            result[entity_id] = {'version': version, 'digest': digest, 'entity': entity}
+            changed = True
+
+    removed = {
+        entity_id: removed_version
+        for entity_id, removed_version in previous['removed'].items()
+        if entity_id not in result
+    }
+    for entity_id in previous['entities']:
+        if entity_id not in result:
+            removed[entity_id] = version
+            changed = True
+
+    oldest = previous['oldest']
+    if len(removed) > MAX_REMOVED:
+        ordered = sorted(removed.items(), key=lambda item: item[1])
+        # Deltas since versions before the dropped removals are incomplete
+        oldest = max(oldest, ordered[-MAX_REMOVED - 1][1])
+        removed = dict(ordered[-MAX_REMOVED:])
+
+    return {
+        'version': version if changed else previous['version'],
+        'oldest': oldest,
+        'polled': polled,
+        'entities': result,
+        'removed': removed,
+    }
+
+
+def snapshot_response(snapshot, since=None):
+    """Full snapshot or, with since, only entities changed after that version.
+
+    The full snapshot has the shape of a SensorThings collection
+    (``{"value": [...]}``), so clients can use it like the upstream URL.
+    """
+    if since is None or since < snapshot['oldest'] or since > snapshot['version']:
+        return {
+            'value': [item['entity'] for item in snapshot['entities'].values()],
+        }
+    return {
+        'version': snapshot['version'],
+        'since': since,
+        'changed': [
+            item['entity'] for item in snapshot['entities'].values()
+            if item['version'] > since
+        ],
+        'removed': [
+            json.loads(entity_id) for entity_id, removed_version in snapshot['removed'].items()
+            if removed_version > since
+        ],
+    }
+
+
+class SensorThingsAggregator:
+    """Polls SensorThings sources and shares snapshots on disk.
+
+    Snapshots are written to directory, so all workers serve the same
+    versions. Sources passed to ``start`` are polled in the background once
+    per refresh interval, others on demand. A file lock per source makes
+    sure only one worker polls; stale snapshots are served while a
+    background refresh runs.
+    """
+
+    def __init__(self, directory, timeout=10):
+        self.directory = directory
+        self.timeout = timeout
+        self._snapshots = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _path(self, key, suffix='.json'):
+        return os.path.join(self.directory, f'{key}{suffix}')
+
+    def _load(self, key):
+        """Return the latest snapshot of a source, rereading changed files."""
+        path = self._path(key)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            cached = self._snapshots.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path) as f:
+            snapshot = json.load(f)
+        with self._lock:
+            self._snapshots[key] = (mtime, snapshot)
+        return snapshot
+
+    def snapshot(self, source):
+        """Return the snapshot of a source, polling upstream if needed."""
+        key = source_key(source)
+        snapshot = self._load(key)
+        if snapshot is None:
+            self._refresh(key, source)
+            snapshot = self._load(key)
+            if snapshot is None:
+                raise SensorThingsError('SensorThings service not available')
+        elif time.time() - snapshot['polled'] > refresh_interval(source):
+            self._refresh_async(key, source)
+        return snapshot
+
+    def start(self, sources):
+        """Start one background poller per distinct source.
+
+        Every worker runs the pollers, the file lock and the snapshot age
+        make sure each source is still polled once per interval.
+        """
+        for key, source in {source_key(source): source for source in sources}.items():
+            threading.Thread(
+                target=self._poll_forever, args=(key, source), name=f'sensorthings-poll-{key}', daemon=True
+            ).start()
+
+    def _poll_forever(self, key, source):
+        interval = refresh_interval(source)
+        while True:
+            delay = interval
+            try:
+                self._refresh(key, source)
+                snapshot = self._load(key)
+                if snapshot is not None:
+                    # Wake up when the snapshot gets stale, also if another worker polled it
+                    delay = max(1, snapshot['polled'] + interval - time.time())
+            except (OSError, ValueError) as e:
+                log.warning(f"Background poll of SensorThings source {source['url']} failed: {e}")
+            time.sleep(delay)
+
+    def _refresh_async(self, key, source):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._refresh(key, source)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f'sensorthings-{key}', daemon=True).start()
+
+    def _refresh(self, key, source):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(key, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another worker may have polled while we waited for the lock
+                previous = self._load(key)
+                if previous and time.time() - previous['polled'] <= refresh_interval(source):
+                    return
+                try:
+                    entities = self._poll(source)
+                except (requests.RequestException, ValueError) as e:
+                    log.warning(f"Polling SensorThings source {source['url']} failed: {e}")
+                    return
+                snapshot = merge_snapshot(previous, entities, time.time())
+                write_atomic(self._path(key), json.dumps(snapshot).encode('UTF-8'))
+                log.debug(f"Polled {len(entities)} entities from {source['url']}, version {snapshot['version']}")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _poll(self, source):
+        """Fetch all entities of a source, following @iot.nextLink."""
+        params = {}
+        url_parameters = source.get('urlParameters') or {}
+        if url_parameters.get('filter'):
+            params['$filter'] = url_parameters['filter']
+        if url_parameters.get('expand'):
+            params['$expand'] = url_parameters['expand']
+
+        entities = []
+        url = source['url']
+        for _ in range(MAX_PAGES):
+            response = requests.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            content = response.json()
+            entities.extend(content.get('value', []))
+            url = content.get('@iot.nextLink')
+            if not url:
+                break
+            # nextLink already contains the query
+            params = None
+        return entities
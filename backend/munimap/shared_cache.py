@@ -0,0 +1,281 @@
+# Shared cache tier
+# Byte values with metadata shared by all workers of a host, with LRU
+# eviction, a size limit and atomic publish
+
+import os
+import json
+import time
+import fcntl
+import struct
+import hashlib
+import logging
+import threading
+import contextlib
+from typing import NamedTuple
+from collections import OrderedDict
+
+from munimap import metrics
+from munimap.vector_pack import write_atomic
+
+log = logging.getLogger('munimap.shared_cache')
+
+# Seconds a miss waits for the load of another thread or worker before
+# loading itself, beyond the upstream request timeout
+LOCK_TIMEOUT = 35.0
+LOCK_POLL_INTERVAL = 0.01
+# Lock files unused for longer are removed on eviction
+LOCK_FILE_MAX_AGE = 600
+_HEADER = struct.Struct('<I')
+
+
+class CacheEntry(NamedTuple):
+    value: bytes
+    meta: dict
+
+
+def _namespace(key):
+    return key.split(':', 1)[0]
+
+
+class SharedCache:
+    """Base class implementing lookups with metrics and single-flight loads."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Single entries may use at most an eighth of the cache
+        self.max_entry_bytes = max_bytes // 8
+
+    def get(self, key):
+        """Return the CacheEntry of key or None if missing or expired."""
+        entry = self._get(key)
+        metrics.shared_cache_requests.inc((_namespace(key), 'hit' if entry else 'miss'))
+        return entry
+
+    def set(self, key, value, meta=None, ttl=None):
+        """Publish value for key, replacing any previous entry atomically."""
+        if len(value) > self.max_entry_bytes:
+            return
+        self._set(key, value, meta or {}, time.time() + (self.ttl if ttl is None else ttl))
+
+    def get_or_load(self, key, loader, ttl=None, guard=None):
+        """Return (entry, hit) for key, calling loader() on a miss.
+
+        loader returns a (value, meta) tuple, or None for results that
+        must not be cached. Concurrent misses of the same key, also in
+        other workers, wait for the first load instead of repeating it.
+        The lock is per key, misses of other keys never wait. Waiters
+        give up after LOCK_TIMEOUT and load themselves. On a miss the
+        context manager returned by guard() is entered before waiting for
+        the lock, so waiters are bounded like loads (admission control).
+        """
+        entry = self._get(key)
+        if entry is None:
+            with guard() if guard else contextlib.nullcontext(), self._lock(key):
+                entry = self._get(key)
+                if entry is None:
+                    metrics.shared_cache_requests.inc((_namespace(key), 'miss'))
+                    loaded = loader()
+                    if loaded is None:
+                        return None, False
+                    value, meta = loaded
+                    self.set(key, value, meta, ttl)
+                    return CacheEntry(value, meta), False
+        metrics.shared_cache_requests.inc((_namespace(key), 'hit'))
+        return entry, True
+
+
+class MemoryCache(SharedCache):
+    """In-process stand-in for the shared cache, for tests and single workers."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300):
+        super().__init__(max_bytes, ttl)
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock_obj = threading.Lock()
+        # Key -> [lock, number of threads using it]
+        self._key_locks = {}
+
+    def _get(self, key):
+        with self._lock_obj:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def _set(self, key, value, meta, expires):
+        with self._lock_obj:
+            self._remove(key)
+            self._entries[key] = (expires, CacheEntry(value, meta))
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.size -= len(item[1].value)
+
+    def delete(self, key):
+        with self._lock_obj:
+            self._remove(key)
+
+    @contextlib.contextmanager
+    def _lock(self, key):
+        with self._lock_obj:
+            item = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            item[1] += 1
+        locked = item[0].acquire(timeout=LOCK_TIMEOUT)
+        try:
+            yield
+        finally:
+            if locked:
+                item[0].release()
+            with self._lock_obj:
+                item[1] -= 1
+                if not item[1]:
+                    del self._key_locks[key]
+
+
+class FileCache(SharedCache):
+    """Shared cache with one file per entry below directory.
+
+    Entries are published with an atomic rename, so readers in other
+    workers see either the old or the new entry. Hits touch the file
+    mtime, eviction removes expired and least recently used files once
+    enough bytes were written. Put directory on a tmpfs like /dev/shm to
+    keep the cache in memory.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, ttl=300):
+        super().__init__(max_bytes, ttl)
+        self.directory = directory
+        self.lock_dir = os.path.join(directory, 'locks')
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._written = 0
+        self._written_lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('UTF-8')).hexdigest())
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        try:
+            length, = _HEADER.unpack_from(content)
+            header = json.loads(content[_HEADER.size:_HEADER.size + length])
+        except (struct.error, ValueError):
+            return None
+        if header['key'] != key:
+            return None
+        if header['expires'] < time.time():
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            return None
+        with contextlib.suppress(OSError):
+            # Mark as recently used for eviction
+            os.utime(path)
+        return CacheEntry(content[_HEADER.size + length:], header['meta'])
+
+    def _set(self, key, value, meta, expires):
+        header = json.dumps({'key': key, 'expires': expires, 'meta': meta}).encode('UTF-8')
+        try:
+            write_atomic(self._path(key), _HEADER.pack(len(header)) + header + value)
+        except OSError as e:
+            log.warning(f"Could not write cache entry {key}: {e}")
+            return
+        with self._written_lock:
+            self._written += len(value)
+            evict = self._written > self.max_bytes // 10
+            if evict:
+                self._written = 0
+        if evict:
+            self.evict()
+
+    def delete(self, key):
+        with contextlib.suppress(OSError):
+            os.unlink(self._path(key))
+
+    @contextlib.contextmanager
+    def _lock(self, key):
+        path = os.path.join(self.lock_dir, os.path.basename(self._path(key)))
+        with open(path, 'a') as lock_file:
+            # flock has no timeout, poll so waiters are bounded
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            locked = False
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        log.warning(f"Waited {LOCK_TIMEOUT}s for the load of {key}, loading it again")
+                        break
+                    time.sleep(LOCK_POLL_INTERVAL)
+            if locked:
+                with contextlib.suppress(OSError):
+                    # Mark as in use for the lock file cleanup
+                    os.utime(path)
+            try:
+                yield
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def evict(self):
+        """Remove least recently used entries until the cache is below 90% of max_bytes."""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if not item.is_file() or item.name.startswith('.'):
+                        continue
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        except OSError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+                removed += 1
+            total -= size
+        if removed:
+            log.info(f"Evicted {removed} shared cache entries")
+        self._remove_lock_files()
+
+    def _remove_lock_files(self):
+        """Remove lock files of keys that were not loaded for a while."""
+        now = time.time()
+        try:
+            with os.scandir(self.lock_dir) as it:
+                for item in it:
+                    with contextlib.suppress(OSError):
+                        if now - item.stat().st_mtime > LOCK_FILE_MAX_AGE:
+                            os.unlink(item.path)
+        except OSError:
+            pass
+
+
+def create_shared_cache(config):
+    """Return the shared cache configured by SHARED_CACHE_* app config values."""
+    if config['SHARED_CACHE_BACKEND'] == 'memory':
+        return MemoryCache(config['SHARED_CACHE_MAX_BYTES'], config['SHARED_CACHE_TTL'])
+    return FileCache(config['SHARED_CACHE_DIR'], config['SHARED_CACHE_MAX_BYTES'], config['SHARED_CACHE_TTL'])
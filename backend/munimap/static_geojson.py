@@ -0,0 +1,324 @@
+# Spatially indexed static GeoJSON layers
+# Files are converted once and served by bbox or tile with per-zoom simplification
+
+import os
+import re
+import gzip
+import json
+import math
+import fcntl
+import logging
+import threading
+import contextlib
+from collections import OrderedDict
+
+import brotli
+
+from munimap.geometry import compact_geometry, precision_decimals
+from munimap.reproject import normalize_srs, is_supported, is_geographic, transform_feature_collection
+from munimap.vector_pack import VectorPack, encode_pack, write_atomic
+
+log = logging.getLogger('munimap.static_geojson')
+
+# Target number of features per grid cell
+FEATURES_PER_CELL = 16
+# Features covering more cells are kept in a separate list
+MAX_CELLS_PER_FEATURE = 64
+METERS_PER_DEGREE = 111320
+SIMPLIFY_TOLERANCE_PX = 0.5
+# Simplified features kept per file, least recently used ones are dropped
+MAX_SIMPLIFIED_FEATURES = int(os.environ.get('STATIC_GEOJSON_MAX_SIMPLIFIED', 20000))
+
+
+def _walk_coords(coords):
+    """Iterate over all positions of a GeoJSON coordinate array."""
+    if coords and isinstance(coords[0], (int, float)):
+        yield coords
+        return
+    for item in coords or []:
+        yield from _walk_coords(item)
+
+
+def geometry_bbox(geometry):
+    """Bounding box of a GeoJSON geometry or None if it is empty."""
+    if not geometry:
+        return None
+    if geometry.get('type') == 'GeometryCollection':
+        boxes = [geometry_bbox(geom) for geom in geometry.get('geometries', [])]
+        boxes = [box for box in boxes if box]
+        if not boxes:
+            return None
+        return (
+            min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes),
+        )
+
+    minx = miny = math.inf
+    maxx = maxy = -math.inf
+    for coord in _walk_coords(geometry.get('coordinates')):
+        x, y = coord[0], coord[1]
+        if x < minx:
+            minx = x
+        if x > maxx:
+            maxx = x
+        if y < miny:
+            miny = y
+        if y > maxy:
+            maxy = y
+    if minx == math.inf:
+        return None
+    return minx, miny, maxx, maxy
+
+
+def _intersects(a, b):
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+class GeoJSONIndex:
+    """Uniform grid index over a sequence of GeoJSON features.
+
+    Only bounding boxes are kept in memory, features are read from the
+    sequence (e.g. a memory-mapped VectorPack) when requested.
+    """
+
+    def __init__(self, features, geographic=False):
+        self.geographic = geographic
+        self.features = features
+        self.positions = []
+        self.bboxes = []
+        for position in range(len(features)):
+            bbox = geometry_bbox(features[position].get('geometry'))
+            if bbox is None:
+                continue
+            self.positions.append(position)
+            self.bboxes.append(bbox)
+
+        self._simplified = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_grid()
+
+    def _build_grid(self):
+        if not self.bboxes:
+            self.extent = None
+            return
+
+        self.extent = (
+            min(b[0] for b in self.bboxes), min(b[1] for b in self.bboxes),
+            max(b[2] for b in self.bboxes), max(b[3] for b in self.bboxes),
+        )
+        cells_per_side = max(1, int(math.sqrt(len(self.bboxes) / FEATURES_PER_CELL)))
+        width = (self.extent[2] - self.extent[0]) or 1
+        height = (self.extent[3] - self.extent[1]) or 1
+        self.cell_width = width / cells_per_side
+        self.cell_height = height / cells_per_side
+        self.cells_per_side = cells_per_side
+
+        self.cells = {}
+        self.large = []
+        for index, bbox in enumerate(self.bboxes):
+            x0, y0, x1, y1 = self._cell_range(bbox)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_CELLS_PER_FEATURE:
+                self.large.append(index)
+                continue
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self.cells.setdefault((cx, cy), []).append(index)
+
+    def _cell_range(self, bbox):
+        last = self.cells_per_side - 1
+
+        def clamp(value):
+            return max(0, min(last, value))
+
+        return (
+            clamp(int((bbox[0] - self.extent[0]) / self.cell_width)),
+            clamp(int((bbox[1] - self.extent[1]) / self.cell_height)),
+            clamp(int((bbox[2] - self.extent[0]) / self.cell_width)),
+            clamp(int((bbox[3] - self.extent[1]) / self.cell_height)),
+        )
+
+    def query(self, bbox):
+        """Return indices of all features intersecting bbox in file order."""
+        if self.extent is None or not _intersects(bbox, self.extent):
+            return []
+
+        x0, y0, x1, y1 = self._cell_range(bbox)
+        candidates = set(self.large)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                candidates.update(self.cells.get((cx, cy), ()))
+        return sorted(index for index in candidates if _intersects(bbox, self.bboxes[index]))
+
+    def tolerance(self, resolution):
+        """Convert a resolution in meters per pixel to data units."""
+        tolerance = resolution * SIMPLIFY_TOLERANCE_PX
+        if self.geographic:
+            tolerance /= METERS_PER_DEGREE
+        return tolerance
+
+    def feature(self, index, resolution=None):
+        """Return a feature, simplified for the given resolution (meters per pixel).
+
+        Simplified geometries are cached per power-of-two resolution, so
+        every zoom level is computed only once while it is in use. At most
+        MAX_SIMPLIFIED_FEATURES are kept.
+        """
+        feature = self.features[self.positions[index]]
+        if not resolution:
+            return feature
+
+        level = math.floor(math.log2(resolution))
+        key = (index, level)
+        with self._lock:
+            simplified = self._simplified.get(key)
+            if simplified is not None:
+                self._simplified.move_to_end(key)
+                return simplified
+
+        tolerance = self.tolerance(2 ** level)
+        simplified = {
+            **feature,
+            'geometry': compact_geometry(
+                feature['geometry'], tolerance, precision_decimals(tolerance)),
+        }
+        with self._lock:
+            self._simplified[key] = simplified
+            while len(self._simplified) > MAX_SIMPLIFIED_FEATURES:
+                self._simplified.popitem(last=False)
+        return simplified
+
+    def feature_collection(self, bbox, resolution=None):
+        """Return a FeatureCollection of all features intersecting bbox."""
+        return {
+            'type': 'FeatureCollection',
+            'features': [self.feature(index, resolution) for index in self.query(bbox)],
+        }
+
+
+class StaticGeoJSONStore:
+    """Loads and indexes files of a directory once, reloading changed files.
+
+    Every file is converted into a VectorPack and precompressed gzip and
+    brotli variants in cache_dir. Workers sharing cache_dir memory-map the
+    same pack. Each file version is converted by one thread of one worker,
+    concurrent requests wait for it.
+    """
+
+    def __init__(self, directory, cache_dir):
+        self.directory = directory
+        self.cache_dir = cache_dir
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._conversion_locks = {}
+
+    def _source_path(self, filename):
+        path = os.path.realpath(os.path.join(self.directory, filename))
+        if not path.startswith(os.path.realpath(self.directory) + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def _cache_path(self, filename, version, suffix):
+        safe_name = filename.replace(os.sep, '__')
+        return os.path.join(self.cache_dir, f'{safe_name}-{version}{suffix}')
+
+    def get(self, filename, source='EPSG:4326', target=None):
+        """Return the index of a file or None if it does not exist.
+
+        With target the features are reprojected from source once, the
+        result is cached per target projection.
+        """
+        path = self._source_path(filename)
+        if path is None:
+            return None
+
+        source = normalize_srs(source)
+        target = normalize_srs(target or source)
+        stat = os.stat(path)
+        version = f"{stat.st_mtime_ns}-{stat.st_size}-{source.split(':')[-1]}-{target.split(':')[-1]}"
+        key = (filename, target)
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry and entry[0] == version:
+                return entry[1]
+
+        geographic = is_supported(target) and is_geographic(target)
+        pack_path = self._cache_path(filename, version, '.mvp')
+        if not os.path.exists(pack_path):
+            with self._conversion_lock(filename, version):
+                # Another thread or worker may have converted it meanwhile
+                if not os.path.exists(pack_path):
+                    self._convert(filename, path, version, source, target, geographic)
+        index = GeoJSONIndex(VectorPack(pack_path), geographic=geographic)
+        log.info(f"Indexed {len(index.bboxes)} features of {filename} in {target}")
+
+        with self._lock:
+            self._indexes[key] = (version, index)
+        return index
+
+    @contextlib.contextmanager
+    def _conversion_lock(self, filename, version):
+        """Serialize conversions of a file version across threads and workers."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        lock_path = self._cache_path(filename, version, '.lock')
+        with self._lock:
+            thread_lock = self._conversion_locks.setdefault(lock_path, threading.Lock())
+        with thread_lock, open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def warm(self, files):
+        """Convert (filename, source, target) in the background, so first requests find them done."""
+        def run():
+            for filename, source, target in files:
+                try:
+                    self.get(filename, source, target)
+                except (ValueError, OSError) as e:
+                    log.warning(f"Could not convert static GeoJSON {filename}: {e}")
+
+        if files:
+            threading.Thread(target=run, name='static-geojson-warm', daemon=True).start()
+
+    def _convert(self, filename, path, version, source, target, geographic):
+        """Write pack and precompressed variants of a file."""
+        with open(path, 'rb') as f:
+            raw = f.read()
+        content = json.loads(raw)
+        # Stable IDs let clients merge overlapping bbox/tile responses
+        for position, feature in enumerate(content.get('features', [])):
+            if feature.get('id') is None:
+                feature['id'] = position
+        if source != target:
+            content = transform_feature_collection(content, source, target)
+            raw = json.dumps(content, separators=(',', ':')).encode('UTF-8')
+
+        # The pack is written last, its existence marks a complete conversion
+        write_atomic(self._cache_path(filename, version, '.geojson.gz'), gzip.compress(raw, 9))
+        write_atomic(self._cache_path(filename, version, '.geojson.br'), brotli.compress(raw, quality=11))
+        write_atomic(self._cache_path(filename, version, '.mvp'), encode_pack(content, geographic))
+        self._remove_stale(filename, version)
+
+    def _remove_stale(self, filename, version):
+        """Remove variants of older file versions in any projection."""
+        safe_name = filename.replace(os.sep, '__')
+        file_version = version.rsplit('-', 2)[0]
+        pattern = re.compile(re.escape(safe_name) + r'-(\d+-\d+)-\d+-\d+\.(mvp|geojson\.gz|geojson\.br|lock)')
+        for name in os.listdir(self.cache_dir):
+            match = pattern.fullmatch(name)
+            if match and match.group(1) != file_version:
+                try:
+                    os.unlink(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def compressed_path(self, filename, target, encoding):
+        """Return the path of a precompressed variant ('gzip' or 'br')."""
+        with self._lock:
+            entry = self._indexes.get((filename, normalize_srs(target)))
+        if not entry:
+            return None
+        suffix = '.geojson.br' if encoding == 'br' else '.geojson.gz'
+        path = self._cache_path(filename, entry[0], suffix)
+        return path if os.path.exists(path) else None
@@ -0,0 +1,134 @@
+# WMTS/XYZ facade for proxied WMS layers
+# Maps tiles of the fixed map grid to deterministic upstream GetMaps, so
+# tiles can be cached by URL in browsers, nginx and CDNs
+
+import hashlib
+from xml.sax.saxutils import escape, quoteattr
+
+from munimap.reproject import MAP_PROJECTION, normalize_srs
+from munimap.tile_grid import TileGrid, GRID_EXTENTS
+
+FORMATS = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg'}
+EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpeg'}
+DEFAULT_LEVELS = 21
+TILES_URL = '/proxy/tiles'
+WMTS_URL = '/proxy/wmts'
+# Scale denominators of WMTS tile matrices assume 0.28 mm pixels
+PIXEL_SIZE = 0.00028
+
+
+class TileFacade:
+    """Tile grid and zoom levels the facade serves in the map projection."""
+
+    def __init__(self, extent=None, levels=DEFAULT_LEVELS):
+        self.grid = TileGrid(extent or GRID_EXTENTS[MAP_PROJECTION])
+        self.levels = levels
+
+    @classmethod
+    def from_map_config(cls, map_config):
+        """Facade matching map.projectionExtent and map.maxZoom of an app config."""
+        levels = map_config['maxZoom'] + 1 if map_config.get('maxZoom') is not None else DEFAULT_LEVELS
+        return cls(map_config.get('projectionExtent'), levels)
+
+    def valid_tile(self, z, x, y):
+        return z < self.levels and self.grid.valid_tile(z, x, y)
+
+    def getmap_params(self, layer, z, x, y, image_format):
+        """Upstream GetMap of a tile, identical for every request of the tile."""
+        source = layer.get('source', {})
+        if source.get('format', '').split(';')[0].strip() == image_format:
+            # Keep format options like "image/png; mode=8bit"
+            image_format = source['format']
+        params = {
+            'SERVICE': 'WMS',
+            'VERSION': '1.1.1',
+            'REQUEST': 'GetMap',
+            'LAYERS': ','.join(source.get('layers') or [layer['name']]),
+            'SRS': MAP_PROJECTION,
+            'BBOX': ','.join(f'{value:.6f}' for value in self.grid.tile_bbox(z, x, y)),
+            'WIDTH': str(self.grid.tile_size),
+            'HEIGHT': str(self.grid.tile_size),
+            'FORMAT': image_format,
+            'TRANSPARENT': 'FALSE' if source.get('transparent') is False else 'TRUE',
+        }
+        if source.get('styles'):
+            params['STYLES'] = ','.join(source['styles'])
+        return params
+
+    def anol_source(self, layer):
+        """Tile source properties advertised to the frontend for a layer."""
+        return {
+            'tileUrl': f"{TILES_URL}/{layer['name']}/{{z}}/{{x}}/{{y}}.{layer_extension(layer)}"
+                       f"?v={source_version(layer)}",
+            'tileExtent': self.grid.extent,
+            'tileLevels': self.levels,
+        }
+
+    def capabilities(self, layers, base_url):
+        """WMTS 1.0.0 capabilities with REST resource URLs of facade layers."""
+        extent = self.grid.extent
+        layer_xml = []
+        for layer in layers:
+            image_format = FORMATS[layer_extension(layer)]
+            template = f"{base_url}{WMTS_URL}/{layer['name']}/{{TileMatrixSet}}/{{TileMatrix}}/{{TileCol}}/{{TileRow}}"
+            layer_xml.append(
+                '<Layer>'
+                f"<ows:Title>{escape(layer.get('title', layer['name']))}</ows:Title>"
+                f"<ows:Identifier>{escape(layer['name'])}</ows:Identifier>"
+                '<Style isDefault="true"><ows:Identifier>default</ows:Identifier></Style>'
+                f'<Format>{image_format}</Format>'
+                f'<TileMatrixSetLink><TileMatrixSet>{MAP_PROJECTION}</TileMatrixSet></TileMatrixSetLink>'
+                f'<ResourceURL format="{image_format}" resourceType="tile" '
+                f'template={quoteattr(template + "." + layer_extension(layer))}/>'
+                '</Layer>'
+            )
+
+        matrices = []
+        for z in range(self.levels):
+            resolution = self.grid.resolution(z)
+            size = 2 ** z
+            matrix_height = min(size, int(-(-(extent[3] - extent[1]) // (resolution * self.grid.tile_size))))
+            matrices.append(
+                '<TileMatrix>'
+                f'<ows:Identifier>{z}</ows:Identifier>'
+                f'<ScaleDenominator>{resolution / PIXEL_SIZE}</ScaleDenominator>'
+                f'<TopLeftCorner>{extent[0]} {extent[3]}</TopLeftCorner>'
+                f'<TileWidth>{self.grid.tile_size}</TileWidth><TileHeight>{self.grid.tile_size}</TileHeight>'
+                f'<MatrixWidth>{size}</MatrixWidth><MatrixHeight>{matrix_height}</MatrixHeight>'
+                '</TileMatrix>'
+            )
+
+        srs_code = MAP_PROJECTION.split(':')[1]
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Capabilities xmlns="http://www.opengis.net/wmts/1.0" xmlns:ows="http://www.opengis.net/ows/1.1" '
+            'version="1.0.0">'
+            '<ows:ServiceIdentification><ows:ServiceType>OGC WMTS</ows:ServiceType>'
+            '<ows:ServiceTypeVersion>1.0.0</ows:ServiceTypeVersion></ows:ServiceIdentification>'
+            f"<Contents>{''.join(layer_xml)}"
+            f'<TileMatrixSet><ows:Identifier>{MAP_PROJECTION}</ows:Identifier>'
+            f'<ows:SupportedCRS>urn:ogc:def:crs:EPSG::{srs_code}</ows:SupportedCRS>'
+            f"{''.join(matrices)}</TileMatrixSet>"
+            '</Contents></Capabilities>'
+        )
+
+
+def is_facade_layer(layer):
+    """Proxied WMS layers in the map projection are served as tiles."""
+    return (
+        layer.get('type') in ('wms', 'tiledwms') and bool(layer.get('hash'))
+        and normalize_srs(layer.get('source', {}).get('srs') or MAP_PROJECTION) == MAP_PROJECTION
+    )
+
+
+def layer_extension(layer):
+    image_format = layer.get('source', {}).get('format') or ''
+    return EXTENSIONS.get(image_format.split(';')[0].strip(), 'png')
+
+
+def source_version(layer):
+    """Short hash of the source settings, changes the tile URLs when the layer changes."""
+    source = layer.get('source', {})
+    settings = [source.get('url'), source.get('layers'), source.get('styles'), source.get('format'),
+                source.get('transparent'), source.get('tilePack')]
+    return hashlib.sha1(repr(settings).encode('UTF-8')).hexdigest()[:8]
@@ -0,0 +1,57 @@
+# Fixed tile grids matching the frontend map view
+# Resolutions halve per zoom level starting with the grid width / tile size
+
+TILE_SIZE = 256
+
+# Default grid extents per projection
+GRID_EXTENTS = {
+    'EPSG:25832': [-46133.17, 5048875.26857567, 1206211.10142433, 6301219.54],
+    'EPSG:3857': [-20037508.342789244, -20037508.342789244, 20037508.342789244, 20037508.342789244],
+    'EPSG:4326': [-180.0, -90.0, 180.0, 90.0],
+}
+
+
+class TileGrid:
+    """Quadtree tile grid with the origin at the top left of the extent."""
+
+    def __init__(self, extent, tile_size=TILE_SIZE):
+        self.extent = list(extent)
+        self.tile_size = tile_size
+
+    @classmethod
+    def for_projection(cls, projection, extent=None):
+        """Return the grid of a projection or None if it is unknown."""
+        extent = extent or GRID_EXTENTS.get(projection)
+        return cls(extent) if extent else None
+
+    def resolution(self, z):
+        """Map units per pixel at zoom level z."""
+        return (self.extent[2] - self.extent[0]) / self.tile_size / (2 ** z)
+
+    def tile_bbox(self, z, x, y):
+        """Bounding box of a tile."""
+        span = self.resolution(z) * self.tile_size
+        minx = self.extent[0] + x * span
+        maxy = self.extent[3] - y * span
+        return [minx, maxy - span, minx + span, maxy]
+
+    def valid_tile(self, z, x, y):
+        """Check that a tile lies in the grid extent."""
+        if z < 0 or x < 0 or y < 0:
+            return False
+        span = self.resolution(z) * self.tile_size
+        return (
+            self.extent[0] + x * span < self.extent[2]
+            and self.extent[3] - y * span > self.extent[1]
+        )
+
+    def tiles_for_bbox(self, z, bbox):
+        """Iterate over (x, y) of all tiles intersecting bbox."""
+        span = self.resolution(z) * self.tile_size
+        min_x = max(0, int((bbox[0] - self.extent[0]) // span))
+        max_x = int((min(bbox[2], self.extent[2]) - self.extent[0]) // span)
+        min_y = max(0, int((self.extent[3] - bbox[3]) // span))
+        max_y = int((self.extent[3] - max(bbox[1], self.extent[1])) // span)
+        for y in range(min_y, max_y + 1):
+            for x in range(min_x, max_x + 1):
+                yield x, y
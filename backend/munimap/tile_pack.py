@@ -0,0 +1,341 @@
+# Prebuilt raster tile packs
+# MBTiles and GeoPackage files with tiles of the map grid, read through
+# pools of read-only SQLite connections
+
+import io
+import os
+import json
+import math
+import queue
+import sqlite3
+import logging
+import threading
+import contextlib
+
+from PIL import Image
+
+from munimap.tile_grid import TileGrid
+
+log = logging.getLogger('munimap.tile_pack')
+
+FORMATS = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg'}
+# Relative tolerance when matching request resolutions and tile origins
+TOLERANCE = 1e-6
+
+GPKG_APPLICATION_ID = 0x47504B47
+GPKG_USER_VERSION = 10300
+ETRS89_UTM32N_WKT = (
+    'PROJCS["ETRS89 / UTM zone 32N",GEOGCS["ETRS89",DATUM["European_Terrestrial_Reference_System_1989",'
+    'SPHEROID["GRS 1980",6378137,298.257222101]],PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]],'
+    'PROJECTION["Transverse_Mercator"],PARAMETER["latitude_of_origin",0],PARAMETER["central_meridian",9],'
+    'PARAMETER["scale_factor",0.9996],PARAMETER["false_easting",500000],PARAMETER["false_northing",0],'
+    'UNIT["metre",1],AUTHORITY["EPSG","25832"]]'
+)
+
+
+class TilePackError(Exception):
+    pass
+
+
+def pack_kind(path):
+    """Return 'gpkg' or 'mbtiles' by file extension."""
+    return 'gpkg' if path.lower().endswith('.gpkg') else 'mbtiles'
+
+
+class TilePack:
+    """Read-only access to the tiles of an MBTiles or GeoPackage file.
+
+    Tiles use the map TileGrid (top left origin, y down). MBTiles are
+    stored in TMS row order as the spec requires, and keep the grid
+    extent in the ``grid_extent`` metadata entry since the grid is not
+    the spherical mercator grid of the spec.
+    """
+
+    def __init__(self, path, pool_size=8):
+        self.path = path
+        self.kind = pack_kind(path)
+        self._pool = queue.LifoQueue()
+        self._pool_size = pool_size
+        self._created = 0
+        self._lock = threading.Lock()
+
+        with self.connection() as conn:
+            if self.kind == 'gpkg':
+                self._read_gpkg_metadata(conn)
+            else:
+                self._read_mbtiles_metadata(conn)
+        self.grid = TileGrid(self.extent, self.tile_size)
+
+    def _connect(self):
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+        conn.execute('PRAGMA query_only = 1')
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection of the pool, opening up to pool_size connections."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self._pool_size
+                if create:
+                    self._created += 1
+            conn = self._connect() if create else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _read_mbtiles_metadata(self, conn):
+        metadata = dict(conn.execute('SELECT name, value FROM metadata'))
+        if 'grid_extent' not in metadata:
+            raise TilePackError(f'{self.path} has no grid_extent metadata')
+        self.extent = json.loads(metadata['grid_extent'])
+        self.tile_size = int(metadata.get('tile_size', 256))
+        self.format = FORMATS.get(metadata.get('format', 'png'), 'image/png')
+        self.min_zoom = int(metadata['minzoom'])
+        self.max_zoom = int(metadata['maxzoom'])
+        self._query = 'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?'
+
+    def _read_gpkg_metadata(self, conn):
+        row = conn.execute(
+            "SELECT table_name FROM gpkg_contents WHERE data_type = 'tiles' LIMIT 1").fetchone()
+        if row is None:
+            raise TilePackError(f'{self.path} contains no tiles table')
+        table = row[0]
+        self.extent = list(conn.execute(
+            'SELECT min_x, min_y, max_x, max_y FROM gpkg_tile_matrix_set WHERE table_name = ?',
+            (table,)).fetchone())
+        self.min_zoom, self.max_zoom, self.tile_size = conn.execute(
+            'SELECT MIN(zoom_level), MAX(zoom_level), MAX(tile_width) FROM gpkg_tile_matrix WHERE table_name = ?',
+            (table,)).fetchone()
+        sample = conn.execute(f'SELECT tile_data FROM "{table}" LIMIT 1').fetchone()
+        self.format = 'image/jpeg' if sample and sample[0][:2] == b'\xff\xd8' else 'image/png'
+        self._query = (
+            f'SELECT tile_data FROM "{table}" WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?')
+
+    def get_tile(self, z, x, y):
+        """Return the encoded tile or None if the pack does not contain it."""
+        if not self.min_zoom <= z <= self.max_zoom:
+            return None
+        row = (2 ** z - 1 - y) if self.kind == 'mbtiles' else y
+        with self.connection() as conn:
+            result = conn.execute(self._query, (z, x, row)).fetchone()
+        return result[0] if result else None
+
+    def zoom_for_resolution(self, resolution):
+        """Return the pack zoom level with resolution or None."""
+        if resolution <= 0:
+            return None
+        z = round(math.log2(self.grid.resolution(0) / resolution))
+        if self.min_zoom <= z <= self.max_zoom and math.isclose(
+                self.grid.resolution(z), resolution, rel_tol=TOLERANCE * 100):
+            return z
+        return None
+
+    def match_tile(self, bbox, width, height):
+        """Return (z, x, y) if bbox and size are exactly one tile of the pack."""
+        if width != self.tile_size or height != self.tile_size:
+            return None
+        z = self.zoom_for_resolution((bbox[2] - bbox[0]) / width)
+        if z is None:
+            return None
+        span = self.grid.resolution(z) * self.tile_size
+        x = round((bbox[0] - self.extent[0]) / span)
+        y = round((self.extent[3] - bbox[3]) / span)
+        tile_bbox = self.grid.tile_bbox(z, x, y)
+        if all(math.isclose(a, b, rel_tol=TOLERANCE, abs_tol=span * TOLERANCE) for a, b in zip(bbox, tile_bbox)):
+            return z, x, y
+        return None
+
+    def render(self, bbox, width, height, image_format):
+        """Compose an image of bbox from the tiles of the matching zoom level.
+
+        Returns None if the resolution is no pack zoom level or a tile is
+        missing, so callers can fall back to the upstream service.
+        """
+        resolution = (bbox[2] - bbox[0]) / width
+        z = self.zoom_for_resolution(resolution)
+        if z is None or not math.isclose((bbox[3] - bbox[1]) / height, resolution, rel_tol=TOLERANCE * 100):
+            return None
+
+        resolution = self.grid.resolution(z)
+        result = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        for x, y in self.grid.tiles_for_bbox(z, bbox):
+            tile_bbox = self.grid.tile_bbox(z, x, y)
+            offset = (
+                round((tile_bbox[0] - bbox[0]) / resolution),
+                round((bbox[3] - tile_bbox[3]) / resolution),
+            )
+            # Tiles only touching the right or bottom edge
+            if offset[0] >= width or offset[1] >= height:
+                continue
+            data = self.get_tile(z, x, y)
+            if data is None:
+                return None
+            result.paste(Image.open(io.BytesIO(data)).convert('RGBA'), offset)
+
+        buffer = io.BytesIO()
+        if image_format == 'image/jpeg':
+            result.convert('RGB').save(buffer, format='JPEG', quality=90)
+        else:
+            result.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+
+class TilePackStore:
+    """Opens tile packs of a directory once and reopens them after rebuilds."""
+
+    def __init__(self, directory, pool_size=8):
+        self.directory = directory
+        self.pool_size = pool_size
+        self._packs = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        """Return the TilePack of filename or None if it does not exist."""
+        path = os.path.realpath(os.path.join(self.directory, filename))
+        if not path.startswith(os.path.realpath(self.directory) + os.sep):
+            return None
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._packs.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            try:
+                pack = TilePack(path, self.pool_size)
+            except (sqlite3.Error, TilePackError, KeyError, ValueError) as e:
+                log.error(f"Could not open tile pack {filename}: {e}")
+                return None
+            if cached:
+                cached[1].close()
+            self._packs[path] = (mtime, pack)
+            log.info(f"Opened tile pack {filename} (zoom {pack.min_zoom}-{pack.max_zoom})")
+            return pack
+
+
+class TilePackWriter:
+    """Writes tiles of the map grid into a new MBTiles or GeoPackage file."""
+
+    def __init__(self, path, name, extent, image_format='image/png', tile_size=256, srs='EPSG:25832', kind=None):
+        self.path = path
+        self.kind = kind or pack_kind(path)
+        self.name = name
+        self.extent = list(extent)
+        self.format = image_format
+        self.tile_size = tile_size
+        self.srs = srs
+        self.conn = sqlite3.connect(path)
+        if self.kind == 'gpkg':
+            self._create_gpkg()
+        else:
+            self._create_mbtiles()
+
+    def _create_mbtiles(self):
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS tiles (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+                PRIMARY KEY (zoom_level, tile_column, tile_row));
+        ''')
+
+    def _create_gpkg(self):
+        self.conn.execute(f'PRAGMA application_id = {GPKG_APPLICATION_ID}')
+        self.conn.execute(f'PRAGMA user_version = {GPKG_USER_VERSION}')
+        self.conn.executescript(f'''
+            CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (
+                srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL,
+                organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT);
+            CREATE TABLE IF NOT EXISTS gpkg_contents (
+                table_name TEXT PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+                description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+                min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER);
+            CREATE TABLE IF NOT EXISTS gpkg_tile_matrix_set (
+                table_name TEXT PRIMARY KEY, srs_id INTEGER NOT NULL,
+                min_x DOUBLE NOT NULL, min_y DOUBLE NOT NULL, max_x DOUBLE NOT NULL, max_y DOUBLE NOT NULL);
+            CREATE TABLE IF NOT EXISTS gpkg_tile_matrix (
+                table_name TEXT NOT NULL, zoom_level INTEGER NOT NULL, matrix_width INTEGER NOT NULL,
+                matrix_height INTEGER NOT NULL, tile_width INTEGER NOT NULL, tile_height INTEGER NOT NULL,
+                pixel_x_size DOUBLE NOT NULL, pixel_y_size DOUBLE NOT NULL,
+                PRIMARY KEY (table_name, zoom_level));
+            CREATE TABLE IF NOT EXISTS "{self.name}" (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, zoom_level INTEGER NOT NULL, tile_column INTEGER NOT NULL,
+                tile_row INTEGER NOT NULL, tile_data BLOB NOT NULL, UNIQUE (zoom_level, tile_column, tile_row));
+        ''')
+        code = int(self.srs.split(':')[1])
+        self.conn.executemany('INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)', [
+            ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', None),
+            ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', None),
+            (self.srs, code, 'EPSG', code, ETRS89_UTM32N_WKT if code == 25832 else 'undefined', None),
+        ])
+        self.conn.execute(
+            'INSERT OR REPLACE INTO gpkg_tile_matrix_set VALUES (?, ?, ?, ?, ?, ?)',
+            (self.name, code, *self.extent))
+
+    def has_tile(self, z, x, y):
+        if self.kind == 'gpkg':
+            query, row = f'SELECT 1 FROM "{self.name}" WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?', y
+        else:
+            query, row = 'SELECT 1 FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?', 2 ** z - 1 - y
+        return self.conn.execute(query, (z, x, row)).fetchone() is not None
+
+    def add_tile(self, z, x, y, data):
+        if self.kind == 'gpkg':
+            self.conn.execute(
+                f'INSERT OR REPLACE INTO "{self.name}" (zoom_level, tile_column, tile_row, tile_data) '
+                'VALUES (?, ?, ?, ?)', (z, x, y, data))
+        else:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)', (z, x, 2 ** z - 1 - y, data))
+
+    def finish(self, zooms, bounds, lonlat_bounds):
+        """Write metadata for the zoom levels and bounds and close the file."""
+        grid = TileGrid(self.extent, self.tile_size)
+        if self.kind == 'gpkg':
+            code = int(self.srs.split(':')[1])
+            for z in zooms:
+                resolution = grid.resolution(z)
+                self.conn.execute('INSERT OR REPLACE INTO gpkg_tile_matrix VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (
+                    self.name, z, 2 ** z, 2 ** z, self.tile_size, self.tile_size, resolution, resolution))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO gpkg_contents (table_name, data_type, identifier, min_x, min_y, max_x, max_y, srs_id) "
+                "VALUES (?, 'tiles', ?, ?, ?, ?, ?, ?)", (self.name, self.name, *bounds, code))
+        else:
+            extension = 'jpg' if self.format == 'image/jpeg' else 'png'
+            metadata = {
+                'name': self.name,
+                'format': extension,
+                'type': 'baselayer',
+                'bounds': ','.join(f'{value:.6f}' for value in lonlat_bounds),
+                'minzoom': str(min(zooms)),
+                'maxzoom': str(max(zooms)),
+                'srs': self.srs,
+                'grid_extent': json.dumps(self.extent),
+                'tile_size': str(self.tile_size),
+            }
+            self.conn.executemany('INSERT OR REPLACE INTO metadata VALUES (?, ?)', metadata.items())
+        self.conn.commit()
+        self.conn.close()
+
+
+def pack_sources(layers):
+    """Map (proxy hash, LAYERS parameter) to the tile pack file of layers with source.tilePack."""
+    sources = {}
+    for layer in layers.values():
+        source = layer.get('source') or {}
+        if layer.get('type') in ('wms', 'tiledwms') and source.get('tilePack') and layer.get('hash'):
+            wms_layers = ','.join(source.get('layers') or [layer['name']])
+            sources[(layer['hash'], wms_layers)] = source['tilePack']
+    return sources
@@ -0,0 +1,282 @@
+# Compact binary representation of static vector layers
+#
+# Layout (little-endian):
+#   header      HEADER struct, see below
+#   dictionary  UTF-8 JSON {"keys": [...], "values": [...]}
+#   records     one record per feature, varint encoded
+#   index       uint64 offset of every record plus the end of the records,
+#               aligned to 8 bytes
+#
+# Record: id value ref (0 = none, else value index + 1), property count,
+# (key index, value index) pairs, geometry. Geometries start with a type
+# code followed by part counts and zigzag varint deltas of quantized x/y.
+
+import io
+import os
+import sys
+import json
+import math
+import mmap
+import struct
+import logging
+import tempfile
+from array import array
+
+log = logging.getLogger('munimap.vector_pack')
+
+MAGIC = b'MVP1'
+VERSION = 1
+# magic, version, flags, feature count, dictionary length, index offset,
+# origin x, origin y, quantization step
+HEADER = struct.Struct('<4sHHIIQddd')
+
+GEOMETRY_TYPES = [
+    None, 'Point', 'LineString', 'Polygon',
+    'MultiPoint', 'MultiLineString', 'MultiPolygon', 'GeometryCollection',
+]
+GEOMETRY_CODES = {name: code for code, name in enumerate(GEOMETRY_TYPES) if name}
+# Nesting depth of coordinate arrays below the part list
+COORD_DEPTH = {
+    'Point': 0, 'LineString': 1, 'MultiPoint': 1,
+    'Polygon': 2, 'MultiLineString': 2, 'MultiPolygon': 3,
+}
+
+# Quantization steps: 1 mm for projected and about 1 cm for geographic data
+PROJECTED_STEP = 0.001
+GEOGRAPHIC_STEP = 1e-7
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+class _Encoder:
+    def __init__(self, origin, step):
+        self.origin = origin
+        self.step = step
+        self.keys = {}
+        self.values = {}
+
+    def key(self, name):
+        return self.keys.setdefault(name, len(self.keys))
+
+    def value(self, value):
+        encoded = json.dumps(value, sort_keys=True, separators=(',', ':'))
+        return self.values.setdefault(encoded, len(self.values))
+
+    def coords(self, out, coords, depth, last):
+        if depth == 0:
+            x = round((coords[0] - self.origin[0]) / self.step)
+            y = round((coords[1] - self.origin[1]) / self.step)
+            _write_varint(out, _zigzag(x - last[0]))
+            _write_varint(out, _zigzag(y - last[1]))
+            last[0], last[1] = x, y
+            return
+        _write_varint(out, len(coords))
+        for item in coords:
+            self.coords(out, item, depth - 1, last)
+
+    def geometry(self, out, geometry):
+        if not geometry:
+            _write_varint(out, 0)
+            return
+        gtype = geometry['type']
+        _write_varint(out, GEOMETRY_CODES[gtype])
+        if gtype == 'GeometryCollection':
+            _write_varint(out, len(geometry['geometries']))
+            for geom in geometry['geometries']:
+                self.geometry(out, geom)
+            return
+        self.coords(out, geometry['coordinates'], COORD_DEPTH[gtype], [0, 0])
+
+    def feature(self, feature):
+        out = bytearray()
+        feature_id = feature.get('id')
+        _write_varint(out, 0 if feature_id is None else self.value(feature_id) + 1)
+        properties = feature.get('properties') or {}
+        _write_varint(out, len(properties))
+        for key, value in properties.items():
+            _write_varint(out, self.key(key))
+            _write_varint(out, self.value(value))
+        self.geometry(out, feature.get('geometry'))
+        return out
+
+
+def _extent_origin(features):
+    minx = miny = None
+    for feature in features:
+        stack = [(feature.get('geometry') or {}).get('coordinates')]
+        for geom in (feature.get('geometry') or {}).get('geometries', []):
+            stack.append(geom.get('coordinates'))
+        while stack:
+            coords = stack.pop()
+            if not coords:
+                continue
+            if isinstance(coords[0], (int, float)):
+                minx = coords[0] if minx is None else min(minx, coords[0])
+                miny = coords[1] if miny is None else min(miny, coords[1])
+            else:
+                stack.extend(coords)
+    return (minx or 0.0, miny or 0.0)
+
+
+def encode_pack(feature_collection, geographic=False):
+    """Encode a GeoJSON FeatureCollection into the pack format."""
+    features = feature_collection.get('features', [])
+    step = GEOGRAPHIC_STEP if geographic else PROJECTED_STEP
+    encoder = _Encoder(_extent_origin(features), step)
+
+    records = io.BytesIO()
+    offsets = array('Q')
+    for feature in features:
+        offsets.append(records.tell())
+        records.write(encoder.feature(feature))
+    offsets.append(records.tell())
+
+    dictionary = json.dumps({
+        'keys': list(encoder.keys),
+        'values': [json.loads(value) for value in encoder.values],
+    }, separators=(',', ':')).encode('UTF-8')
+
+    records_end = HEADER.size + len(dictionary) + records.tell()
+    padding = -records_end % 8
+    header = HEADER.pack(
+        MAGIC, VERSION, 1 if geographic else 0, len(features), len(dictionary),
+        records_end + padding, encoder.origin[0], encoder.origin[1], step)
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    return header + dictionary + records.getvalue() + b'\0' * padding + offsets.tobytes()
+
+
+class _Reader:
+    def __init__(self, buffer, position):
+        self.buffer = buffer
+        self.position = position
+
+    def varint(self):
+        result = 0
+        shift = 0
+        buffer = self.buffer
+        while True:
+            byte = buffer[self.position]
+            self.position += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+
+class VectorPack:
+    """Memory-mapped pack file, indexable like a list of GeoJSON features."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, flags, self.count, dict_length, index_offset,
+         origin_x, origin_y, self.step) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a vector pack')
+        self.geographic = bool(flags & 1)
+        self.origin = (origin_x, origin_y)
+        # Round decoded coordinates to the quantization step
+        self.decimals = max(0, math.ceil(-math.log10(self.step)))
+
+        self.records_offset = HEADER.size + dict_length
+        dictionary = json.loads(self._mmap[HEADER.size:self.records_offset])
+        self.keys = dictionary['keys']
+        self.values = dictionary['values']
+        self.dictionary_bytes = self._mmap[HEADER.size:self.records_offset]
+
+        index_end = index_offset + 8 * (self.count + 1)
+        if sys.byteorder == 'little':
+            self.offsets = memoryview(self._mmap)[index_offset:index_end].cast('Q')
+        else:
+            self.offsets = array('Q', self._mmap[index_offset:index_end])
+            self.offsets.byteswap()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0 or index >= self.count:
+            raise IndexError(index)
+        reader = _Reader(self._mmap, self.records_offset + self.offsets[index])
+        feature = {'type': 'Feature'}
+        id_ref = reader.varint()
+        if id_ref:
+            feature['id'] = self.values[id_ref - 1]
+        properties = {}
+        for _ in range(reader.varint()):
+            key = self.keys[reader.varint()]
+            properties[key] = self.values[reader.varint()]
+        feature['properties'] = properties
+        feature['geometry'] = self._geometry(reader)
+        return feature
+
+    def _coords(self, reader, depth, last):
+        if depth == 0:
+            last[0] += _unzigzag(reader.varint())
+            last[1] += _unzigzag(reader.varint())
+            return [
+                round(self.origin[0] + last[0] * self.step, self.decimals),
+                round(self.origin[1] + last[1] * self.step, self.decimals),
+            ]
+        return [self._coords(reader, depth - 1, last) for _ in range(reader.varint())]
+
+    def _geometry(self, reader):
+        gtype = GEOMETRY_TYPES[reader.varint()]
+        if gtype is None:
+            return None
+        if gtype == 'GeometryCollection':
+            return {
+                'type': gtype,
+                'geometries': [self._geometry(reader) for _ in range(reader.varint())],
+            }
+        return {'type': gtype, 'coordinates': self._coords(reader, COORD_DEPTH[gtype], [0, 0])}
+
+    def stream(self, start=0, count=None, batch_size=1000):
+        """Yield a self-contained pack of a feature range in batches.
+
+        The streamed pack has no offset index, clients decode the records
+        sequentially.
+        """
+        start = max(0, min(start, self.count))
+        end = self.count if count is None else min(self.count, start + max(0, count))
+        yield HEADER.pack(
+            MAGIC, VERSION, 1 if self.geographic else 0, end - start,
+            len(self.dictionary_bytes), 0, self.origin[0], self.origin[1], self.step)
+        yield self.dictionary_bytes
+        for batch_start in range(start, end, batch_size):
+            batch_end = min(end, batch_start + batch_size)
+            yield self._mmap[
+                self.records_offset + self.offsets[batch_start]:
+                self.records_offset + self.offsets[batch_end]
+            ]
+
+
+def write_atomic(path, content):
+    """Write a file atomically so concurrent workers never read partial files."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,98 @@
+# Composite GetMap of stacked overlays from one upstream WMS
+# Merges the layers into as few upstream GetMaps as possible and
+# composites layers with their own opacity in the proxy.
+#
+# The COMPOSITE param lists the stacked overlays bottom to top as
+# "<count>:<opacity>", where count is the number of LAYERS names the
+# overlay contributes: LAYERS=a,b,c&COMPOSITE=2:1,1:0.5 draws a and b
+# opaque in one GetMap and c with 50% opacity on top.
+
+import io
+
+from PIL import Image
+
+COMPOSITE_PARAM = 'COMPOSITE'
+
+
+class CompositeError(ValueError):
+    """Raised for malformed composite requests."""
+
+
+def parse_members(layers, composite):
+    """Split the LAYERS list into (names, opacity) per overlay, bottom to top."""
+    names = [name for name in layers.split(',') if name]
+    if not names:
+        raise CompositeError('No layers requested')
+    if not composite:
+        return [(names, 1.0)]
+
+    members = []
+    start = 0
+    for entry in composite.split(','):
+        count, _, opacity = entry.partition(':')
+        try:
+            count = int(count)
+            opacity = float(opacity) if opacity else 1.0
+        except ValueError:
+            raise CompositeError(f'Invalid composite entry {entry!r}')
+        if count < 1 or not 0 <= opacity <= 1:
+            raise CompositeError(f'Invalid composite entry {entry!r}')
+        members.append((names[start:start + count], opacity))
+        start += count
+    if start != len(names) or any(len(member_names) == 0 for member_names, _ in members):
+        raise CompositeError('Composite counts do not match LAYERS')
+    return members
+
+
+def plan_getmaps(params):
+    """Return the upstream GetMap params with their opacity, bottom to top.
+
+    Adjacent opaque overlays are drawn by the upstream in LAYERS order,
+    so each run of them becomes one GetMap. Overlays with an opacity
+    below 1 are requested on their own and faded before compositing.
+    """
+    upper = {key.upper(): value for key, value in params.items()}
+    members = parse_members(upper.get('LAYERS', ''), upper.pop(COMPOSITE_PARAM, ''))
+    layer_count = sum(len(names) for names, _ in members)
+    styles = upper.get('STYLES', '').split(',') if upper.get('STYLES') else []
+    if styles and len(styles) != layer_count:
+        raise CompositeError('STYLES do not match LAYERS')
+
+    runs = []
+    offset = 0
+    for names, opacity in members:
+        member_styles = styles[offset:offset + len(names)]
+        offset += len(names)
+        if opacity <= 0:
+            continue
+        if opacity == 1 and runs and runs[-1][2] == 1:
+            runs[-1][0].extend(names)
+            runs[-1][1].extend(member_styles)
+        else:
+            runs.append((list(names), list(member_styles), opacity))
+
+    getmaps = []
+    for names, run_styles, opacity in runs:
+        run_params = dict(upper, LAYERS=','.join(names))
+        if styles:
+            run_params['STYLES'] = ','.join(run_styles)
+        if len(runs) > 1:
+            # Partial images are composited, so they must keep transparency
+            run_params.update(FORMAT='image/png', TRANSPARENT='TRUE')
+        getmaps.append((run_params, opacity))
+    return getmaps
+
+
+def composite_images(images, size):
+    """Alpha-composite (content, opacity) images bottom to top into a PNG."""
+    result = Image.new('RGBA', size, (0, 0, 0, 0))
+    for content, opacity in images:
+        image = Image.open(io.BytesIO(content)).convert('RGBA')
+        if image.size != size:
+            image = image.resize(size)
+        if opacity < 1:
+            image.putalpha(image.getchannel('A').point(lambda value: int(value * opacity)))
+        result.alpha_composite(image)
+    buffer = io.BytesIO()
+    result.save(buffer, format='PNG')
+    return buffer.getvalue()
@@ -0,0 +1,161 @@
+# Tests of the proxy admission control
+
+import time
+import threading
+
+import pytest
+
+from munimap.admission import AdmissionController, AdmissionRejected
+
+
+def _wait_queued(controller, count):
+    deadline = time.monotonic() + 5
+    while controller.stats()['queued'] != count:
+        assert time.monotonic() < deadline, 'requests were not queued'
+        time.sleep(0.005)
+
+
+def _acquire_later(controller, client, results, sheddable=True):
+    """Acquire in a thread, appending client or the rejection reason to results."""
+    def run():
+        try:
+            controller.acquire(client, sheddable)
+            results.append(client)
+        except AdmissionRejected as e:
+            results.append(e.reason)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_admits_below_limits():
+    controller = AdmissionController(max_in_flight=2, max_per_client=2)
+    controller.acquire('a')
+    controller.acquire('b')
+    assert controller.stats()['inFlight'] == 2
+    assert controller.stats()['clients'] == 2
+    controller.release('a')
+    controller.release('b')
+    assert controller.stats()['inFlight'] == 0
+    assert controller.stats()['clients'] == 0
+
+
+def test_queued_request_runs_after_release():
+    controller = AdmissionController(max_in_flight=1, max_queued=2)
+    controller.acquire('a')
+    results = []
+    thread = _acquire_later(controller, 'b', results)
+    _wait_queued(controller, 1)
+    assert results == []
+
+    controller.release('a')
+    thread.join(5)
+    assert results == ['b']
+    assert controller.stats() == {
+        'inFlight': 1, 'queued': 0, 'clients': 1, 'maxInFlight': 1, 'maxPerClient': 4, 'maxQueued': 2,
+    }
+
+
+def test_per_client_limit_queues():
+    controller = AdmissionController(max_in_flight=4, max_per_client=1)
+    controller.acquire('a')
+    results = []
+    thread = _acquire_later(controller, 'a', results)
+    _wait_queued(controller, 1)
+    # Other clients still get free slots
+    controller.acquire('b')
+    controller.release('a')
+    thread.join(5)
+    assert results == ['a']
+
+
+def test_rejects_when_queue_full_and_nothing_sheddable():
+    controller = AdmissionController(max_in_flight=1, max_queued=1)
+    controller.acquire('a')
+    results = []
+    thread = _acquire_later(controller, 'b', results, sheddable=False)
+    _wait_queued(controller, 1)
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire('c', sheddable=False)
+    assert excinfo.value.reason == 'queue full'
+    assert excinfo.value.retry_after >= 1
+
+    controller.release('a')
+    thread.join(5)
+    assert results == ['b']
+
+
+def test_sheds_oldest_sheddable_waiter():
+    controller = AdmissionController(max_in_flight=1, max_queued=2)
+    controller.acquire('a')
+    results = []
+    first = _acquire_later(controller, 'b', results)
+    _wait_queued(controller, 1)
+    second = _acquire_later(controller, 'c', results)
+    _wait_queued(controller, 2)
+
+    late = _acquire_later(controller, 'd', results)
+    first.join(5)
+    assert results == ['shed']
+    _wait_queued(controller, 2)
+
+    controller.release('a')
+    second.join(5)
+    assert results == ['shed', 'c']
+    controller.release('c')
+    late.join(5)
+    assert results == ['shed', 'c', 'd']
+
+
+def test_times_out_waiting():
+    controller = AdmissionController(max_in_flight=1, queue_timeout=0.05)
+    controller.acquire('a')
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire('b')
+    assert excinfo.value.reason == 'timeout'
+    assert controller.stats()['queued'] == 0
+
+
+def test_free_slot_goes_to_client_with_fewest_in_flight():
+    controller = AdmissionController(max_in_flight=3, max_per_client=3, max_queued=4)
+    controller.acquire('busy')
+    controller.acquire('busy')
+    controller.acquire('idle')
+    results = []
+    busy = _acquire_later(controller, 'busy', results)
+    _wait_queued(controller, 1)
+    controller.release('idle')
+    busy.join(5)
+    assert results == ['busy']
+
+    # 'busy' now holds all three slots, 'idle' queued later is still served first
+    more_busy = _acquire_later(controller, 'busy', results)
+    _wait_queued(controller, 1)
+    idle = _acquire_later(controller, 'idle', results)
+    _wait_queued(controller, 2)
+    controller.release('busy')
+    idle.join(5)
+    assert results == ['busy', 'idle']
+
+    controller.release('busy')
+    more_busy.join(5)
+    assert results == ['busy', 'idle', 'busy']
+
+
+def test_admit_releases_on_error():
+    controller = AdmissionController(max_in_flight=1)
+    with pytest.raises(RuntimeError):
+        with controller.admit('a'):
+            raise RuntimeError()
+    assert controller.stats()['inFlight'] == 0
+
+
+def test_busy():
+    controller = AdmissionController(max_in_flight=4)
+    assert not controller.busy()
+    controller.acquire('a')
+    assert not controller.busy()
+    controller.acquire('b')
+    assert controller.busy()
+    assert not controller.busy(share=1)
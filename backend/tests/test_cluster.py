@@ -0,0 +1,87 @@
+# Tests of the cluster ring ownership
+
+from collections import Counter
+
+import pytest
+import requests
+
+from munimap.cluster import Cluster, HashRing, normalize_node
+
+NODES = ['http://node-a:8080', 'http://node-b:8080', 'http://node-c:8080']
+KEYS = [f'wms:layer:{i}' for i in range(1000)]
+
+
+def _owner(ring, key):
+    return next(ring.owners(key))
+
+
+def test_normalize_node():
+    assert normalize_node(' http://node-a:8080/ ') == 'http://node-a:8080'
+
+
+def test_owners_yields_every_node_once():
+    ring = HashRing(NODES)
+    for key in KEYS[:50]:
+        assert sorted(ring.owners(key)) == NODES
+
+
+def test_empty_ring_has_no_owners():
+    assert list(HashRing([]).owners('key')) == []
+
+
+def test_ownership_is_deterministic_and_spread():
+    first = HashRing(NODES)
+    second = HashRing(list(reversed(NODES)))
+    assert [_owner(first, key) for key in KEYS] == [_owner(second, key) for key in KEYS]
+
+    counts = Counter(_owner(first, key) for key in KEYS)
+    assert set(counts) == set(NODES)
+    assert min(counts.values()) > len(KEYS) / len(NODES) / 2
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(NODES)
+    smaller = HashRing(NODES[:2])
+    for key in KEYS:
+        owner = _owner(ring, key)
+        if owner != NODES[2]:
+            assert _owner(smaller, key) == owner
+        else:
+            # The next node on the ring takes over
+            assert _owner(smaller, key) == list(ring.owners(key))[1]
+
+
+def test_owner_is_none_for_own_keys():
+    clusters = {node: Cluster(node, NODES) for node in NODES}
+    ring = HashRing(NODES)
+    for key in KEYS[:100]:
+        owner = _owner(ring, key)
+        for node, cluster in clusters.items():
+            assert cluster.owner(key) == (None if node == owner else owner)
+
+
+def test_adds_self_to_peers():
+    cluster = Cluster('http://node-d:8080/', NODES)
+    assert cluster.self_url == 'http://node-d:8080'
+    assert cluster.ring.nodes == sorted(NODES + ['http://node-d:8080'])
+
+
+def test_skips_failed_peer(monkeypatch):
+    cluster = Cluster(NODES[0], NODES, retry_interval=60)
+    ring = HashRing(NODES)
+    key = next(key for key in KEYS if _owner(ring, key) == NODES[1])
+
+    class FailingSession:
+        def get(self, *args, **kwargs):
+            raise requests.ConnectionError('refused')
+
+    monkeypatch.setattr(cluster, '_session', FailingSession)
+    with pytest.raises(requests.RequestException):
+        cluster.fetch(NODES[1], '/proxy/wms/hash', {})
+
+    fallback = list(ring.owners(key))[1]
+    assert cluster.owner(key) == (None if fallback == NODES[0] else fallback)
+
+    # Failed peers own their keys again after retry_interval
+    cluster._down[NODES[1]] = 0
+    assert cluster.owner(key) == NODES[1]
@@ -0,0 +1,118 @@
+# Tests of the print job deduplication and result cache
+
+import os
+import time
+
+import pytest
+
+from munimap.print_cache import PrintResultCache, spec_hash
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PrintResultCache(str(tmp_path), max_bytes=1000, ttl=60, job_ttl=10, queue_ttl=30)
+
+
+def _age(cache, name, seconds):
+    then = time.time() - seconds
+    os.utime(cache._path(name), (then, then))
+
+
+def test_spec_hash_ignores_key_order():
+    assert spec_hash({'a': 1, 'b': [1, 2]}) == spec_hash({'b': [1, 2], 'a': 1})
+    assert spec_hash({'a': 1}) != spec_hash({'a': 2})
+
+
+def test_register_and_find_job(cache):
+    assert cache.find_job('key') is None
+    cache.register_job('key', 'job-1')
+    assert cache.find_job('key') == 'job-1'
+    assert cache.key_for_job('job-1') == 'key'
+
+    cache.unregister_job('key', 'job-1')
+    assert cache.find_job('key') is None
+    assert cache.key_for_job('job-1') is None
+
+
+def test_unregister_keeps_newer_job(cache):
+    cache.register_job('key', 'job-1')
+    cache.register_job('key', 'job-2')
+    cache.unregister_job('key', 'job-1')
+    assert cache.find_job('key') == 'job-2'
+
+
+def test_expired_job_is_not_reused(cache):
+    cache.register_job('key', 'job-1')
+    _age(cache, 'key.job', 20)
+    assert cache.find_job('key') is None
+
+
+def test_queued_job_is_reused_until_queue_ttl(cache):
+    cache.register_job('key', 'job-1')
+    cache.set_job_state('job-1', {'state': 'queued'})
+    _age(cache, 'key.job', 20)
+    assert cache.find_job('key') == 'job-1'
+
+    # Started jobs fall back to job_ttl
+    cache.set_job_state('job-1', {'state': 'submitted'})
+    assert cache.find_job('key') is None
+
+    cache.set_job_state('job-1', {'state': 'queued'})
+    _age(cache, 'key.job', 40)
+    assert cache.find_job('key') is None
+
+
+def test_job_state(cache):
+    assert cache.job_state('job-1') is None
+    cache.set_job_state('job-1', {'state': 'queued', 'position': 2})
+    assert cache.job_state('job-1') == {'state': 'queued', 'position': 2}
+
+
+@pytest.mark.parametrize('job_ref', ['', '../key', 'a/b', '.hidden'])
+def test_rejects_unsafe_job_references(cache, job_ref):
+    assert cache.key_for_job(job_ref) is None
+    assert cache.job_state(job_ref) is None
+
+
+def test_store_and_get_output(cache):
+    assert cache.get_output('key') is None
+    cache.register_job('key', 'job-1')
+    cache.store_output('key', b'%PDF', 'application/pdf')
+    path, content_type = cache.get_output('key')
+    assert content_type == 'application/pdf'
+    with open(path, 'rb') as f:
+        assert f.read() == b'%PDF'
+
+    # Jobs with a cached output stay reusable for ttl
+    _age(cache, 'key.job', 20)
+    assert cache.find_job('key') == 'job-1'
+
+    cache.forget('key')
+    assert cache.get_output('key') is None
+    assert cache.find_job('key') is None
+
+
+def test_expired_output(cache):
+    cache.store_output('key', b'%PDF', 'application/pdf')
+    _age(cache, 'key.meta', 120)
+    assert cache.get_output('key') is None
+    cache.evict()
+    assert not os.path.exists(cache._path('key.out'))
+
+
+def test_outputs_larger_than_cache_are_not_stored(cache):
+    cache.store_output('key', b'x' * 1001, 'application/pdf')
+    assert cache.get_output('key') is None
+
+
+def test_evicts_least_recently_used_outputs(cache):
+    for i in range(2):
+        cache.store_output(f'key-{i}', b'x' * 400, 'application/pdf')
+        _age(cache, f'key-{i}.out', 10 - i)
+    # Use the oldest output so the second one is evicted
+    cache.get_output('key-0')
+    cache.store_output('key-2', b'x' * 400, 'application/pdf')
+
+    assert cache.get_output('key-0') is not None
+    assert cache.get_output('key-1') is None
+    assert cache.get_output('key-2') is not None
@@ -0,0 +1,144 @@
+# Tests of the print job scheduler
+
+import time
+import threading
+
+import pytest
+
+from munimap.print_queue import (
+    PrintScheduler, PrintTicket, QueueFullError, job_priority,
+    PRIORITY_PREVIEW, PRIORITY_SMALL, PRIORITY_MEDIUM, PRIORITY_LARGE,
+)
+
+
+def _ticket(priority=PRIORITY_SMALL, layout='A4 portrait', output_format='pdf'):
+    return PrintTicket({}, priority, layout, output_format)
+
+
+class BlockingRun:
+    """Print job runner that finishes jobs one at a time on request."""
+
+    def __init__(self):
+        self.started = []
+        self._semaphore = threading.Semaphore(0)
+        self._started = threading.Semaphore(0)
+
+    def __call__(self, ticket):
+        self.started.append(ticket)
+        self._started.release()
+        self._semaphore.acquire()
+        return ticket.spec.get('ok', True)
+
+    def wait_started(self):
+        assert self._started.acquire(timeout=5), 'no print job started'
+
+    def finish(self):
+        self._semaphore.release()
+
+
+@pytest.mark.parametrize('spec, priority', [
+    ({'outputFormat': 'png', 'layout': 'A0 portrait'}, PRIORITY_PREVIEW),
+    ({}, PRIORITY_SMALL),
+    ({'layout': 'A3 landscape'}, PRIORITY_SMALL),
+    ({'layout': 'A2 portrait'}, PRIORITY_MEDIUM),
+    ({'layout': 'A1 landscape'}, PRIORITY_MEDIUM),
+    ({'layout': 'A0 portrait'}, PRIORITY_LARGE),
+    ({'layout': 'unknown'}, PRIORITY_SMALL),
+])
+def test_job_priority(spec, priority):
+    assert job_priority(spec) == priority
+
+
+def test_runs_by_priority_then_order():
+    run = BlockingRun()
+    scheduler = PrintScheduler(run, max_concurrent=1)
+    first = scheduler.enqueue(_ticket(PRIORITY_LARGE))
+    run.wait_started()
+    large = scheduler.enqueue(_ticket(PRIORITY_LARGE))
+    small = scheduler.enqueue(_ticket(PRIORITY_SMALL))
+    preview = scheduler.enqueue(_ticket(PRIORITY_PREVIEW))
+    later_small = scheduler.enqueue(_ticket(PRIORITY_SMALL))
+    assert scheduler.position(preview.id) == 1
+    assert scheduler.position(later_small.id) == 3
+    assert scheduler.position(first.id) is None
+
+    for _ in range(4):
+        run.finish()
+        run.wait_started()
+    run.finish()
+    assert run.started == [first, preview, small, later_small, large]
+
+
+def test_enqueue_many_is_all_or_nothing():
+    run = BlockingRun()
+    scheduler = PrintScheduler(run, max_concurrent=1, max_queued=3)
+    scheduler.enqueue(_ticket())
+    run.wait_started()
+    scheduler.enqueue(_ticket())
+
+    assert scheduler.has_capacity(2)
+    assert not scheduler.has_capacity(3)
+    with pytest.raises(QueueFullError):
+        scheduler.enqueue_many([_ticket(), _ticket(), _ticket()])
+    assert scheduler.stats()['queued'] == 1
+
+    scheduler.enqueue_many([_ticket(), _ticket()])
+    assert scheduler.stats()['queued'] == 3
+    with pytest.raises(QueueFullError):
+        scheduler.enqueue(_ticket())
+    for _ in range(4):
+        run.finish()
+
+
+def test_cancel_queued_ticket():
+    run = BlockingRun()
+    scheduler = PrintScheduler(run, max_concurrent=1)
+    running = scheduler.enqueue(_ticket())
+    run.wait_started()
+    waiting = scheduler.enqueue(_ticket())
+    other = scheduler.enqueue(_ticket())
+
+    assert scheduler.cancel(waiting.id)
+    assert waiting.state == 'cancelled'
+    assert scheduler.get(waiting.id) is None
+    assert scheduler.position(other.id) == 1
+    # Running and unknown tickets can not be cancelled
+    assert not scheduler.cancel(running.id)
+    assert not scheduler.cancel('unknown')
+
+    run.finish()
+    run.wait_started()
+    run.finish()
+    assert run.started == [running, other]
+
+
+def test_records_stats_and_errors():
+    done = threading.Event()
+    finished = []
+
+    def run(ticket):
+        finished.append(ticket)
+        if len(finished) == 3:
+            done.set()
+        if ticket.spec.get('fail'):
+            raise RuntimeError('print server failed')
+        return ticket.spec.get('ok', True)
+
+    scheduler = PrintScheduler(run, max_concurrent=1)
+    failed = scheduler.enqueue(PrintTicket({'fail': True}, PRIORITY_SMALL, 'A4 portrait', 'pdf'))
+    scheduler.enqueue(PrintTicket({'ok': False}, PRIORITY_SMALL, 'A4 portrait', 'pdf'))
+    scheduler.enqueue(PrintTicket({}, PRIORITY_PREVIEW, 'A4 portrait', 'png'))
+    assert done.wait(5)
+
+    # Stats are recorded after run returned
+    for _ in range(100):
+        stats = scheduler.stats()
+        if sum(job['count'] for job in stats['jobs']) == 3:
+            break
+        time.sleep(0.01)
+    assert failed.error == 'print server failed'
+    jobs = {(job['layout'], job['outputFormat']): job for job in stats['jobs']}
+    assert jobs[('A4 portrait', 'pdf')]['count'] == 2
+    assert jobs[('A4 portrait', 'pdf')]['errors'] == 2
+    assert jobs[('A4 portrait', 'png')]['errors'] == 0
+    assert stats['queued'] == 0
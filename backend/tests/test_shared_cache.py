@@ -0,0 +1,128 @@
+# Tests of the shared proxy cache backends
+
+import os
+import time
+import threading
+import contextlib
+
+import pytest
+
+from munimap.shared_cache import MemoryCache, FileCache, CacheEntry
+
+
+@pytest.fixture(params=['memory', 'file'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache(max_bytes=1024, ttl=60)
+    return FileCache(str(tmp_path / 'cache'), max_bytes=1024, ttl=60)
+
+
+def test_set_and_get(cache):
+    assert cache.get('wms:a') is None
+    cache.set('wms:a', b'png', {'content_type': 'image/png'})
+    assert cache.get('wms:a') == CacheEntry(b'png', {'content_type': 'image/png'})
+    cache.delete('wms:a')
+    assert cache.get('wms:a') is None
+
+
+def test_expired_entries_are_missing(cache):
+    cache.set('wms:a', b'png', ttl=-1)
+    assert cache.get('wms:a') is None
+
+
+def test_large_entries_are_not_cached(cache):
+    cache.set('wms:a', b'x' * (cache.max_entry_bytes + 1))
+    assert cache.get('wms:a') is None
+
+
+def test_get_or_load(cache):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return b'png', {'status': 200}
+
+    assert cache.get_or_load('wms:a', loader) == (CacheEntry(b'png', {'status': 200}), False)
+    assert cache.get_or_load('wms:a', loader) == (CacheEntry(b'png', {'status': 200}), True)
+    assert len(calls) == 1
+
+
+def test_uncacheable_results_are_loaded_again(cache):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_load('wms:a', loader) == (None, False)
+    assert cache.get_or_load('wms:a', loader) == (None, False)
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_load_once(cache):
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return b'png', {}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('wms:a', loader)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(calls) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True]
+    assert all(entry.value == b'png' for entry, _ in results)
+
+
+def test_guard_is_entered_on_miss_only(cache):
+    entered = []
+
+    @contextlib.contextmanager
+    def guard():
+        entered.append(1)
+        yield
+
+    cache.get_or_load('wms:a', lambda: (b'png', {}), guard=guard)
+    cache.get_or_load('wms:a', lambda: (b'png', {}), guard=guard)
+    assert len(entered) == 1
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_bytes=800, ttl=60)
+    for key in ('a', 'b', 'c', 'd'):
+        cache.set(key, b'x' * 100)
+    # Mark 'a' as recently used
+    cache.get('a')
+    for key in ('e', 'f', 'g', 'h', 'i'):
+        cache.set(key, b'x' * 100)
+    assert cache.size <= 800
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+
+
+def test_file_cache_evicts_least_recently_used(tmp_path):
+    cache = FileCache(str(tmp_path), max_bytes=1024 * 1024, ttl=60)
+    old = time.time() - 100
+    for i in range(10):
+        cache.set(f'key-{i}', b'x' * 200)
+        os.utime(cache._path(f'key-{i}'), (old + i, old + i))
+    # Shrink the cache so only the most recently used half fits
+    entry_size = os.path.getsize(cache._path('key-0'))
+    cache.max_bytes = entry_size * 5 / 0.9
+    cache.evict()
+    assert [cache.get(f'key-{i}') is not None for i in range(10)] == [False] * 5 + [True] * 5
+
+
+def test_file_cache_is_shared_between_instances(tmp_path):
+    first = FileCache(str(tmp_path))
+    second = FileCache(str(tmp_path))
+    first.set('wms:a', b'png', {'status': 200})
+    assert second.get('wms:a') == CacheEntry(b'png', {'status': 200})
@@ -1,7 +1,11 @@
 import TileLayer from 'ol/layer/Tile';
 import TileWMS from 'ol/source/TileWMS';
+import XYZ from 'ol/source/XYZ';
+import TileGrid from 'ol/tilegrid/TileGrid';
+import { getWidth, getTopLeft } from 'ol/extent';
+import { get as getProjection } from 'ol/proj';
 import type { Coordinate } from 'ol/coordinate';
-import type { LayerConfig, WMSSourceConfig, LegendConfig } from './types';
+import type { LayerConfig, WMSSourceConfig, LegendConfig, CompositeSource } from './types';
 import { Layer } from './Layer';
 
 /**
@@ -10,6 +14,7 @@ import { Layer } from './Layer';
 export class TiledWMS extends Layer {
 	private sourceConfig: WMSSourceConfig;
 	private wmsLayers: string;
+	private wmsSource: TileWMS | null = null;
 
 	constructor(config: LayerConfig) {
 		super(config);
@@ -17,8 +22,8 @@ export class TiledWMS extends Layer {
 		this.wmsLayers = this.sourceConfig.params?.LAYERS ?? '';
 	}
 
-	protected createOlLayer(): TileLayer<TileWMS> {
-		const source = new TileWMS({
+	protected createOlLayer(): TileLayer<TileWMS | XYZ> {
+		this.wmsSource = new TileWMS({
 			url: this.sourceConfig.url,
 			params: {
 				LAYERS: this._visible ? this.wmsLayers : '',
@@ -31,35 +36,82 @@ export class TiledWMS extends Layer {
 		});
 
 		return new TileLayer({
-			source,
+			source: this.sourceConfig.tileUrl ? this.createTileSource() : this.wmsSource,
 			visible: this._visible,
 			opacity: this._opacity
 		});
 	}
 
+	/**
+	 * Create the source of the backend tile facade. The WMS source is kept
+	 * for feature info and legends.
+	 */
+	private createTileSource(): XYZ {
+		const projection = this.sourceConfig.params?.SRS ?? 'EPSG:25832';
+		const extent = this.sourceConfig.tileExtent ?? getProjection(projection)!.getExtent();
+		const levels = this.sourceConfig.tileLevels ?? 21;
+		const maxResolution = getWidth(extent) / 256;
+
+		return new XYZ({
+			url: this.sourceConfig.tileUrl,
+			projection,
+			tileGrid: new TileGrid({
+				extent,
+				origin: getTopLeft(extent),
+				resolutions: Array.from({ length: levels }, (_, z) => maxResolution / Math.pow(2, z)),
+				tileSize: 256
+			}),
+			transition: 0
+		});
+	}
+
 	/**
 	 * Override visibility change to update WMS LAYERS parameter.
 	 * This is the AnOl pattern - toggle LAYERS param instead of layer visibility.
 	 */
 	protected onVisibilityChange(visible: boolean): void {
-		if (this._olLayer) {
-			const source = (this._olLayer as TileLayer<TileWMS>).getSource();
-			if (source) {
-				const params = source.getParams();
-				params.LAYERS = visible ? this.wmsLayers : '';
-				source.updateParams(params);
-			}
+		const source = this.getSource();
+		if (source) {
+			const params = source.getParams();
+			params.LAYERS = visible ? this.wmsLayers : '';
+			source.updateParams(params);
 		}
 	}
 
+	/**
+	 * Source settings for merging this layer into a composite GetMap
+	 * with other layers of the same upstream, or null if it is not proxied.
+	 */
+	get compositeSource(): CompositeSource | null {
+		const url = this.sourceConfig.url;
+		// Facade tiles are cached per layer and not merged
+		if (this.sourceConfig.tileUrl) return null;
+		if (!url || !url.startsWith('/proxy/wms/') || !url.endsWith('/service') || !this.wmsLayers) {
+			return null;
+		}
+		return {
+			url: url.replace(/\/service$/, '/composite'),
+			layers: this.wmsLayers,
+			styles: this.sourceConfig.params?.STYLES ?? '',
+			format: this.sourceConfig.format ?? 'image/png',
+			srs: this.sourceConfig.params?.SRS
+		};
+	}
+
 	/**
 	 * Get the WMS source
 	 */
 	getSource(): TileWMS | null {
-		if (this._olLayer) {
-			return (this._olLayer as TileLayer<TileWMS>).getSource();
-		}
-		return null;
+		return this._olLayer ? this.wmsSource : null;
+	}
+
+	/**
+	 * Dispose of the layer and its WMS source
+	 */
+	override dispose(): void {
+		super.dispose();
+		this.wmsSource?.dispose();
+		this.wmsSource = null;
 	}
 
 	/**
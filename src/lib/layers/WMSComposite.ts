@@ -0,0 +1,134 @@
+import TileLayer from 'ol/layer/Tile';
+import TileWMS from 'ol/source/TileWMS';
+import type OlMap from 'ol/Map';
+import type { Layer } from './Layer';
+import type { CompositeSource } from './types';
+import { TiledWMS } from './TiledWMS';
+
+interface CompositeMember {
+	layer: TiledWMS;
+	source: CompositeSource;
+}
+
+/**
+ * Merges visible tiled WMS overlays that are stacked directly on top of
+ * each other and come from the same upstream into one tile layer served
+ * by the composite proxy. The merged layers keep their state, only their
+ * OL layers are hidden while the composite layer draws them.
+ */
+export class WMSComposite {
+	private map: OlMap;
+	private olLayers = new Map<string, TileLayer<TileWMS>>();
+	private merged = new Set<Layer>();
+
+	constructor(map: OlMap) {
+		this.map = map;
+	}
+
+	/**
+	 * Regroup the overlays. Call after visibility, opacity or order changes.
+	 * @param overlays Visible overlay layers, top of the layerswitcher first
+	 */
+	update(overlays: Layer[]): void {
+		const runs = this.findRuns([...overlays].reverse());
+
+		const merged = new Set<Layer>();
+		const active = new Set<string>();
+		for (const run of runs) {
+			const key = run.map((member) => member.layer.name).join(',');
+			active.add(key);
+			this.showComposite(key, run);
+			run.forEach((member) => {
+				merged.add(member.layer);
+				member.layer.olLayer.setVisible(false);
+			});
+		}
+
+		// Layers that are drawn on their own again, hidden ones already hid their OL layer
+		const visible = new Set(overlays);
+		this.merged.forEach((layer) => {
+			if (!merged.has(layer) && visible.has(layer)) {
+				layer.olLayer.setVisible(true);
+			}
+		});
+		this.merged = merged;
+
+		this.olLayers.forEach((olLayer, key) => {
+			if (!active.has(key)) {
+				this.map.removeLayer(olLayer);
+				olLayer.dispose();
+				this.olLayers.delete(key);
+			}
+		});
+	}
+
+	/**
+	 * Remove all composite layers and show the merged layers again
+	 */
+	dispose(): void {
+		this.merged.forEach((layer) => layer.olLayer.setVisible(layer.visible));
+		this.merged.clear();
+		this.update([]);
+	}
+
+	/**
+	 * Runs of at least two adjacent layers sharing upstream, format and SRS
+	 * @param overlays Visible overlay layers, bottom first
+	 */
+	private findRuns(overlays: Layer[]): CompositeMember[][] {
+		const runs: CompositeMember[][] = [];
+		let run: CompositeMember[] = [];
+		let runKey: string | null = null;
+
+		for (const layer of overlays) {
+			const source = layer instanceof TiledWMS ? layer.compositeSource : null;
+			const key = source ? `${source.url}|${source.format}|${source.srs ?? ''}` : null;
+			if (key !== null && key === runKey) {
+				run.push({ layer: layer as TiledWMS, source: source! });
+				continue;
+			}
+			if (run.length > 1) runs.push(run);
+			run = source ? [{ layer: layer as TiledWMS, source }] : [];
+			runKey = key;
+		}
+		if (run.length > 1) runs.push(run);
+
+		return runs;
+	}
+
+	/**
+	 * Create or update the composite layer of a run, drawn at the z-index of its top layer
+	 */
+	private showComposite(key: string, run: CompositeMember[]): void {
+		const first = run[0].source;
+		const styles = run.some((member) => member.source.styles)
+			? run.map((member) => member.source.styles || member.source.layers.replace(/[^,]+/g, '')).join(',')
+			: undefined;
+		const params: Record<string, string | undefined> = {
+			LAYERS: run.map((member) => member.source.layers).join(','),
+			COMPOSITE: run
+				.map((member) => `${member.source.layers.split(',').length}:${member.layer.opacity.toFixed(2)}`)
+				.join(','),
+			SRS: first.srs,
+			FORMAT: first.format,
+			TRANSPARENT: 'TRUE',
+			...(styles !== undefined && { STYLES: styles })
+		};
+
+		let olLayer = this.olLayers.get(key);
+		if (!olLayer) {
+			olLayer = new TileLayer({
+				source: new TileWMS({ url: first.url, params, transition: 0 })
+			});
+			this.olLayers.set(key, olLayer);
+			this.map.addLayer(olLayer);
+		} else {
+			const source = olLayer.getSource();
+			const current = source?.getParams() ?? {};
+			if (current.COMPOSITE !== params.COMPOSITE) {
+				source?.updateParams(params);
+			}
+		}
+		olLayer.setZIndex(run[run.length - 1].layer.olLayer.getZIndex() ?? 0);
+	}
+}
@@ -1,4 +1,4 @@
-import type { LayerConfig, GroupConfig, LayersDef } from './types';
+import type { LayerConfig, GroupConfig, LayersDef, WMSSourceConfig } from './types';
 import { Layer } from './Layer';
 import { Group } from './Group';
 import { TiledWMS } from './TiledWMS';
@@ -16,6 +16,10 @@ export function createLayer(config: LayerConfig): Layer | null {
 				return new TiledWMS(config);
 
 			case 'wms':
+				// Layers served by the tile facade are drawn as tiles
+				if ((config.olLayer?.source as WMSSourceConfig | undefined)?.tileUrl) {
+					return new TiledWMS(config);
+				}
 				return new SingleTileWMS(config);
 
 			case 'wmts':
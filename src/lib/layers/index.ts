@@ -8,6 +8,7 @@ export { TiledWMS } from './TiledWMS';
 export { SingleTileWMS } from './SingleTileWMS';
 export { WMTS } from './WMTS';
 export { StaticGeoJSON } from './StaticGeoJSON';
+export { WMSComposite } from './WMSComposite';
 
 // Factory functions
 export { createLayer, createGroup, initializeLayers } from './factory';
@@ -14,6 +14,19 @@ export interface WMSSourceConfig {
 	hqUrl?: string;
 	hqLayer?: string;
 	hqMatrixSet?: string;
+	// Fixed grid tile endpoint of the backend tile facade
+	tileUrl?: string;
+	tileExtent?: [number, number, number, number];
+	tileLevels?: number;
+}
+
+// Source settings of a tiled WMS layer that can share a composite GetMap
+export interface CompositeSource {
+	url: string;
+	layers: string;
+	styles: string;
+	format: string;
+	srs?: string;
 }
 
 export interface WMTSSourceConfig {
@@ -179,6 +192,7 @@ export interface MapConfig {
 	maxZoom?: number;
 	defaultBackground?: string;
 	defaultOverlays?: string[];
+	compositeWms?: boolean;
 }
 
 // Component toggles configuration
@@ -243,6 +257,8 @@ export interface GeolocationConfig {
 
 // Search provider configuration
 export interface SearchProviderConfig {
+	name?: string;
+	selected?: boolean;
 	url?: string;
 	params?: Record<string, string>;
 	responseProcessor?: string;
@@ -294,6 +310,44 @@ export interface ConfigApiResponse {
 	layers: LayersDef;
 }
 
+// Catalog entry without layer definitions
+export interface CatalogGroupSummary {
+	name: string;
+	title: string;
+	abstract: string;
+	metadataUrl: string;
+	predefined?: boolean;
+}
+
+// Initial load: config, catalog listing and catalog groups of the URL state
+export interface BootstrapApiResponse extends ConfigApiResponse {
+	version: string;
+	catalog: { groups: CatalogGroupSummary[] };
+	catalogGroups: GroupConfig[];
+}
+
+// Changes of the layer definitions since a previous config version
+export interface LayersDelta {
+	backgroundLayer: { added: LayerConfig[]; removed: string[]; changed: LayerConfig[] };
+	// Groups without their layers
+	groups: { added: Omit<GroupConfig, 'layers'>[]; removed: string[]; changed: Omit<GroupConfig, 'layers'>[] };
+	layers: {
+		added: { group: string; layer: LayerConfig }[];
+		removed: { group: string; name: string }[];
+		changed: { group: string; layer: LayerConfig }[];
+	};
+	order: {
+		backgroundLayer: string[];
+		overlays: { name: string; layers: string[] }[];
+	};
+}
+
+// Config request with the version of a previous response as since
+export type ConfigUpdateResponse =
+	| { version: string; unchanged: true }
+	| { version: string; since: string; delta: LayersDelta; app?: AppConfig }
+	| (ConfigApiResponse & { version: string });
+
 // URL configuration for proxies
 export interface UrlConfig {
 	wmsProxy?: string;
@@ -16,6 +16,7 @@ interface CatalogState {
 	error: string | null;
 	isOpen: boolean;
 	configId: string;
+	loaded: boolean;
 }
 
 function createCatalogStore() {
@@ -24,7 +25,8 @@ function createCatalogStore() {
 		isLoading: false,
 		error: null,
 		isOpen: false,
-		configId: 'default'
+		configId: 'default',
+		loaded: false
 	});
 
 	const togglingItems = new Set<string>();
@@ -33,9 +35,31 @@ function createCatalogStore() {
 		subscribe,
 
 		/**
-		 * Load catalog items from backend
+		 * Set catalog items that came with the bootstrap response
+		 */
+		setCatalog: (configId: string, items: CatalogItem[]): void => {
+			update((s) => ({
+				...s,
+				items: items.map((g) => ({
+					name: g.name,
+					title: g.title,
+					abstract: g.abstract || '',
+					metadataUrl: g.metadataUrl || ''
+				})),
+				isLoading: false,
+				error: null,
+				configId,
+				loaded: true
+			}));
+		},
+
+		/**
+		 * Load catalog items from backend (skipped if already loaded)
 		 */
 		loadCatalog: async (configId: string = 'default'): Promise<void> => {
+			const current = get({ subscribe });
+			if (current.loaded && current.configId === configId) return;
+
 			update((s) => ({ ...s, isLoading: true, error: null, configId }));
 
 			try {
@@ -56,7 +80,8 @@ function createCatalogStore() {
 					...s,
 					items,
 					isLoading: false,
-					error: null
+					error: null,
+					loaded: true
 				}));
 			} catch (e) {
 				update((s) => ({
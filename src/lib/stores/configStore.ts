@@ -1,47 +1,104 @@
 import { writable, derived, get } from 'svelte/store';
-import type { AppConfig, LayersDef, ConfigApiResponse } from '$lib/layers/types';
+import type {
+	AppConfig,
+	LayersDef,
+	LayersDelta,
+	GroupConfig,
+	LayerConfig,
+	CatalogGroupSummary,
+	BootstrapApiResponse,
+	ConfigUpdateResponse
+} from '$lib/layers/types';
 
 interface ConfigState {
 	app: AppConfig | null;
 	layers: LayersDef | null;
+	catalog: CatalogGroupSummary[] | null;
+	catalogGroups: GroupConfig[];
 	loading: boolean;
 	error: string | null;
 	configId: string | null;
+	// Snapshot version of app and layers, sent as since on refresh
+	version: string | null;
+}
+
+/**
+ * Apply a layers delta of the config endpoint to the previous definition
+ */
+export function applyLayersDelta(layers: LayersDef, delta: LayersDelta): LayersDef {
+	const backgrounds = new Map(layers.backgroundLayer.map((layer) => [layer.name, layer]));
+	delta.backgroundLayer.removed.forEach((name) => backgrounds.delete(name));
+	[...delta.backgroundLayer.added, ...delta.backgroundLayer.changed].forEach((layer) =>
+		backgrounds.set(layer.name, layer)
+	);
+
+	const groups = new Map<string, Omit<GroupConfig, 'layers'>>(
+		layers.overlays.map(({ layers: _, ...group }) => [group.name, group])
+	);
+	delta.groups.removed.forEach((name) => groups.delete(name));
+	[...delta.groups.added, ...delta.groups.changed].forEach((group) => groups.set(group.name, group));
+
+	// One layer may be part of several groups, key by both names
+	const key = (group: string, name: string) => `${group}\u0000${name}`;
+	const groupLayers = new Map<string, LayerConfig>();
+	layers.overlays.forEach((group) =>
+		group.layers.forEach((layer) => groupLayers.set(key(group.name, layer.name), layer))
+	);
+	delta.layers.removed.forEach(({ group, name }) => groupLayers.delete(key(group, name)));
+	[...delta.layers.added, ...delta.layers.changed].forEach(({ group, layer }) =>
+		groupLayers.set(key(group, layer.name), layer)
+	);
+
+	return {
+		backgroundLayer: delta.order.backgroundLayer.map((name) => backgrounds.get(name)!),
+		overlays: delta.order.overlays.map(({ name, layers: names }) => ({
+			...groups.get(name)!,
+			layers: names.map((layerName) => groupLayers.get(key(name, layerName))!)
+		}))
+	};
 }
 
 function createConfigStore() {
 	const { subscribe, set, update } = writable<ConfigState>({
 		app: null,
 		layers: null,
+		catalog: null,
+		catalogGroups: [],
 		loading: false,
 		error: null,
-		configId: null
+		configId: null,
+		version: null
 	});
 
 	return {
 		subscribe,
 
 		/**
-		 * Load configuration from Flask API
+		 * Load configuration, catalog and the catalog groups of the URL state
+		 * from the Flask bootstrap endpoint in one request
 		 */
-		load: async (configId: string = 'default'): Promise<void> => {
+		load: async (configId: string = 'default', groups: string[] = []): Promise<void> => {
 			update((s) => ({ ...s, loading: true, error: null, configId }));
 
 			try {
-				const response = await fetch(`/api/v1/app/${configId}/config`);
+				const query = groups.length > 0 ? `?groups=${encodeURIComponent(groups.join(','))}` : '';
+				const response = await fetch(`/api/v1/app/${configId}/bootstrap${query}`);
 
 				if (!response.ok) {
 					throw new Error(`Failed to load configuration: ${response.status} ${response.statusText}`);
 				}
 
-				const data: ConfigApiResponse = await response.json();
+				const data: BootstrapApiResponse = await response.json();
 
 				set({
 					app: data.app,
 					layers: data.layers,
+					catalog: data.catalog.groups,
+					catalogGroups: data.catalogGroups,
 					loading: false,
 					error: null,
-					configId
+					configId,
+					version: data.version
 				});
 			} catch (e) {
 				const errorMessage = e instanceof Error ? e.message : 'Unknown error';
@@ -53,6 +110,37 @@ function createConfigStore() {
 			}
 		},
 
+		/**
+		 * Fetch changes of app and layers since the loaded version.
+		 * Returns true if the configuration changed.
+		 */
+		refresh: async (): Promise<boolean> => {
+			const state = get({ subscribe });
+			if (!state.configId || !state.layers || !state.version) {
+				return false;
+			}
+
+			const response = await fetch(
+				`/api/v1/app/${state.configId}/config?since=${encodeURIComponent(state.version)}`
+			);
+			if (!response.ok) {
+				throw new Error(`Failed to refresh configuration: ${response.status} ${response.statusText}`);
+			}
+
+			const data: ConfigUpdateResponse = await response.json();
+			if ('unchanged' in data) {
+				return false;
+			}
+			if ('delta' in data) {
+				const layers = applyLayersDelta(state.layers, data.delta);
+				update((s) => ({ ...s, app: data.app ?? s.app, layers, version: data.version }));
+			} else {
+				// Version unknown to the backend, full payload
+				update((s) => ({ ...s, app: data.app, layers: data.layers, version: data.version }));
+			}
+			return true;
+		},
+
 		/**
 		 * Set configuration directly (useful for testing or embedded config)
 		 */
@@ -60,9 +148,12 @@ function createConfigStore() {
 			set({
 				app,
 				layers,
+				catalog: null,
+				catalogGroups: [],
 				loading: false,
 				error: null,
-				configId
+				configId,
+				version: null
 			});
 		},
 
@@ -73,9 +164,12 @@ function createConfigStore() {
 			set({
 				app: null,
 				layers: null,
+				catalog: null,
+				catalogGroups: [],
 				loading: false,
 				error: null,
-				configId: null
+				configId: null,
+				version: null
 			});
 		},
 
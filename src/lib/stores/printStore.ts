@@ -73,13 +73,119 @@ function createPrintStore() {
 		error: null
 	});
 
-	let pollInterval: ReturnType<typeof setInterval> | null = null;
+	let pollController: AbortController | null = null;
+	let eventSource: EventSource | null = null;
 
 	function stopPolling() {
-		if (pollInterval) {
-			clearInterval(pollInterval);
-			pollInterval = null;
+		if (pollController) {
+			pollController.abort();
+			pollController = null;
 		}
+		if (eventSource) {
+			eventSource.close();
+			eventSource = null;
+		}
+	}
+
+	/**
+	 * Apply a status update from the backend. Returns true if the job is done.
+	 */
+	function applyStatus(statusData: { status: string; downloadURL?: string }): boolean {
+		if (statusData.status === 'finished') {
+			stopPolling();
+			update((s) => ({
+				...s,
+				status: 'ready',
+				job: s.job ? { ...s.job, downloadUrl: statusData.downloadURL ?? s.job.downloadUrl } : null
+			}));
+			return true;
+		} else if (statusData.status === 'error') {
+			stopPolling();
+			update((s) => ({
+				...s,
+				status: 'error',
+				error: 'Druckauftrag fehlgeschlagen'
+			}));
+			return true;
+		}
+		// Otherwise keep waiting (status === 'inprocess')
+		return false;
+	}
+
+	/**
+	 * Long poll the status URL (fallback if Server-Sent Events are unavailable).
+	 * Every request is held by the backend until the status version is newer
+	 * than the last one received.
+	 */
+	async function startPolling() {
+		// Seconds the backend holds a request (at most 30)
+		const POLL_WAIT = 25;
+		// Print jobs may wait in the queue for a while, give up after 35 minutes
+		const MAX_POLL_DURATION = 35 * 60 * 1000;
+		const controller = new AbortController();
+		const deadline = Date.now() + MAX_POLL_DURATION;
+		let version = 0;
+		pollController = controller;
+
+		while (!controller.signal.aborted) {
+			const currentState = get({ subscribe });
+			if (!currentState.job) {
+				stopPolling();
+				return;
+			}
+
+			if (Date.now() > deadline) {
+				stopPolling();
+				update((s) => ({
+					...s,
+					status: 'error',
+					error: 'Zeitüberschreitung: Druckauftrag dauert zu lange'
+				}));
+				return;
+			}
+
+			try {
+				const statusResponse = await fetch(
+					`${currentState.job.statusUrl}?wait=${POLL_WAIT}&since=${version}`,
+					{ signal: controller.signal }
+				);
+				if (!statusResponse.ok) {
+					throw new Error(`Status request failed: ${statusResponse.status}`);
+				}
+				const statusData = await statusResponse.json();
+				version = statusData.version ?? version;
+				if (applyStatus(statusData)) return;
+			} catch (err) {
+				if (controller.signal.aborted) return;
+				stopPolling();
+				update((s) => ({
+					...s,
+					status: 'error',
+					error: 'Statusabfrage fehlgeschlagen'
+				}));
+				return;
+			}
+		}
+	}
+
+	/**
+	 * Receive status updates pushed by the backend, fall back to polling on errors
+	 */
+	function subscribeStatus(statusUrl: string) {
+		if (typeof EventSource === 'undefined') {
+			startPolling();
+			return;
+		}
+		eventSource = new EventSource(statusUrl.replace(/\/status$/, '/events'));
+		eventSource.onmessage = (event) => {
+			applyStatus(JSON.parse(event.data));
+		};
+		eventSource.onerror = () => {
+			if (!eventSource) return;
+			eventSource.close();
+			eventSource = null;
+			startPolling();
+		};
 	}
 
 	return {
@@ -207,56 +313,7 @@ function createPrintStore() {
 					}
 				}));
 
-				// Start polling for status (max 2 minutes)
-				const MAX_POLL_ATTEMPTS = 120;
-				let pollCount = 0;
-				pollInterval = setInterval(async () => {
-					pollCount++;
-					const currentState = get({ subscribe });
-					if (!currentState.job) {
-						stopPolling();
-						return;
-					}
-
-					if (pollCount >= MAX_POLL_ATTEMPTS) {
-						stopPolling();
-						update((s) => ({
-							...s,
-							status: 'error',
-							error: 'Zeitüberschreitung: Druckauftrag dauert zu lange'
-						}));
-						return;
-					}
-
-					try {
-						const statusResponse = await fetch(currentState.job.statusUrl);
-						const statusData = await statusResponse.json();
-
-						if (statusData.status === 'finished') {
-							stopPolling();
-							update((s) => ({
-								...s,
-								status: 'ready',
-								job: s.job ? { ...s.job, downloadUrl: statusData.downloadURL } : null
-							}));
-						} else if (statusData.status === 'error') {
-							stopPolling();
-							update((s) => ({
-								...s,
-								status: 'error',
-								error: 'Druckauftrag fehlgeschlagen'
-							}));
-						}
-						// Otherwise keep polling (status === 'inprocess')
-					} catch (err) {
-						stopPolling();
-						update((s) => ({
-							...s,
-							status: 'error',
-							error: 'Statusabfrage fehlgeschlagen'
-						}));
-					}
-				}, 1000);
+				subscribeStatus(data.statusURL);
 
 			} catch (err) {
 				update((s) => ({
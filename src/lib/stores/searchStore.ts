@@ -1,7 +1,8 @@
-import { writable, derived } from 'svelte/store';
+import { writable, derived, get } from 'svelte/store';
 import WKT from 'ol/format/WKT';
 import type { Feature } from 'ol';
 import type { Geometry } from 'ol/geom';
+import { configStore } from './configStore';
 
 export interface SearchResult {
 	label: string;
@@ -23,6 +24,23 @@ interface SearchState {
 }
 
 const SEARCH_URL = 'https://stadtplan.bielefeld.de/search/';
+
+/**
+ * Backend search route of the selected search config, which caches geocoder
+ * results. Falls back to the geocoder itself without a named config.
+ */
+function searchUrl(): URL {
+	const { app, configId } = get(configStore);
+	const searchConfigs = app?.searchConfig ?? [];
+	const searchConfig = searchConfigs.find((config) => config.selected) ?? searchConfigs[0];
+	if (!searchConfig?.name) {
+		return new URL(SEARCH_URL);
+	}
+	return new URL(
+		`/api/v1/app/${configId ?? 'default'}/search/${encodeURIComponent(searchConfig.name)}`,
+		window.location.origin
+	);
+}
 const MIN_SEARCH_CHARS = 3;
 const DEBOUNCE_MS = 300;
 const MAX_RESULTS = 20;
@@ -71,7 +89,7 @@ function createSearchStore() {
 			abortController = new AbortController();
 
 			try {
-				const url = new URL(SEARCH_URL);
+				const url = searchUrl();
 				url.searchParams.set('term', query);
 				url.searchParams.set('maxresults', MAX_RESULTS.toString());
 
@@ -89,6 +89,21 @@ export function parseUrlGroups(): string[] | null {
 	return groupNames.length > 0 ? groupNames : null;
 }
 
+/**
+ * Extract the group names (compact format) or layer names (map format)
+ * from the 'layers' URL param, used to restore catalog groups on load.
+ */
+export function parseUrlLayerNames(): string[] {
+	const url = new URL(window.location.href);
+	const layersParam = url.searchParams.get('layers');
+	if (!layersParam) return [];
+	if (layersParam.includes('(')) return parseUrlGroups() ?? [];
+	return layersParam
+		.split(',')
+		.map((entry) => entry.split(':')[0].trim())
+		.filter((name) => name);
+}
+
 /**
  * Apply layer state from URL parameters to the layer store.
  * Must be called after layerStore.initialize() and before components render.